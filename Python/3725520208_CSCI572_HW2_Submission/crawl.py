@@ -1,11 +1,21 @@
 import requests
-from bs4 import BeautifulSoup
-from urllib.parse import urlparse, urljoin
 import csv
+import os
 import queue
 import threading
-import mimetypes
+import sys
 import logging
+from functools import partial
+from urllib.parse import urljoin
+
+# Shared crawler modules live in Final/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Final'))
+from canonicalizer import canonicalize_url
+from link_extractor import iter_hrefs
+from fetch_policy import FetchPolicy
+from metrics import CrawlMetrics, timed_get
+from streaming import StreamedBody
+from scope import Scope
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -15,92 +25,33 @@ logger = logging.getLogger(__name__)
 crawled_count = 0
 total_urls_to_crawl = 200
 
-# Function to fetch URLs and their status codes
-# Function to fetch URLs and their status codes
-def fetch_urls(url_list, news_site_name, lock):
-    global crawled_count
-    with lock:
-        if crawled_count >= total_urls_to_crawl:
-            return
-    fetched_urls = []
-    total_urls = len(url_list)
-    for i, url in enumerate(url_list):
-        if crawled_count >= total_urls_to_crawl:
-            break
-        try:
-            response = requests.get(url)
-            status_code = response.status_code
-            fetched_urls.append([url, status_code])
-        except Exception as e:
-            fetched_urls.append([url, str(e)])
-            logger.error(f"Error fetching URL: {url}, {e}")
-        print(f"Fetching {i + 1}/{total_urls} - URL: {url}")  # Progress indicator
-        with lock:
-            crawled_count += 1
-
-    with open(f'fetch_{news_site_name}.csv', 'w', newline='') as file:
+# Function to record metadata for a streamed response, returns the row and the hrefs found on HTML, Word
+# and PDF documents. Those are parsed as they download, images and everything else are only sized
+# (see Final/streaming.py)
+def visit_record(url, response, body):
+    content_type = response.headers.get('Content-Type', 'Unknown')
+    if any(content_type.startswith(mime) for mime in ['text/html', 'application/msword', 'application/pdf']):
+        hrefs = list(iter_hrefs(body))
+        return [url, body.size, len(hrefs), content_type], hrefs
+    body.drain()
+    return [url, body.size, 0, content_type], []
+
+
+# Function to write collected rows to a CSV file
+def write_rows(path, header, rows):
+    with open(path, 'w', newline='') as file:
         writer = csv.writer(file)
-        writer.writerow(['URL', 'Status'])
-        writer.writerows(fetched_urls)
-
-# Function to visit URLs, save successfully downloaded files, and record metadata
-def visit_urls(url_list, news_site_name, lock):
-    with lock:
-        global crawled_count
-        if crawled_count >= total_urls_to_crawl:
-            return
-    visited_urls = []
-    total_urls = len(url_list)
-    for i, url in enumerate(url_list):
-        try:
-            response = requests.get(url)
-            content_type = response.headers.get('Content-Type', 'Unknown')
-            if any(content_type.startswith(mime) for mime in ['text/html', 'application/msword', 'application/pdf']):
-                soup = BeautifulSoup(response.content, 'html.parser')
-                outlinks = soup.find_all('a', href=True)
-                outlinks_count = len(outlinks)
-                visited_urls.append([url, len(response.content), outlinks_count, content_type])
-            else:
-                # Record metadata for images
-                ext = mimetypes.guess_extension(content_type.split(';')[0])
-                if ext in {'.jpeg', '.jpg', '.png', '.gif'}:
-                    img_info = response.headers
-                    visited_urls.append([url, img_info.get('Content-Length', 0), 0, content_type])
-                else:
-                    visited_urls.append([url, len(response.content), 0, content_type])
-        except Exception as e:
-            visited_urls.append([url, str(e), 0, 'Unknown'])
-            logger.error(f"Error visiting URL: {url}, {e}")
+        writer.writerow(header)
+        writer.writerows(rows)
 
-        print(f"Visiting {i + 1}/{total_urls} - URL: {url}")  # Progress indicator
 
-        with lock:
-            crawled_count += 1
-            if crawled_count >= total_urls_to_crawl:
-                break
-
-    with lock:
-        with open(f'visit_{news_site_name}.csv', 'w', newline='') as file:
-            writer = csv.writer(file)
-            writer.writerow(['URL', 'Size', 'Outlinks', 'Content-Type'])
-            writer.writerows(visited_urls)
-
-
-# Function to extract domain from URL
-def get_domain(url):
-    parsed_url = urlparse(url)
-    return parsed_url.netloc
-
-
-# Function to extract base URL
-def get_base_url(url):
-    parsed_url = urlparse(url)
-    return parsed_url.scheme + '://' + parsed_url.netloc
-
-
-# Function to crawl URLs
-def crawl(q, domain, visited, all_urls, lock, max_depth=16):
+# Function to crawl URLs, each URL is downloaded once and that response feeds the frontier,
+# the fetch record and the visit record
+def crawl(q, scope, visited, all_urls, fetched_urls, visited_urls, lock, max_depth=16, metrics=None, policy=None):
     global crawled_count
+    metrics = metrics or CrawlMetrics()
+    # Timeouts, retries with backoff and a per-host circuit breaker (see Final/fetch_policy.py)
+    policy = policy or FetchPolicy(metrics=metrics)
     while True:
         with lock:
             if crawled_count >= total_urls_to_crawl:
@@ -110,24 +61,38 @@ def crawl(q, domain, visited, all_urls, lock, max_depth=16):
             if url in visited or depth > max_depth:
                 continue
             visited.add(url)
-            print(f"Crawling {crawled_count + 1} - Current URL: {url}")
+            logger.debug(f"Crawling {crawled_count + 1} - Current URL: {url}")
             all_urls.add(url)
             with lock:
                 crawled_count += 1
-                print(f"Progress: {crawled_count} / {total_urls_to_crawl}")  # Progress indicator
+                logger.debug(f"Progress: {crawled_count} / {total_urls_to_crawl}")  # Progress indicator
                 if crawled_count >= total_urls_to_crawl:
                     break
-            response = requests.get(url)
+            try:
+                response, _ = policy.get(partial(timed_get, metrics, requests.get), url, stream=True)
+            except Exception as e:
+                logger.error(f"Error fetching URL: {url}, {e}")
+                with lock:
+                    fetched_urls.append([url, str(e)])
+                    visited_urls.append([url, str(e), 0, 'Unknown'])
+                continue
+            metrics.inc('pages_fetched')
+            metrics.inc(f'status_{response.status_code}')
+            with metrics.timer('parse_seconds'):
+                visit_row, hrefs = visit_record(url, response, StreamedBody(response, metrics=metrics))
+            with lock:
+                fetched_urls.append([url, response.status_code])
+                visited_urls.append(visit_row)
             if response.status_code == 200:
-                soup = BeautifulSoup(response.content, 'html.parser')
-                for link in soup.find_all('a', href=True):
-                    next_url = urljoin(url, link['href'])
-                    if get_domain(next_url) == domain:
+                for href in hrefs:
+                    next_url = canonicalize_url(urljoin(url, href.strip()))
+                    if not next_url:
+                        continue
+                    if scope.admit(next_url, depth + 1):
                         q.put((next_url, depth + 1))
         except queue.Empty:
             break
         except Exception as e:
-            print(f"Error crawling {url}: {e}")
             logger.error(f"Error crawling URL: {url}, {e}")
             continue  # Continue crawling even if there's an error
 
@@ -135,13 +100,10 @@ def crawl(q, domain, visited, all_urls, lock, max_depth=16):
 
 
 # Function to categorize URLs
-def categorize_urls(urls, news_site_name, base_url):
+def categorize_urls(urls, news_site_name, scope):
     categorized_urls = []
     for url in urls:
-        if url.startswith(base_url):
-            categorized_urls.append([url, 'OK'])
-        else:
-            categorized_urls.append([url, 'N_OK'])
+        categorized_urls.append([url, scope.label(url)])
 
     with open(f'urls_{news_site_name}.csv', 'w', newline='') as file:
         writer = csv.writer(file)
@@ -150,28 +112,39 @@ def categorize_urls(urls, news_site_name, base_url):
 
 
 def main(url, news_site_name):
-    domain = get_domain(url)
-    base_url = get_base_url(url)
+    # Only the news site is crawled, other URLs are labelled N_OK (see Final/scope.py)
+    scope = Scope.for_site(url, follow_out_of_scope=False)
     q = queue.Queue()
-    q.put((url, 1))  # Include initial URL and depth
+    q.put((canonicalize_url(url), 1))  # Include initial URL and depth
     all_urls = set()
     visited = set()
+    fetched_urls = []
+    visited_urls = []
     lock = threading.Lock()
 
+    # Progress line every 10 seconds instead of a print per URL
+    metrics = CrawlMetrics()
+    metrics.gauge('frontier_size', q.qsize)
+    metrics.start()
+    policy = FetchPolicy(metrics=metrics)  # One circuit breaker shared by all threads
+
     # Create and start 50 threads
     threads = []
     for _ in range(16):
-        t = threading.Thread(target=crawl, args=(q, domain, visited, all_urls, lock))
+        t = threading.Thread(target=crawl, args=(q, scope, visited, all_urls, fetched_urls, visited_urls, lock),
+                             kwargs={'metrics': metrics, 'policy': policy})
         t.start()
         threads.append(t)
 
     # Wait for all threads to finish
     for t in threads:
         t.join()
+    metrics.stop()
+    logger.info(metrics.summary())
 
-    categorize_urls(all_urls, news_site_name, base_url)
-    fetch_urls(all_urls, news_site_name, lock)
-    visit_urls(all_urls, news_site_name, lock)
+    categorize_urls(all_urls, news_site_name, scope)
+    write_rows(f'fetch_{news_site_name}.csv', ['URL', 'Status'], fetched_urls)
+    write_rows(f'visit_{news_site_name}.csv', ['URL', 'Size', 'Outlinks', 'Content-Type'], visited_urls)
     print("Crawling Completed!")
 
 
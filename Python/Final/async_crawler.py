@@ -0,0 +1,156 @@
+import asyncio
+import hashlib
+import logging
+import time
+import aiohttp
+from main_code import Crawler
+from near_dup import StreamingSimHash
+from streaming import DRAIN_BYTES, body_charset, body_kind, incremental_decoder
+
+
+class AsyncCrawler(Crawler):
+    # Same outputs as Crawler, but every fetch runs on one event loop instead of a thread each
+    def __init__(self, base_url, urls=[], max_pages=20000, max_depth=16, concurrency=1000, seen_mode='exact',
+                 log_formats=('csv',), scope=None):
+        super().__init__(base_url, urls, max_records=max_pages, max_depth=max_depth, seen_mode=seen_mode,
+                         log_formats=log_formats, scope=scope)
+        self.max_pages = max_pages
+        self.concurrency = concurrency
+        self.downloading = 0
+        self.metrics.gauge('in_flight', lambda: self.downloading)
+        # Every scheduled task is a pending URL, there is no separate frontier
+        self.metrics.gauge('frontier_size', lambda: len(self.tasks))
+        self.tasks = {}
+
+    async def download_url(self, session, url):
+        try:
+            async with self.semaphore:
+                self.downloading += 1
+                try:
+                    start = time.perf_counter()
+                    async with session.get(url) as response:
+                        first_byte = time.perf_counter()
+                        self.metrics.observe('ttfb_seconds', first_byte - start)
+                        content_type = response.headers.get('Content-Type', '')
+                        kind = body_kind(content_type)
+                        if kind is None:
+                            return [], response.status, 0, content_type, True, None
+                        declared = response.content_length
+                        if kind == 'size' and declared is not None and declared > DRAIN_BYTES:
+                            self.metrics.inc('bytes_not_read', declared)
+                            return [], response.status, declared, content_type, False, None
+                        return await self.read_body(response, kind, content_type, first_byte)
+                finally:
+                    self.downloading -= 1
+        except Exception as e:
+            logging.exception(f'Error downloading {url}: {e}')
+            return [], 0, 0, '', True, None
+
+    async def read_body(self, response, kind, content_type, first_byte):
+        # Like StreamedBody: decompressed and decoded chunk by chunk as it arrives, with the same
+        # body hash and size cap. Only the decoded text of an HTML page is kept.
+        chunks, size, complete = [], 0, True
+        content_hash = hashlib.blake2b(digest_size=16)
+        decoder = None
+        async for chunk in response.content.iter_chunked(64 * 1024):
+            if size + len(chunk) > self.max_body_bytes:
+                self.metrics.inc('bodies_over_limit')
+                complete = False
+                break
+            size += len(chunk)
+            content_hash.update(chunk)
+            if kind == 'parse':
+                if decoder is None:
+                    decoder = incremental_decoder(body_charset(content_type, chunk))
+                chunks.append(decoder.decode(chunk))
+        if decoder is not None:
+            chunks.append(decoder.decode(b'', final=True))
+        self.metrics.observe('download_seconds', time.perf_counter() - first_byte)
+        # aiohttp hands over the body decompressed, so this is not the size on the wire
+        self.metrics.inc('bytes_downloaded', size)
+        return chunks, response.status, size, content_type, False, content_hash.hexdigest() if complete else None
+
+    async def crawl(self, session, url, depth):
+        if self.fetched_pages >= self.max_pages or depth > self.max_depth:
+            return []
+        if not self.visited_urls.add_if_absent(url):
+            return []
+        logging.debug(f'Crawling {url} (depth {depth})')
+        # Counted before the await, otherwise every task started meanwhile passes the page limit
+        self.fetched_pages += 1
+        html, status_code, size, content_type, skip, content_hash = await self.download_url(session, url)
+        # A fetch that got no response is logged with status 0 and counts as failed, like in Crawler
+        self.metrics.inc('pages_fetched')
+        self.metrics.inc(f'status_{status_code}')
+
+        # No retries or circuit breaker in this engine
+        self.writer.writerow('fetch', [url, status_code, 0, 0])
+
+        if not skip:
+            # Parsing is CPU bound, keep it off the event loop so in-flight fetches keep moving
+            loop = asyncio.get_running_loop()
+            duplicate, hasher = None, None
+            if self.dedup is not None and content_hash and status_code == 200 and body_kind(content_type) == 'parse':
+                hasher = StreamingSimHash(self.dedup.shingle_size)  # Fed by the parser, like in Crawler
+            outlinks = await loop.run_in_executor(None, self.parse_outlinks, url, html if hasher is None else hasher.feed(html))
+            if hasher is not None:
+                duplicate = await loop.run_in_executor(None, self.check_duplicate, content_hash, hasher)
+                if duplicate:
+                    outlinks = []
+            self.writer.writerows('urls', [[outlink, self.scope.label(outlink)] for outlink in outlinks])
+            self.writer.writerow('visit', [url, size, len(outlinks), content_type, duplicate or ''])
+            return outlinks
+        return []
+
+    def parse_outlinks(self, url, html):
+        with self.metrics.timer('parse_seconds'):
+            return list(self.get_linked_urls(url, html))
+
+    def schedule(self, session, url, depth):
+        task = asyncio.create_task(self.crawl(session, url, depth))
+        self.tasks[task] = (url, depth)
+
+    async def crawl_all(self):
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        self.tasks = {}
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        async with aiohttp.ClientSession(connector=connector, trace_configs=[self.connect_trace()]) as session:
+            for url, depth in self.urls_to_visit:
+                if self.admit(url, depth):
+                    self.schedule(session, url, depth)
+            while self.tasks:
+                done, _ = await asyncio.wait(self.tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    url, depth = self.tasks.pop(task)
+                    if self.fetched_pages >= self.max_pages or depth >= self.max_depth:
+                        continue
+                    for outlink in set(task.result()):
+                        if outlink not in self.visited_urls and self.admit(outlink, depth + 1):
+                            self.schedule(session, outlink, depth + 1)
+
+    def connect_trace(self):
+        # DNS + connect time of every new connection, the aiohttp side of connect_seconds
+        trace = aiohttp.TraceConfig()
+
+        async def on_start(session, context, params):
+            context.connect_start = time.perf_counter()
+
+        async def on_end(session, context, params):
+            self.metrics.observe('connect_seconds', time.perf_counter() - context.connect_start)
+
+        trace.on_connection_create_start.append(on_start)
+        trace.on_connection_create_end.append(on_end)
+        return trace
+
+    def run(self):
+        self.metrics.start(self.metrics_interval, self.metrics_port)
+        try:
+            asyncio.run(self.crawl_all())
+        finally:
+            self.writer.close()
+            self.metrics.stop()
+        logging.info(self.metrics.summary())
+
+
+if __name__ == '__main__':
+    AsyncCrawler(base_url='https://www.nytimes.com/', urls=['https://www.nytimes.com/']).run()
@@ -0,0 +1,987 @@
+import argparse
+import csv
+import itertools
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from mock_site import start_mock_site, start_mock_site_process
+
+# Benchmarks for the crawler components, run `python benchmark.py <name> --help` for options
+
+
+def peak_rss_mb():
+    # ru_maxrss is reported in KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def count_rows(path):
+    with open(path, encoding='utf-8') as file:
+        return sum(1 for _ in file) - 1
+
+
+# Runs a single engine in this process, the parent reads the JSON line it prints
+def run_engine(args):
+    if args.engine == 'threads':
+        from main_code import Crawler
+        crawler = Crawler(args.base_url, [args.base_url], args.max_pages)
+    else:
+        from async_crawler import AsyncCrawler
+        crawler = AsyncCrawler(args.base_url, [args.base_url], args.max_pages, concurrency=args.concurrency)
+    start = time.perf_counter()
+    crawler.run()
+    elapsed = time.perf_counter() - start
+    pages = count_rows(f'fetch_{crawler.site_name}.csv')
+    print(json.dumps({'engine': args.engine, 'pages': pages, 'seconds': round(elapsed, 3),
+                      'pages_per_sec': round(pages / elapsed, 1), 'peak_rss_mb': round(peak_rss_mb(), 1)}))
+
+
+def bench_engines(args):
+    server = start_mock_site(pages=args.pages, fanout=args.fanout, page_size=args.page_size)
+    try:
+        for engine in ['threads', 'async']:
+            # Separate process per engine so peak RSS is not shared between them
+            with tempfile.TemporaryDirectory() as workdir:
+                output = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), 'run-engine', '--engine', engine,
+                     '--base-url', server.base_url, '--max-pages', str(args.pages),
+                     '--concurrency', str(args.concurrency)],
+                    cwd=workdir, capture_output=True, text=True, check=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{result['engine']:>8}: {result['pages']} pages in {result['seconds']}s, "
+                  f"{result['pages_per_sec']} pages/sec, peak RSS {result['peak_rss_mb']} MB")
+    finally:
+        server.shutdown()
+
+
+def synthetic_urls(count):
+    for i in range(count):
+        yield f'https://www.nytimes.com/2024/{i % 12 + 1:02d}/{i % 28 + 1:02d}/section/story-{i}.html'
+
+
+def bench_seen(args):
+    from seen_store import make_seen_store
+    for size in args.sizes:
+        for mode in ['exact', 'bloom']:
+            options = {'capacity': size, 'error_rate': args.error_rate} if mode == 'bloom' else {}
+            store = make_seen_store(mode, **options)
+            start = time.perf_counter()
+            for url in synthetic_urls(size):
+                store.add_if_absent(url)
+            elapsed = time.perf_counter() - start
+            print(f'{mode:>6} {size:>10} URLs: {store.nbytes / size:6.2f} bytes/URL, '
+                  f'{store.nbytes / 2 ** 20:8.1f} MB, {size / elapsed:,.0f} inserts/sec')
+        if args.with_set:
+            # Baseline: the plain set of URL strings the crawler used to keep
+            tracemalloc.start()
+            urls = set(synthetic_urls(size))
+            used = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            print(f'{"set":>6} {size:>10} URLs: {used / size:6.2f} bytes/URL, {used / 2 ** 20:8.1f} MB')
+            del urls
+
+
+def sample_hrefs(count, nav_links=200, nav_share=0.8, links_per_page=100):
+    # Most hrefs on a news page are the same header/footer nav links repeated on every page.
+    # Each run of links_per_page hrefs comes from another page, which is their context.
+    rng = random.Random(0)
+    nav = [f'/section/{name}-{i}?smid=nav' for i, name in enumerate(['world', 'us', 'politics'] * (nav_links // 3))]
+    for i in range(count):
+        page = i // links_per_page
+        context = f'https://www.nytimes.com/2024/05/{page % 28 + 1:02d}/world/page-{page}.html'
+        if rng.random() < nav_share:
+            yield rng.choice(nav), context
+        else:
+            yield f'/2024/05/{i % 28 + 1:02d}/./world/story-{i}.html?utm_source=feed#comments', context
+
+
+def bench_canonicalize(args):
+    from urllib.parse import urljoin
+    from canonicalizer import URLCanonicalizer
+    hrefs = list(sample_hrefs(args.count))
+    # The context is part of the cache key unless the href is joined to it first, like the crawlers do
+    for label, cache_size, join in [('no cache', 0, True), ('LRU cache, href and context', args.cache_size, False),
+                                    ('LRU cache, joined URL', args.cache_size, True)]:
+        canonicalizer = URLCanonicalizer(cache_size=cache_size)
+        start = time.perf_counter()
+        for href, context in hrefs:
+            if join:
+                canonicalizer.canonicalize(urljoin(context, href))
+            else:
+                canonicalizer.canonicalize(href, context)
+        elapsed = time.perf_counter() - start
+        print(f'{label:>27}: {len(hrefs) / elapsed:,.0f} canonicalizations/sec ({canonicalizer.canonicalize.cache_info()})')
+
+
+def load_corpus(corpus_dir):
+    # Saved pages from a real crawl, or generated mock-site pages when no directory is given
+    if corpus_dir:
+        pages = []
+        for name in sorted(os.listdir(corpus_dir)):
+            with open(os.path.join(corpus_dir, name), encoding='utf-8', errors='replace') as file:
+                pages.append(file.read())
+        return pages
+    from mock_site import build_site
+    return [body.decode('utf-8') for body in build_site(pages=200, fanout=300, page_size=200_000).values()]
+
+
+def bench_extract(args):
+    from link_extractor import available_backends, get_link_extractor
+    pages = load_corpus(args.corpus)
+    megabytes = sum(len(page.encode('utf-8')) for page in pages) / 2 ** 20
+    try:
+        from bs4 import BeautifulSoup
+    except ImportError:
+        BeautifulSoup = None
+    reference = None
+    if BeautifulSoup:
+        start = time.perf_counter()
+        reference = [[a.get('href') for a in BeautifulSoup(page, 'html.parser').find_all('a', href=True)]
+                     for page in pages]
+        print(f'{"bs4":>10}: {megabytes / (time.perf_counter() - start):6.2f} MB/s')
+    for backend in available_backends():
+        extract = get_link_extractor(backend)
+        start = time.perf_counter()
+        results = [list(extract(page)) for page in pages]
+        speed = megabytes / (time.perf_counter() - start)
+        matches = sum(a == b for a, b in zip(results, reference)) if reference else None
+        summary = f', {matches}/{len(pages)} pages match bs4' if reference else ''
+        print(f'{backend:>10}: {speed:6.2f} MB/s{summary}')
+
+
+def bench_frontier(args):
+    from main_code import Crawler
+    from persistent_frontier import open_frontier
+    with tempfile.TemporaryDirectory() as workdir:
+        # Raw schedule + complete throughput
+        for label, path in [('memory', None), ('sqlite', os.path.join(workdir, 'ops.db'))]:
+            frontier = open_frontier(path)
+            urls = list(synthetic_urls(args.ops))
+            start = time.perf_counter()
+            for url in urls:
+                frontier.schedule(url, 2)
+            for url in urls:
+                frontier.complete(url)
+            frontier.close()
+            print(f'{label:>7}: {2 * args.ops / (time.perf_counter() - start):,.0f} frontier ops/sec')
+
+        # End-to-end crawl of the mock site, the persistent frontier has to stay within the budget
+        server = start_mock_site(pages=args.pages)
+        os.chdir(workdir)
+        try:
+            timings = {}
+            for label, path in [('memory', None), ('sqlite', os.path.join(workdir, 'crawl.db'))]:
+                start = time.perf_counter()
+                Crawler(server.base_url, [server.base_url], args.pages * 2, frontier_path=path).run()
+                timings[label] = time.perf_counter() - start
+                print(f'{label:>7}: crawled {args.pages} pages in {timings[label]:.2f}s')
+        finally:
+            server.shutdown()
+    overhead = timings['sqlite'] / timings['memory'] - 1
+    verdict = 'within' if overhead <= args.budget else 'OVER'
+    print(f'Persistent frontier overhead: {overhead:+.1%} ({verdict} the {args.budget:.0%} budget)')
+
+
+
+def bench_politeness(args):
+    from main_code import Crawler
+    robots_txt = f'User-agent: *\nDisallow: /section/page-{args.disallow}\n'
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        for polite in [False, True]:
+            # Fresh server per run so the rate window starts empty
+            server = start_mock_site(pages=args.pages, rate_limit=args.rate_limit, robots_txt=robots_txt)
+            try:
+                crawler = Crawler(server.base_url, [server.base_url], args.pages, max_workers=args.workers,
+                                  polite=polite, min_delay=args.min_delay, max_per_host=args.max_per_host)
+                start = time.perf_counter()
+                crawler.run()
+                elapsed = time.perf_counter() - start
+            finally:
+                server.shutdown()
+            with open(f'fetch_{crawler.site_name}.csv', encoding='utf-8') as file:
+                statuses = [line.split(',')[1] for line in file][1:]
+            ok, forbidden = statuses.count('200'), statuses.count('403')
+            blocked = len(crawler.robots.disallowed) if crawler.robots else 0
+            label = 'polite' if polite else 'impolite'
+            print(f'{label:>8}: {len(statuses)} fetches in {elapsed:.2f}s, {forbidden} x 403, '
+                  f'{ok / elapsed:.1f} 200s/sec, {blocked} URLs disallowed by robots.txt')
+
+
+def write_synthetic_logs(workdir, rows, unique_share=0.1, pages=20000):
+    # Crawl logs shaped like the nytimes run: ~10% of extracted URLs are unique
+    rng = random.Random(0)
+    unique = max(1, int(rows * unique_share))
+    with open(os.path.join(workdir, 'urls.csv'), 'w', encoding='utf-8') as file:
+        file.write('URL,Status\n')
+        for i in range(rows):
+            story = rng.randrange(unique)
+            status = 'OK' if story % 3 == 0 else 'N_OK'
+            file.write(f'https://www.nytimes.com/2024/05/{story % 28 + 1:02d}/world/story-{story}.html,{status}\n')
+    with open(os.path.join(workdir, 'fetch.csv'), 'w', encoding='utf-8') as file:
+        file.write('URL,Status\n')
+        for i in range(pages):
+            file.write(f'https://www.nytimes.com/page-{i}.html,{rng.choice([200] * 9 + [403])}\n')
+    with open(os.path.join(workdir, 'visit.csv'), 'w', encoding='utf-8') as file:
+        file.write('URL,Size,Out Links Found,Content Type\n')
+        for i in range(pages):
+            file.write(f'https://www.nytimes.com/page-{i}.html,{int(rng.lognormvariate(11, 2))},'
+                       f'{rows // pages},{rng.choice(["text/html; charset=utf-8", "application/pdf"])}\n')
+    return [os.path.join(workdir, name) for name in ['fetch.csv', 'urls.csv', 'visit.csv']]
+
+
+def bench_stats(args):
+    from stats import collate_statistics
+    with tempfile.TemporaryDirectory() as workdir:
+        fetch_file, urls_file, visit_file = write_synthetic_logs(workdir, args.rows)
+        report_file = os.path.join(workdir, 'report.txt')
+        start = time.perf_counter()
+        collate_statistics(fetch_file, urls_file, visit_file, report_file)
+        elapsed = time.perf_counter() - start
+        # Second pass under tracemalloc, which would skew the timing
+        tracemalloc.start()
+        collate_statistics(fetch_file, urls_file, visit_file, report_file)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        size = os.path.getsize(urls_file) / 2 ** 20
+        print(f'{args.rows:,} URL rows ({size:.0f} MB): report in {elapsed:.2f}s, '
+              f'{args.rows / elapsed:,.0f} rows/sec, peak traced memory {peak / 2 ** 20:.1f} MB')
+
+
+def import_baseline_mb():
+    # Peak RSS of a process that only imports pandas and numpy
+    code = 'import resource, numpy, pandas; print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)'
+    return float(subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout)
+
+
+def bench_report(args):
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'calculate_stats.py')
+    with tempfile.TemporaryDirectory() as workdir:
+        for path, name in zip(write_synthetic_logs(workdir, args.rows), ['fetch', 'urls', 'visit']):
+            os.rename(path, os.path.join(workdir, f'{name}_nytimes.csv'))
+        reports = {}
+        for label, chunksize in [('whole', 0), ('chunked', args.chunksize)]:
+            # Separate process per mode so peak RSS is not shared between them
+            start = time.perf_counter()
+            output = subprocess.run([sys.executable, script, '--chunksize', str(chunksize)],
+                                    cwd=workdir, capture_output=True, text=True, check=True).stdout
+            elapsed = time.perf_counter() - start
+            with open(os.path.join(workdir, 'CrawlReport_nytimes.txt'), encoding='utf-8') as file:
+                reports[label] = file.read()
+            distinct, peak = output.strip().splitlines()[-2:]
+            print(f'{label:>8}: {elapsed:.2f}s, {peak}, {distinct} distinct URLs')
+        print(f'pandas/numpy import baseline: {import_baseline_mb():.1f} MB')
+    print(f"Reports identical: {reports['whole'] == reports['chunked']}")
+
+
+def directory_size(path):
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+    return os.path.getsize(path)
+
+
+def bench_logs(args):
+    import pandas as pd
+    import calculate_stats
+    import stats
+    from columnar_log import read_log
+    from main_code import Crawler
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        server = start_mock_site(pages=args.pages, fanout=args.fanout)
+        try:
+            crawler = Crawler(server.base_url, [server.base_url], args.pages, log_formats=('csv', 'parquet'))
+            crawler.run()
+        finally:
+            server.shutdown()
+        logs = {}
+        for name in ['fetch', 'visit', 'urls']:
+            csv_path, parquet_path = f'{name}_{crawler.site_name}.csv', f'{name}_{crawler.site_name}.parquet'
+            logs[name] = csv_path, parquet_path
+            start = time.perf_counter()
+            rows = len(pd.read_csv(csv_path))
+            csv_load = time.perf_counter() - start
+            start = time.perf_counter()
+            read_log(parquet_path).to_pandas()
+            parquet_load = time.perf_counter() - start
+            print(f'{name:>6}: {rows:,} rows, CSV {directory_size(csv_path) / 2 ** 20:.2f} MB loads in {csv_load:.3f}s, '
+                  f'parquet {directory_size(parquet_path) / 2 ** 20:.2f} MB loads in {parquet_load:.3f}s')
+        # Both report scripts have to give the same answer from either format
+        for column in [0, 1]:
+            fetch_file, visit_file, urls_file = (logs[name][column] for name in ['fetch', 'visit', 'urls'])
+            stats.collate_statistics(fetch_file, urls_file, visit_file, f'report_{column}.txt')
+            calculate_stats.write_report(calculate_stats.load_statistics(fetch_file, visit_file, urls_file),
+                                         f'pandas_report_{column}.txt')
+        for report in ['report', 'pandas_report']:
+            with open(f'{report}_0.txt') as csv_report, open(f'{report}_1.txt') as parquet_report:
+                print(f'{report}: CSV and parquet reports identical: {csv_report.read() == parquet_report.read()}')
+
+
+CRAWLER_SCRIPTS = {
+    'crawl2': os.path.join('..', 'crawl2', 'crawl.py'),
+    'submission': os.path.join('..', '3725520208_CSCI572_HW2_Submission', 'crawl.py'),
+}
+
+
+def load_script(name):
+    # crawl2 and the submission are both crawl.py, so they are loaded from their path
+    import importlib.util
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), CRAWLER_SCRIPTS[name])
+    spec = importlib.util.spec_from_file_location(f'{name}_crawl', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def start_crawler(name, base_url, max_pages):
+    if name == 'main_code':
+        from main_code import Crawler
+        Crawler(base_url, [base_url], max_pages, metrics_interval=0).run()
+    elif name == 'crawl_18':
+        from crawl_18 import Crawler
+        Crawler(base_url, [base_url], max_pages, metrics_interval=0).run()
+    elif name == 'async':
+        from async_crawler import AsyncCrawler
+        AsyncCrawler(base_url, [base_url], max_pages).run()
+    elif name == 'crawl2':
+        load_script(name).main(base_url.rstrip('/'), 'mock', limit=max_pages)
+    else:
+        module = load_script(name)
+        module.total_urls_to_crawl = max_pages
+        module.main(base_url.rstrip('/'), 'mock')
+
+
+# Runs one crawler in this process under the profiling hooks, the parent reads the JSON line
+def run_crawler(args):
+    import glob
+    from profiling import FetchTimer, ThreadProfiler, phase_times
+    with FetchTimer() as fetches, ThreadProfiler() as profiler:
+        start = time.perf_counter()
+        start_crawler(args.crawler, args.base_url, args.max_pages)
+        elapsed = time.perf_counter() - start
+    pages = sum(count_rows(path) for path in glob.glob('fetch_*.csv'))
+    p50, p99 = fetches.quantile(0.5), fetches.quantile(0.99)
+    print(json.dumps({
+        'crawler': args.crawler, 'pages': pages, 'seconds': round(elapsed, 3),
+        'pages_per_sec': round(pages / elapsed, 1),
+        # aiohttp does not go through requests, so the async engine has no fetch latencies
+        'fetch_p50_ms': round(p50 * 1000, 2) if p50 is not None else None,
+        'fetch_p99_ms': round(p99 * 1000, 2) if p99 is not None else None,
+        'cpu_seconds': phase_times(profiler.stats()),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+    }))
+
+
+def bench_harness(args):
+    import platform
+    error_rates = {403: args.forbidden_rate, 404: args.not_found_rate, 500: args.server_error_rate}
+    server = start_mock_site(pages=args.pages, fanout=args.fanout, page_size=args.page_size,
+                             size_sigma=args.size_sigma, error_rates=error_rates,
+                             latency=args.latency, latency_jitter=args.latency_jitter, seed=args.seed)
+    results = []
+    try:
+        for crawler in args.crawlers:
+            # Separate process and directory per crawler, so neither RSS nor output files are shared
+            with tempfile.TemporaryDirectory() as workdir:
+                output = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), 'run-crawler', '--crawler', crawler,
+                     '--base-url', server.base_url, '--max-pages', str(args.max_pages)],
+                    cwd=workdir, capture_output=True, text=True, check=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            results.append(result)
+            cpu = result['cpu_seconds']
+            latency = (f"p50 {result['fetch_p50_ms']}ms p99 {result['fetch_p99_ms']}ms"
+                       if result['fetch_p50_ms'] is not None else 'latency n/a')
+            print(f"{crawler:>10}: {result['pages']} pages, {result['pages_per_sec']} pages/sec, {latency}, "
+                  f"peak RSS {result['peak_rss_mb']} MB, CPU " +
+                  ' '.join(f'{phase} {seconds}s' for phase, seconds in cpu.items()))
+    finally:
+        server.shutdown()
+    config = {name: value for name, value in vars(args).items() if name not in ('func', 'output', 'command')}
+    report = {'config': config, 'python': platform.python_version(), 'platform': platform.platform(),
+              'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'results': results}
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=2)
+    print(f'Results written to {args.output}')
+
+
+def bench_shards(args):
+    import csv
+    import glob
+    from sharded_crawl import ShardedCrawl
+    # Server in its own process, otherwise it shares a GIL with the single-shard run only
+    process, base_url, connection = start_mock_site_process(pages=args.pages, fanout=args.fanout,
+                                                            page_size=args.page_size, latency=args.latency)
+    print(f'{os.cpu_count()} CPUs')
+    cwd = os.getcwd()
+    baseline = None
+    try:
+        for shards in args.shards:
+            with tempfile.TemporaryDirectory() as workdir:
+                os.chdir(workdir)
+                try:
+                    start = time.perf_counter()
+                    ShardedCrawl(base_url, [base_url], args.max_pages, shards=shards, max_workers=args.workers,
+                                 metrics_interval=0).run()
+                    elapsed = time.perf_counter() - start
+                    with open(glob.glob('fetch_*.csv')[0], encoding='utf-8') as file:
+                        urls = [row[0] for row in csv.reader(file)][1:]
+                finally:
+                    os.chdir(cwd)
+            rate = len(urls) / elapsed
+            baseline = baseline or rate
+            print(f'{shards:>3} shards: {len(urls)} pages ({len(urls) - len(set(urls))} fetched twice) in '
+                  f'{elapsed:.2f}s, {rate:.1f} pages/sec, {rate / baseline:.2f}x')
+    finally:
+        connection.send('stop')
+        process.join()
+
+
+def bench_distributed(args):
+    import csv
+    import glob
+    import multiprocessing
+    import threading
+    from distributed_crawl import Coordinator, run_worker
+    process, base_url, connection = start_mock_site_process(pages=args.pages, fanout=args.fanout,
+                                                            page_size=args.page_size, latency=args.latency,
+                                                            stall_rate=args.stall_rate,
+                                                            stall_seconds=args.stall_seconds)
+    print(f'{os.cpu_count()} CPUs')
+    context = multiprocessing.get_context('spawn')
+    cwd = os.getcwd()
+    baseline = None
+    try:
+        for workers in args.workers:
+            with tempfile.TemporaryDirectory() as workdir:
+                os.chdir(workdir)
+                try:
+                    coordinator = Coordinator(base_url, [base_url], args.max_pages, lease_timeout=args.lease_timeout,
+                                              metrics_interval=0)
+                    processes = [context.Process(target=run_worker, args=(coordinator.url, {
+                        'name': f'worker-{index}', 'max_workers': args.threads, 'metrics_interval': 0}))
+                        for index in range(workers)]
+                    start = time.perf_counter()
+                    for worker in processes:
+                        worker.start()
+                    if args.kill_after:
+                        # Lose a worker mid-crawl, its leases have to be crawled by the others
+                        threading.Timer(args.kill_after, processes[0].kill).start()
+                    coordinator.run()
+                    elapsed = time.perf_counter() - start
+                    for worker in processes:
+                        worker.join()
+                    with open(glob.glob('fetch_*.csv')[0], encoding='utf-8') as file:
+                        urls = [row[0] for row in csv.reader(file)][1:]
+                finally:
+                    os.chdir(cwd)
+            rate = len(urls) / elapsed
+            baseline = baseline or rate
+            print(f'{workers:>3} workers: {len(urls)} pages ({len(urls) - len(set(urls))} logged twice, '
+                  f'{coordinator.metrics.value("leases_expired")} leases re-issued, '
+                  f'{coordinator.metrics.value("late_pages")} late pages dropped) in {elapsed:.2f}s, '
+                  f'{rate:.1f} pages/sec, {rate / baseline:.2f}x')
+    finally:
+        connection.send('stop')
+        process.join()
+
+
+def bench_cache(args):
+    from main_code import Crawler
+    server = start_mock_site(pages=args.pages, fanout=args.fanout, page_size=args.page_size, seed=args.seed)
+    cwd = os.getcwd()
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            os.chdir(workdir)
+            try:
+                for run in ['cold', 'warm']:
+                    if run == 'warm':
+                        # Some pages change between crawls, like front and section pages do
+                        rng = random.Random(args.seed)
+                        for path in rng.sample(sorted(server.site), int(len(server.site) * args.changed)):
+                            server.site[path] = server.site[path].replace(b'</body>', b'<p>updated</p></body>')
+                    crawler = Crawler(server.base_url, [server.base_url], args.pages, max_workers=args.workers,
+                                      cache_path='http_cache.db', metrics_interval=0)
+                    start = time.perf_counter()
+                    crawler.run()
+                    elapsed = time.perf_counter() - start
+                    parse = crawler.metrics.histogram('parse_seconds')
+                    print(f'{run}: {count_rows(f"fetch_{crawler.site_name}.csv")} pages in {elapsed:.2f}s, '
+                          f'{crawler.metrics.value("bytes_downloaded") / 2 ** 20:.2f} MB downloaded, '
+                          f'{parse.count} pages parsed, {crawler.cache.summary()}')
+            finally:
+                os.chdir(cwd)
+    finally:
+        server.shutdown()
+
+
+def bench_streaming(args):
+    from main_code import Crawler
+    server = start_mock_site(pages=args.pages, fanout=args.fanout, page_size=args.page_size,
+                             size_sigma=args.size_sigma, media=args.media, media_size=int(args.media_mb * 2 ** 20))
+    cwd = os.getcwd()
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            os.chdir(workdir)
+            try:
+                crawler = Crawler(server.base_url, [server.base_url], args.max_pages, max_workers=args.workers,
+                                  max_body_bytes=int(args.max_body_mb * 2 ** 20), metrics_interval=0)
+                start = time.perf_counter()
+                crawler.run()
+                elapsed = time.perf_counter() - start
+                pages = count_rows(f'fetch_{crawler.site_name}.csv')
+            finally:
+                os.chdir(cwd)
+    finally:
+        server.shutdown()
+    read, not_read = crawler.metrics.value('bytes_downloaded'), crawler.metrics.value('bytes_not_read')
+    print(f'{pages} pages in {elapsed:.2f}s, {read / 2 ** 20:.1f} MB read, {not_read / 2 ** 20:.1f} MB not read '
+          f'({not_read / max(read + not_read, 1):.0%} of the bodies), '
+          f'{crawler.metrics.value("bodies_over_limit")} bodies over the size cap, peak RSS {peak_rss_mb():.1f} MB')
+
+
+def bench_resilience(args):
+    from main_code import Crawler
+    from fetch_policy import CircuitBreaker, FetchPolicy
+    policies = {
+        'no retries': lambda: FetchPolicy(timeout=None, retries=0, breaker=False),
+        'retry+breaker': lambda: FetchPolicy(timeout=(5.0, args.read_timeout), retries=args.retries,
+                                             backoff=args.backoff, max_retry_after=args.retry_after + 1,
+                                             breaker=CircuitBreaker(cooldown=args.cooldown)),
+    }
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        try:
+            for label, policy in policies.items():
+                # Fresh server per run so the outage window starts with the crawl
+                server = start_mock_site(pages=args.pages, fanout=args.fanout, seed=args.seed,
+                                         transient_rates={503: args.error_rate}, retry_after=args.retry_after,
+                                         stall_rate=args.stall_rate, stall_seconds=args.stall_seconds,
+                                         outage=(args.outage_start, args.outage_start + args.outage_seconds))
+                try:
+                    crawler = Crawler(server.base_url, [server.base_url], args.pages, max_workers=args.workers,
+                                      fetch_policy=policy(), metrics_interval=0)
+                    start = time.perf_counter()
+                    crawler.run()
+                    elapsed = time.perf_counter() - start
+                finally:
+                    server.shutdown()
+                with open(f'fetch_{crawler.site_name}.csv', encoding='utf-8') as file:
+                    statuses = [line.split(',')[1] for line in file][1:]
+                counters = ', '.join(f'{name} {crawler.metrics.value(name)}' for name in
+                                     ['retries', 'timeouts', 'breaker_trips', 'breaker_deferred'])
+                print(f'{label:>13}: {len(statuses)} fetches in {elapsed:.2f}s, {statuses.count("200")} x 200, '
+                      f'{sum(status.startswith("5") for status in statuses)} x 5xx, {counters}')
+        finally:
+            os.chdir(cwd)
+
+
+def bench_dedup(args):
+    from main_code import Crawler
+    from near_dup import NearDuplicateIndex
+    server = start_mock_site(pages=args.pages, fanout=args.fanout, page_size=args.page_size, seed=args.seed,
+                             article_words=args.article_words, mirrors=args.mirrors)
+    cwd = os.getcwd()
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            os.chdir(workdir)
+            try:
+                for dedup in [False, True]:
+                    crawler = Crawler(server.base_url, [server.base_url], args.max_pages, max_workers=args.workers,
+                                      dedup=dedup, metrics_interval=0)
+                    start = time.perf_counter()
+                    crawler.run()
+                    elapsed = time.perf_counter() - start
+                    label = 'dedup' if dedup else 'no dedup'
+                    parse, check = crawler.metrics.histogram('parse_seconds'), crawler.metrics.histogram('dedup_seconds')
+                    duplicates = (f', {crawler.metrics.value("duplicates_exact")} exact and '
+                                  f'{crawler.metrics.value("duplicates_near")} near duplicates, '
+                                  f'{check.total / max(check.count, 1) * 1e3:.2f} ms per check' if dedup else '')
+                    print(f'{label:>8}: {count_rows(f"fetch_{crawler.site_name}.csv")} pages in {elapsed:.2f}s, '
+                          f'{parse.count} parsed at {parse.total / max(parse.count, 1) * 1e3:.2f} ms each, '
+                          f'{count_rows(f"urls_{crawler.site_name}.csv")} outlinks logged{duplicates}')
+            finally:
+                os.chdir(cwd)
+    finally:
+        server.shutdown()
+    # The index on its own at crawl scale, random fingerprints stand in for pages
+    index = NearDuplicateIndex()
+    rng = random.Random(args.seed)
+    start = time.perf_counter()
+    for _ in range(args.index_pages):
+        index.exact.add_fingerprint(rng.getrandbits(64) or 1)
+        index.check_simhash(rng.getrandbits(64))
+    elapsed = time.perf_counter() - start
+    print(f'index: {len(index)} pages in {index.nbytes / 2 ** 20:.1f} MB (peak RSS {peak_rss_mb():.1f} MB), '
+          f'{elapsed / args.index_pages * 1e6:.1f} us per lookup and insert')
+
+
+def bench_dns(args):
+    from dns_cache import DNSCache
+    from main_code import Crawler
+    from mock_site import FakeResolver
+    server = start_mock_site(pages=args.pages, fanout=args.fanout, page_size=args.page_size, hosts=args.hosts)
+    # ttl=0 resolves on every new connection, max_prefetching=0 turns pre-resolution off
+    configs = {'no cache': {'ttl': 0, 'max_prefetching': 0}, 'cache': {'max_prefetching': 0}, 'cache+prefetch': {}}
+    cwd = os.getcwd()
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            os.chdir(workdir)
+            try:
+                for label, options in configs.items():
+                    resolver = FakeResolver(latency=args.dns_latency)
+                    dns = DNSCache(resolver, **options)
+                    crawler = Crawler(server.base_url, [server.base_url], args.max_pages, max_workers=args.workers,
+                                      dns_cache=dns, metrics_interval=0)
+                    start = time.perf_counter()
+                    crawler.run()
+                    elapsed = time.perf_counter() - start
+                    connect = crawler.metrics.histogram('connect_seconds')
+                    print(f'{label:>14}: {count_rows(f"fetch_{crawler.site_name}.csv")} pages in {elapsed:.2f}s, '
+                          f'{resolver.lookups} resolver calls, connect p50<={connect.quantile(0.5) * 1000:g}ms '
+                          f'p99<={connect.quantile(0.99) * 1000:g}ms, {dns.summary()}')
+            finally:
+                os.chdir(cwd)
+    finally:
+        server.shutdown()
+
+
+def fetch_buffered(session, url, extract_hrefs):
+    # How download_url read pages before streaming.py: the raw bytes and the decoded text at once
+    response = session.get(url, timeout=30)
+    html = response.text
+    return len(list(extract_hrefs(html))), len(response.content)
+
+
+def fetch_streamed(session, url, extract_hrefs):
+    from streaming import StreamedBody
+    body = StreamedBody(session.get(url, timeout=30, stream=True))
+    return len(list(extract_hrefs(body))), body.size
+
+
+def fetch_deduped(session, url, extract_hrefs):
+    # Crawler with dedup on, the SimHash is computed over the chunks on their way to the parser
+    from near_dup import StreamingSimHash
+    from streaming import StreamedBody
+    body = StreamedBody(session.get(url, timeout=30, stream=True))
+    hasher = StreamingSimHash()
+    links = len(list(extract_hrefs(hasher.feed(body))))
+    hasher.digest()
+    return links, body.size
+
+
+def bench_bodies(args):
+    from concurrent.futures import ThreadPoolExecutor
+    from connection_pool import build_session
+    from link_extractor import get_link_extractor
+    server = start_mock_site(pages=args.pages, fanout=args.fanout, page_size=int(args.page_mb * 2 ** 20),
+                             article_words=args.article_words, compress=args.gzip)
+    urls = [f'{server.base_url}section/page-{page}.html' for page in range(args.pages)]
+    extract_hrefs = get_link_extractor('htmlparser')
+    try:
+        for label, fetch in [('buffered', fetch_buffered), ('dedup', fetch_deduped), ('streamed', fetch_streamed)]:
+            session = build_session(args.workers)
+            tracemalloc.start()
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.workers) as executor:
+                results = list(executor.map(lambda url: fetch(session, url, extract_hrefs), urls))
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            session.close()
+            size = sum(size for _, size in results)
+            print(f'{label}: {len(results)} pages ({size / 2 ** 20:.1f} MB) in {elapsed:.2f}s, '
+                  f'{sum(links for links, _ in results)} links, peak {peak / 2 ** 20:.1f} MB traced, '
+                  f'{peak / args.workers / 2 ** 20:.2f} MB per worker')
+    finally:
+        server.shutdown()
+
+
+def outlink_sample(urls_file, count):
+    # Outlinks from a crawl's urls CSV, or a nytimes-like mix when the file is missing or is a Git LFS pointer
+    if urls_file and os.path.exists(urls_file):
+        with open(urls_file, newline='', encoding='utf-8', errors='replace') as file:
+            if not file.readline().startswith('version https://git-lfs'):
+                return [row[0] for row in itertools.islice(csv.reader(file), count) if row]
+    rng = random.Random(0)
+    stories = synthetic_urls(count)
+    external = ['https://www.facebook.com/nytimes', 'https://twitter.com/nytimes', 'https://cooking.nytimes.com/',
+                'https://www.nytimes.com.example.org/', 'https://help.nytimes.com/hc/en-us', 'https://www.nytco.com/']
+    urls = []
+    for i, story in enumerate(stories):
+        draw = rng.random()
+        if draw < 0.2:
+            urls.append(f'{rng.choice(external)}?i={i}')
+        elif draw < 0.3:
+            urls.append(f'https://www.nytimes.com/video/world/{i}')
+        elif draw < 0.35:
+            urls.append(f'https://static01.nyt.com/images/2024/{i}.jpg')
+        else:
+            urls.append(story)
+    return urls
+
+
+def bench_scope(args):
+    from urllib.parse import urlparse
+    from scope import Scope
+    urls = outlink_sample(args.urls_file, args.count)
+    base_url = 'https://www.nytimes.com/'
+    scope = Scope.for_site(base_url, exclude_paths=['/video/', '/slideshow/'],
+                           exclude_extensions=['jpg', 'png', 'gif', 'pdf', 'mp4'], exclude_patterns=[r'[?&]smid='])
+
+    base_netloc = urlparse(base_url).netloc
+
+    def per_outlink(url):
+        # Crawler.crawl before scope.py, base_url parsed again for every outlink
+        return 'OK' if urlparse(url).netloc == urlparse(base_url).netloc else 'N_OK'
+
+    def hoisted(url):
+        return 'OK' if urlparse(url).netloc == base_netloc else 'N_OK'
+
+    methods = [('urlparse x2', per_outlink), ('urlparse x1', hoisted), ('scope.label', scope.label),
+               ('scope.classify', scope.classify)]
+    results = {}
+    for label, method in methods:
+        start = time.perf_counter()
+        results[label] = list(map(method, urls))
+        elapsed = time.perf_counter() - start
+        print(f'{label:>14}: {len(urls) / elapsed:12,.0f} classifications/sec')
+    agree = sum(old == new for old, new in zip(results['urlparse x2'], results['scope.label']))
+    counts = {kind: results['scope.classify'].count(kind) for kind in sorted(set(results['scope.classify']))}
+    print(f'{len(urls)} URLs, scope.label agrees with the netloc check on {agree}, classify: {counts}')
+
+
+def bench_live_report(args):
+    import calculate_stats
+    from crawl_report import CrawlReport
+    from stats import collate_statistics, read_rows
+    with tempfile.TemporaryDirectory() as workdir:
+        fetch_file, urls_file, visit_file = write_synthetic_logs(workdir, args.rows)
+        report = CrawlReport(os.path.join(workdir, 'live.txt'))
+        # What the writer thread does while the crawl runs, batch by batch
+        feed = 0.0
+        for name, path in [('fetch', fetch_file), ('visit', visit_file), ('urls', urls_file)]:
+            rows = read_rows(path)
+            while True:
+                batch = list(itertools.islice(rows, 1000))
+                if not batch:
+                    break
+                start = time.perf_counter()
+                report.add_rows(name, batch)
+                feed += time.perf_counter() - start
+        start = time.perf_counter()
+        report.snapshot()
+        final = time.perf_counter() - start
+        start = time.perf_counter()
+        collate_statistics(fetch_file, urls_file, visit_file, os.path.join(workdir, 'stats.txt'))
+        rescan = time.perf_counter() - start
+        start = time.perf_counter()
+        exact = calculate_stats.chunked_statistics(args.chunksize, fetch_file, visit_file, urls_file)
+        chunked = time.perf_counter() - start
+        size = sum(os.path.getsize(path) for path in [fetch_file, urls_file, visit_file]) / 2 ** 20
+        live = report.stats()
+        print(f'{args.rows:,} URL rows ({size:.0f} MB of logs)')
+        print(f'  running counters: {feed:.2f}s spread over the crawl ({args.rows / feed:,.0f} URL rows/sec), '
+              f'final report {final * 1000:.1f}ms')
+        print(f'  stats.py rescan: {rescan:.2f}s, calculate_stats.py --chunksize {args.chunksize}: {chunked:.2f}s')
+        error = (live['distinct_urls'] - exact['distinct_urls']) / exact['distinct_urls']
+        print(f"  distinct URLs: {live['distinct_urls']:,} estimated, {exact['distinct_urls']:,} exact ({error:+.2%})")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    engines = subparsers.add_parser('engines', help='ThreadPoolExecutor Crawler vs AsyncCrawler on the mock site')
+    engines.add_argument('--pages', type=int, default=2000)
+    engines.add_argument('--fanout', type=int, default=20)
+    engines.add_argument('--page-size', type=int, default=20000)
+    engines.add_argument('--concurrency', type=int, default=1000)
+    engines.set_defaults(func=bench_engines)
+
+    run_one = subparsers.add_parser('run-engine')
+    run_one.add_argument('--engine', choices=['threads', 'async'], required=True)
+    run_one.add_argument('--base-url', required=True)
+    run_one.add_argument('--max-pages', type=int, required=True)
+    run_one.add_argument('--concurrency', type=int, default=1000)
+    run_one.set_defaults(func=run_engine)
+
+    seen = subparsers.add_parser('seen', help='Memory per URL of the visited-URL stores')
+    seen.add_argument('--sizes', type=int, nargs='+', default=[1_000_000, 10_000_000])
+    seen.add_argument('--error-rate', type=float, default=0.001)
+    seen.add_argument('--with-set', action='store_true', help='Also measure a plain set of URL strings')
+    seen.set_defaults(func=bench_seen)
+
+    canonicalize = subparsers.add_parser('canonicalize', help='URL canonicalizations per second')
+    canonicalize.add_argument('--count', type=int, default=500_000)
+    canonicalize.add_argument('--cache-size', type=int, default=65536)
+    canonicalize.set_defaults(func=bench_canonicalize)
+
+    extract = subparsers.add_parser('extract', help='Link extraction MB/s per backend')
+    extract.add_argument('--corpus', help='Directory of saved HTML pages')
+    extract.set_defaults(func=bench_extract)
+
+    frontier = subparsers.add_parser('frontier', help='Persistent SQLite frontier against the in-memory one')
+    frontier.add_argument('--ops', type=int, default=100_000)
+    frontier.add_argument('--pages', type=int, default=2000)
+    frontier.add_argument('--budget', type=float, default=0.10, help='Allowed end-to-end slowdown')
+    frontier.set_defaults(func=bench_frontier)
+
+    politeness = subparsers.add_parser('politeness', help='403s and useful throughput with and without politeness')
+    politeness.add_argument('--pages', type=int, default=500)
+    politeness.add_argument('--rate-limit', type=int, default=50, help='Requests/sec the server allows before 403')
+    politeness.add_argument('--workers', type=int, default=50)
+    politeness.add_argument('--min-delay', type=float, default=0.02)
+    politeness.add_argument('--max-per-host', type=int, default=4)
+    politeness.add_argument('--disallow', default='9', help='Page number prefix listed in robots.txt')
+    politeness.set_defaults(func=bench_politeness)
+
+    stats = subparsers.add_parser('stats', help='stats.py report on synthetic crawl logs')
+    stats.add_argument('--rows', type=int, default=3_000_000, help='Rows in the synthetic urls CSV')
+    stats.set_defaults(func=bench_stats)
+
+    report = subparsers.add_parser('report', help='calculate_stats.py whole-file vs chunked peak RSS')
+    report.add_argument('--rows', type=int, default=3_000_000, help='Rows in the synthetic urls CSV')
+    report.add_argument('--chunksize', type=int, default=50_000)
+    report.set_defaults(func=bench_report)
+
+    logs = subparsers.add_parser('logs', help='CSV vs parquet crawl log size and load time on a mock-site crawl')
+    logs.add_argument('--pages', type=int, default=5000)
+    logs.add_argument('--fanout', type=int, default=100)
+    logs.set_defaults(func=bench_logs)
+
+    harness = subparsers.add_parser('harness', help='Every crawler against one mock site, with a phase profile')
+    harness.add_argument('--crawlers', nargs='+', default=['main_code', 'crawl_18', 'crawl2', 'submission'],
+                         choices=['main_code', 'crawl_18', 'crawl2', 'submission', 'async'])
+    harness.add_argument('--pages', type=int, default=1000)
+    harness.add_argument('--max-pages', type=int, default=500)
+    harness.add_argument('--fanout', type=int, default=20)
+    harness.add_argument('--page-size', type=int, default=20000)
+    harness.add_argument('--size-sigma', type=float, default=1.0, help='Spread of the lognormal page sizes')
+    harness.add_argument('--forbidden-rate', type=float, default=0.05)
+    harness.add_argument('--not-found-rate', type=float, default=0.02)
+    harness.add_argument('--server-error-rate', type=float, default=0.01)
+    harness.add_argument('--latency', type=float, default=0.005, help='Seconds added to every response')
+    harness.add_argument('--latency-jitter', type=float, default=0.01)
+    harness.add_argument('--seed', type=int, default=0)
+    harness.add_argument('--output', default='benchmark_results.json')
+    harness.set_defaults(func=bench_harness)
+
+    run_crawler_parser = subparsers.add_parser('run-crawler')
+    run_crawler_parser.add_argument('--crawler', required=True)
+    run_crawler_parser.add_argument('--base-url', required=True)
+    run_crawler_parser.add_argument('--max-pages', type=int, required=True)
+    run_crawler_parser.set_defaults(func=run_crawler)
+
+    shards = subparsers.add_parser('shards', help='Multi-process sharded crawl throughput per shard count')
+    shards.add_argument('--shards', type=int, nargs='+', default=[1, 2, 4])
+    shards.add_argument('--pages', type=int, default=5000)
+    shards.add_argument('--max-pages', type=int, default=3000)
+    shards.add_argument('--fanout', type=int, default=20)
+    shards.add_argument('--page-size', type=int, default=20000)
+    shards.add_argument('--latency', type=float, default=0.0, help='Seconds added to every response')
+    shards.add_argument('--workers', type=int, default=50, help='Fetch threads per shard')
+    shards.set_defaults(func=bench_shards)
+
+    distributed = subparsers.add_parser('distributed', help='Coordinator plus 1..N worker processes on localhost')
+    distributed.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    distributed.add_argument('--pages', type=int, default=5000)
+    distributed.add_argument('--max-pages', type=int, default=3000)
+    distributed.add_argument('--fanout', type=int, default=20)
+    distributed.add_argument('--page-size', type=int, default=20000)
+    distributed.add_argument('--latency', type=float, default=0.0, help='Seconds added to every response')
+    distributed.add_argument('--threads', type=int, default=50, help='Fetch threads per worker')
+    distributed.add_argument('--lease-timeout', type=float, default=30.0,
+                             help='Seconds a lease lives without a heartbeat or a completed page')
+    distributed.add_argument('--stall-rate', type=float, default=0.0, help='Share of responses that hang first')
+    distributed.add_argument('--stall-seconds', type=float, default=4.0)
+    distributed.add_argument('--kill-after', type=float, help='Kill the first worker after this many seconds')
+    distributed.set_defaults(func=bench_distributed)
+
+    cache = subparsers.add_parser('cache', help='Conditional re-crawl through the HTTP cache, cold then warm')
+    cache.add_argument('--pages', type=int, default=2000)
+    cache.add_argument('--fanout', type=int, default=20)
+    cache.add_argument('--page-size', type=int, default=20000)
+    cache.add_argument('--changed', type=float, default=0.1, help='Share of pages changed between the two crawls')
+    cache.add_argument('--workers', type=int, default=50)
+    cache.add_argument('--seed', type=int, default=0)
+    cache.set_defaults(func=bench_cache)
+
+    streaming = subparsers.add_parser('streaming', help='Bytes read with header gating and the body size cap')
+    streaming.add_argument('--pages', type=int, default=2000)
+    streaming.add_argument('--max-pages', type=int, default=2000)
+    streaming.add_argument('--fanout', type=int, default=20)
+    streaming.add_argument('--page-size', type=int, default=20000)
+    streaming.add_argument('--size-sigma', type=float, default=1.5, help='Spread of the lognormal page sizes')
+    streaming.add_argument('--media', type=int, default=50, help='Video files linked from the pages')
+    streaming.add_argument('--media-mb', type=float, default=5.0)
+    streaming.add_argument('--max-body-mb', type=float, default=1.0)
+    streaming.add_argument('--workers', type=int, default=50)
+    streaming.set_defaults(func=bench_streaming)
+
+    resilience = subparsers.add_parser('resilience', help='Retries and the circuit breaker on a flaky mock site')
+    resilience.add_argument('--pages', type=int, default=1000)
+    resilience.add_argument('--fanout', type=int, default=20)
+    resilience.add_argument('--error-rate', type=float, default=0.1, help='Share of requests answered with a 503')
+    resilience.add_argument('--retry-after', type=int, default=1, help='Retry-After seconds sent with the 503s')
+    resilience.add_argument('--stall-rate', type=float, default=0.01)
+    resilience.add_argument('--stall-seconds', type=float, default=5.0)
+    resilience.add_argument('--read-timeout', type=float, default=2.0)
+    resilience.add_argument('--outage-start', type=float, default=2.0)
+    resilience.add_argument('--outage-seconds', type=float, default=3.0, help='Every request gets a 503 meanwhile')
+    resilience.add_argument('--retries', type=int, default=3)
+    resilience.add_argument('--backoff', type=float, default=0.2)
+    resilience.add_argument('--cooldown', type=float, default=2.0)
+    resilience.add_argument('--workers', type=int, default=20)
+    resilience.add_argument('--seed', type=int, default=0)
+    resilience.set_defaults(func=bench_resilience)
+
+    dedup = subparsers.add_parser('dedup', help='Crawl with and without near-duplicate detection on a mirrored site')
+    dedup.add_argument('--pages', type=int, default=2000)
+    dedup.add_argument('--max-pages', type=int, default=3000)
+    dedup.add_argument('--fanout', type=int, default=20)
+    dedup.add_argument('--page-size', type=int, default=20000)
+    dedup.add_argument('--article-words', type=int, default=500)
+    dedup.add_argument('--mirrors', type=float, default=0.3, help='Share of pages also served as print and AMP copies')
+    dedup.add_argument('--workers', type=int, default=50)
+    dedup.add_argument('--index-pages', type=int, default=1_000_000, help='Size of the standalone index test')
+    dedup.add_argument('--seed', type=int, default=0)
+    dedup.set_defaults(func=bench_dedup)
+
+    dns = subparsers.add_parser('dns', help='DNS cache and pre-resolution on a mock site spread over many hosts')
+    dns.add_argument('--pages', type=int, default=2000)
+    dns.add_argument('--max-pages', type=int, default=2000)
+    dns.add_argument('--fanout', type=int, default=20)
+    dns.add_argument('--page-size', type=int, default=20000)
+    dns.add_argument('--hosts', type=int, default=300, help='Host names the pages are spread over')
+    dns.add_argument('--dns-latency', type=float, default=0.05, help='Seconds per lookup of the fake resolver')
+    dns.add_argument('--workers', type=int, default=50)
+    dns.set_defaults(func=bench_dns)
+
+    bodies = subparsers.add_parser('bodies', help='Peak memory per worker, whole-body reads against streamed ones')
+    bodies.add_argument('--pages', type=int, default=64)
+    bodies.add_argument('--fanout', type=int, default=20)
+    bodies.add_argument('--page-mb', type=float, default=1.5)
+    bodies.add_argument('--article-words', type=int, default=50000, help='Random words per page, the rest is padding')
+    bodies.add_argument('--gzip', action='store_true', help='Serve the pages gzip compressed')
+    bodies.add_argument('--workers', type=int, default=16)
+    bodies.set_defaults(func=bench_bodies)
+
+    scope = subparsers.add_parser('scope', help='URL scope classifications per second on a crawl\'s outlinks')
+    scope.add_argument('--urls-file', default='urls_nytimes.csv', help='urls CSV of a crawl, the first column is used')
+    scope.add_argument('--count', type=int, default=1_000_000)
+    scope.set_defaults(func=bench_scope)
+
+    live_report = subparsers.add_parser('live-report', help='Crawl report from running counters vs a rescan of the logs')
+    live_report.add_argument('--rows', type=int, default=3_000_000, help='Rows in the synthetic urls CSV')
+    live_report.add_argument('--chunksize', type=int, default=50_000)
+    live_report.set_defaults(func=bench_live_report)
+
+    args = parser.parse_args()
+    args.func(args)
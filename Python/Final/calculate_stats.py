@@ -1,69 +1,140 @@
-import http
+import argparse
+import os
+import resource
+import numpy as np
 import pandas as pd
+# The report format is shared with the report the crawler keeps while it runs
+from crawl_report import SIZE_BUCKETS, is_success, write_report
 
-with open("fetch_nytimes.csv", "r", encoding="UTF-8") as f:
-    data = pd.read_csv(f, header=0)
-    fetches_attempted = data.shape[0]
-    fetches_succeeded = data[data["Status"] < 300].shape[0]
-    fetches_failed = data[data["Status"] > 300].shape[0]
-    status_codes = data.groupby(data["Status"]).count().to_dict()["URL"]
-
-with open("visit_nytimes.csv", "r", encoding="UTF-8") as f:
-    data = pd.read_csv(f, header=0)
-    total_urls_extracted = data["Out Links Found"].sum()
-    less_1KB = data[data["Size"] < 1024].shape[0]
-    less_10KB = data[(1024 <= data["Size"]) & (data["Size"] < 10 * 1024)].shape[0]
-    less_100KB = data[(10 * 1024 <= data["Size"]) & (data["Size"] < 100 * 1024)].shape[0]
-    less_1mb = data[(100 * 1024 <= data["Size"]) & (data["Size"] < 1024 * 1024)].shape[0]
-    greater_1mb = data[1024 * 1024 <= data["Size"]].shape[0]
-    content_types = data.groupby(data["Content Type"]).count().to_dict()["URL"]
-
-with open("urls_nytimes.csv", "r", encoding="UTF-8") as f:
-    data = pd.read_csv(f, header=0)
-    unique_extracted = data.shape[0]
-    print(data['URL'].nunique())
-    unique_within = data[data["Status"] == "OK"].shape[0]
-    unique_outside = data[data["Status"] == "N_OK"].shape[0]
-
-with open("CrawlReport_nytimes.txt", "w") as f:
-    f.write(f"Name: Anne Sai Venkata Naga Saketh\n")
-    f.write(f"USC ID: 3725520208\n")
-    f.write(f"News site crawled: nytimes.com\n")
-    f.write(f"Number of threads: 20\n")
-    f.write(f"Depth of Crawling: 16\n")
-    f.write(f"\n")
-
-    f.write(f"Fetch Statistics\n")
-    f.write(f"================\n")
-    f.write(f"fetches attempted: {fetches_attempted}\n")
-    f.write(f"fetches succeeded: {fetches_succeeded}\n")
-    f.write(f"fetches failed or aborted: {fetches_failed}\n")
-    f.write(f"\n")
-
-    f.write(f"Outgoing URLs:\n")
-    f.write(f"==============\n")
-    f.write(f"Total URLs extracted: {total_urls_extracted}\n")
-    f.write(f"# unique URLs extracted: {unique_extracted}\n")
-    f.write(f"# unique URLs within News Site: {unique_within}\n")
-    f.write(f"# unique URLs outside News Site: {unique_outside}\n")
-    f.write(f"\n")
-
-    f.write(f"Status Codes:\n")
-    f.write(f"=============\n")
-    for code in sorted(status_codes.keys()):
-        f.write(f"{code} {http.HTTPStatus(code).phrase}: {status_codes[code]}\n")
-    f.write(f"\n")
-
-    f.write(f"File Sizes:\n")
-    f.write(f"===========\n")
-    f.write(f"< 1KB: {less_1KB}\n")
-    f.write(f"1KB ~ <10KB: {less_10KB}\n")
-    f.write(f"10KB ~ <100KB: {less_100KB}\n")
-    f.write(f"100KB ~ <1MB: {less_1mb}\n")
-    f.write(f">= 1MB: {greater_1mb}\n")
-    f.write(f"\n")
-
-    f.write(f"Content Types:\n")
-    f.write(f"==============\n")
-    for content in sorted(content_types.keys()):
-        f.write(f"{content}: {content_types[content]}\n")
+FETCH_FILE = "fetch_nytimes.csv"
+VISIT_FILE = "visit_nytimes.csv"
+URLS_FILE = "urls_nytimes.csv"
+
+
+def size_counts(sizes):
+    counts = {}
+    for name, lower, upper in SIZE_BUCKETS:
+        in_bucket = lower <= sizes if upper is None else (lower <= sizes) & (sizes < upper)
+        counts[name] = int(in_bucket.sum())
+    return counts
+
+
+def read_frame(path):
+    # Whole crawl log as a DataFrame, from its CSV or from the columnar log (see columnar_log.py)
+    if path.endswith(".parquet"):
+        from columnar_log import read_log
+        return read_log(path).to_pandas()
+    with open(path, "r", encoding="UTF-8") as f:
+        return pd.read_csv(f, header=0)
+
+
+def iter_frames(path, chunksize, usecols=None, dtype=None):
+    if path.endswith(".parquet"):
+        # String columns are already dictionary-encoded and come back as categoricals
+        from columnar_log import iter_log_batches
+        for batch in iter_log_batches(path, chunksize, usecols):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunksize, encoding="UTF-8", usecols=usecols, dtype=dtype)
+
+
+def load_statistics(fetch_file=FETCH_FILE, visit_file=VISIT_FILE, urls_file=URLS_FILE):
+    # Whole-file mode, every log is loaded into one DataFrame
+    stats = {}
+    data = read_frame(fetch_file)
+    stats["fetches_attempted"] = data.shape[0]
+    stats["fetches_succeeded"] = int(is_success(data["Status"]).sum())
+    stats["fetches_failed"] = stats["fetches_attempted"] - stats["fetches_succeeded"]
+    stats["status_codes"] = data.groupby(data["Status"]).count().to_dict()["URL"]
+
+    data = read_frame(visit_file)
+    stats["total_urls_extracted"] = data["Out Links Found"].sum()
+    stats.update(size_counts(data["Size"]))
+    stats["content_types"] = data.groupby(data["Content Type"]).count().to_dict()["URL"]
+
+    # Distinct URLs, like stats.py and the report kept during the crawl. A URL listed as both OK
+    # and N_OK counts once in unique_extracted.
+    data = read_frame(urls_file)
+    within = data["Status"] == "OK"
+    stats["unique_extracted"] = data["URL"].nunique()
+    stats["unique_within"] = data.loc[within, "URL"].nunique()
+    stats["unique_outside"] = data.loc[~within, "URL"].nunique()
+    stats["distinct_urls"] = stats["unique_extracted"]
+    return stats
+
+
+def add_counts(total, counts):
+    for key, count in counts.items():
+        total[key] = total.get(key, 0) + int(count)
+
+
+class DistinctHashes:
+    # Exact distinct count of strings kept as sorted 64-bit hashes, so the strings themselves can
+    # be dropped as soon as they are hashed. New chunks are merged in once they outnumber the rest.
+    def __init__(self):
+        self.hashes = np.empty(0, dtype=np.uint64)
+        self.pending = []
+
+    def add(self, values):
+        # categorize=False hashes the strings directly instead of factorizing the chunk first
+        self.pending.append(np.unique(pd.util.hash_array(values, categorize=False)))
+        if sum(len(chunk) for chunk in self.pending) > len(self.hashes):
+            self.merge()
+
+    def merge(self):
+        self.hashes = np.unique(np.concatenate([self.hashes] + self.pending))
+        self.pending = []
+
+    def __len__(self):
+        self.merge()
+        return len(self.hashes)
+
+
+def chunked_statistics(chunksize, fetch_file=FETCH_FILE, visit_file=VISIT_FILE, urls_file=URLS_FILE):
+    # Out-of-core mode: each log is read `chunksize` rows at a time with only the columns the
+    # report needs, and the partial counts are merged. Distinct URLs are counted exactly as
+    # 64-bit hashes, see DistinctHashes.
+    stats = {"fetches_attempted": 0, "fetches_succeeded": 0, "fetches_failed": 0, "status_codes": {}}
+    for data in iter_frames(fetch_file, chunksize):
+        succeeded = int(is_success(data["Status"]).sum())
+        stats["fetches_attempted"] += data.shape[0]
+        stats["fetches_succeeded"] += succeeded
+        stats["fetches_failed"] += data.shape[0] - succeeded
+        add_counts(stats["status_codes"], data.groupby("Status")["URL"].count())
+
+    stats.update({"total_urls_extracted": 0, "content_types": {}})
+    stats.update({name: 0 for name, _, _ in SIZE_BUCKETS})
+    for data in iter_frames(visit_file, chunksize, usecols=["URL", "Size", "Out Links Found", "Content Type"],
+                            dtype={"Content Type": "category"}):
+        stats["total_urls_extracted"] += data["Out Links Found"].sum()
+        add_counts(stats, size_counts(data["Size"]))
+        add_counts(stats["content_types"], data.groupby("Content Type", observed=True)["URL"].count())
+
+    extracted, within, outside = DistinctHashes(), DistinctHashes(), DistinctHashes()
+    for data in iter_frames(urls_file, chunksize, usecols=["URL", "Status"],
+                            dtype={"URL": object, "Status": "category"}):
+        urls = data["URL"].to_numpy()
+        ok = (data["Status"] == "OK").to_numpy()
+        extracted.add(urls)
+        within.add(urls[ok])
+        outside.add(urls[~ok])
+    stats["unique_extracted"] = stats["distinct_urls"] = len(extracted)
+    stats["unique_within"] = len(within)
+    stats["unique_outside"] = len(outside)
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunksize", type=int, default=0,
+                        help="Rows per chunk for out-of-core aggregation, 0 loads each CSV whole")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv", help="Crawl log format to read")
+    args = parser.parse_args()
+    paths = [FETCH_FILE, VISIT_FILE, URLS_FILE]
+    if args.format == "parquet":
+        paths = [os.path.splitext(path)[0] + ".parquet" for path in paths]
+    stats = chunked_statistics(args.chunksize, *paths) if args.chunksize else load_statistics(*paths)
+    print(stats["distinct_urls"])
+    write_report(stats)
+    # ru_maxrss is reported in KB on Linux
+    print(f"Peak RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MB")
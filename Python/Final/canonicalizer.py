@@ -0,0 +1,95 @@
+import re
+from functools import lru_cache
+from urllib.parse import quote, unquote, urljoin, urlsplit
+
+# Python counterpart of crawler4j's edu.uci.ics.crawler4j.url.URLCanonicalizer, so that
+# URL variants that point at the same page collapse to one string before dedup
+
+# Session ids are dropped by crawler4j too, the rest are tracking params seen on nytimes.com.
+# A trailing * strips every param starting with that prefix.
+DEFAULT_STRIP_PARAMS = ('jsessionid', 'phpsessid', 'aspsessionid', 'utm_*', 'smid', 'smtyp')
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+MALFORMED_ESCAPE = re.compile(r'%(?![0-9A-Fa-f]{2})')
+
+
+def remove_dot_segments(path):
+    segments = []
+    for segment in path.split('/'):
+        if segment == '..':
+            if len(segments) > 1:
+                segments.pop()
+        elif segment != '.':
+            segments.append(segment)
+    if path.endswith(('/.', '/..')):
+        segments.append('')
+    return '/'.join(segments)
+
+
+def percent_encode(value):
+    # Same as crawler4j: '+' is a literal plus, values with broken escapes are kept as they are
+    value = value.replace('+', '%2B')
+    if MALFORMED_ESCAPE.search(value):
+        return value
+    return quote(unquote(value), safe='')
+
+
+class URLCanonicalizer:
+    def __init__(self, strip_params=DEFAULT_STRIP_PARAMS, cache_size=65536):
+        self.strip_names = frozenset(p.lower() for p in strip_params if not p.endswith('*'))
+        self.strip_prefixes = tuple(p[:-1].lower() for p in strip_params if p.endswith('*'))
+        # Nav and footer links repeat on every page, so most calls are cache hits. That holds for
+        # absolute URLs: callers join an href with its page URL first and pass no context, since
+        # a (relative href, page) key would miss for the same link on every other page.
+        self.canonicalize = lru_cache(maxsize=cache_size)(self._canonicalize)
+
+    def is_stripped(self, name):
+        name = name.lower()
+        return name in self.strip_names or name.startswith(self.strip_prefixes)
+
+    def canonical_query(self, query):
+        params = {}
+        for pair in query.split('&'):
+            if not pair:
+                continue
+            name, _, value = pair.partition('=')
+            params[name] = value
+        encoded = []
+        for name, value in params.items():
+            if self.is_stripped(name):
+                continue
+            encoded.append(percent_encode(name) + ('=' + percent_encode(value) if value else ''))
+        return '&'.join(encoded)
+
+    def _canonicalize(self, href, context=None):
+        # Returns None for hrefs that are not valid http(s) URLs
+        href = href.strip()
+        url = urljoin(context, href) if context else href
+        try:
+            parts = urlsplit(url)
+            port = parts.port
+        except ValueError:
+            return None
+        scheme = parts.scheme.lower()
+        host = parts.hostname
+        if scheme not in DEFAULT_PORTS or not host:
+            return None
+
+        path = parts.path.replace('\\', '/').replace('　', '%E3%80%80').replace(' ', '%20')
+        path = remove_dot_segments(re.sub('/{2,}', '/', path)) or '/'
+        if not path.startswith('/'):
+            path = '/' + path
+        path = path.replace('%7E', '~')
+
+        if ':' in host:
+            host = f'[{host}]'  # hostname drops the brackets of an IPv6 address
+        netloc = host if port in (None, DEFAULT_PORTS[scheme]) else f'{host}:{port}'
+        query = self.canonical_query(parts.query) if parts.query else ''
+        return f'{scheme}://{netloc}{path}' + (f'?{query}' if query else '')
+
+
+default_canonicalizer = URLCanonicalizer()
+
+
+def canonicalize_url(href, context=None):
+    return default_canonicalizer.canonicalize(href, context)
@@ -0,0 +1,111 @@
+import logging
+import os
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+# Columnar copy of the crawl logs. Each output is a directory of Parquet files, one part per
+# writer session so a resumed crawl adds a part instead of rewriting the file. String columns
+# (URLs, content types, OK/N_OK) are dictionary-encoded and numeric ones stored as int64, rows
+# are written in row groups of `row_group_rows` as the crawl goes.
+
+
+def require_pyarrow():
+    if pa is None:
+        raise ImportError('The parquet crawl log needs pyarrow installed')
+
+
+def column_type(value):
+    if isinstance(value, int):
+        return pa.int64()
+    return pa.dictionary(pa.int32(), pa.string())
+
+
+def to_array(values, data_type):
+    if pa.types.is_dictionary(data_type):
+        return pa.array(values, pa.string()).dictionary_encode()
+    return pa.array(values, data_type)
+
+
+class ParquetLogWriter:
+    # Same writerows/flush/close surface as CsvLogWriter in csv_writer.py
+    def __init__(self, path, header, row_group_rows=64 * 1024, compression='zstd', append=False):
+        require_pyarrow()
+        os.makedirs(path, exist_ok=True)
+        parts = log_parts(path)
+        if not append:
+            # A new crawl replaces the old log, like the CSV opened in 'w' mode
+            for part in parts:
+                os.remove(part)
+            parts = []
+        self.path = os.path.join(path, f'part-{len(parts):05d}.parquet')
+        self.header = header
+        self.row_group_rows = row_group_rows
+        self.compression = compression
+        self.schema = None
+        self.writer = None
+        self.rows = []
+
+    def writerows(self, rows):
+        self.rows.extend(rows)
+        if len(self.rows) >= self.row_group_rows:
+            self.write_row_group()
+
+    def write_row_group(self):
+        if not self.rows:
+            return
+        if self.schema is None:
+            # Column types come from the first row, the headers differ between crawlers
+            self.schema = pa.schema([(name, column_type(value)) for name, value in zip(self.header, self.rows[0])])
+            self.writer = pq.ParquetWriter(self.path, self.schema, compression=self.compression)
+        columns = [to_array(list(column), field.type) for column, field in zip(zip(*self.rows), self.schema)]
+        self.writer.write_table(pa.Table.from_arrays(columns, schema=self.schema), row_group_size=self.row_group_rows)
+        self.rows = []
+
+    def flush(self):
+        # Rows wait for a full row group, small groups would undo the columnar layout
+        pass
+
+    def close(self):
+        self.write_row_group()
+        if self.writer is not None:
+            self.writer.close()
+
+
+def log_parts(path):
+    if os.path.isdir(path):
+        return sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith('.parquet'))
+    return [path]
+
+
+def read_log(path, columns=None):
+    # Whole log as one pyarrow Table, memory-mapped so the column buffers are not copied
+    require_pyarrow()
+    tables = []
+    for part in log_parts(path):
+        try:
+            tables.append(pq.read_table(part, columns=columns, memory_map=True))
+        except pa.ArrowInvalid as e:
+            # A crawl killed before close() leaves a part without its footer
+            logging.warning(f'Skipping unreadable crawl log part {part}: {e}')
+    return pa.concat_tables(tables, promote_options='permissive')
+
+
+def iter_log_batches(path, batch_size=64 * 1024, columns=None):
+    require_pyarrow()
+    for part in log_parts(path):
+        try:
+            file = pq.ParquetFile(part, memory_map=True)
+        except pa.ArrowInvalid as e:
+            logging.warning(f'Skipping unreadable crawl log part {part}: {e}')
+            continue
+        yield from file.iter_batches(batch_size=batch_size, columns=columns)
+
+
+def iter_log_rows(path):
+    # Rows as tuples in header order, the same shape csv.reader gives stats.py
+    for batch in iter_log_batches(path):
+        yield from zip(*(column.to_pylist() for column in batch.columns))
@@ -0,0 +1,119 @@
+import socket
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NameResolutionError, NewConnectionError
+
+# Connections held open to one host. Worker threads past this wait for a free one, so a
+# single site never sees one connection per worker.
+POOL_PER_HOST = 10
+
+
+# Counts how many TCP connections were opened against how many requests went out over them
+class PoolStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.connections_opened = 0
+        self.requests_sent = 0
+
+    def record_connection(self):
+        with self.lock:
+            self.connections_opened += 1
+
+    def record_request(self):
+        with self.lock:
+            self.requests_sent += 1
+
+    def summary(self):
+        reused = self.requests_sent - self.connections_opened
+        ratio = self.requests_sent / self.connections_opened if self.connections_opened else 0
+        return (f'Connections opened: {self.connections_opened}, requests sent: {self.requests_sent}, '
+                f'reused: {max(reused, 0)} ({ratio:.1f} requests per connection)')
+
+
+def timed_connection(connection_cls, metrics):
+    class TimedConnection(connection_cls):
+        # connect() resolves the host and opens the socket (plus TLS for https), see metrics.py
+        def connect(self):
+            start = time.perf_counter()
+            try:
+                super().connect()
+            finally:
+                metrics.observe('connect_seconds', time.perf_counter() - start)
+    return TimedConnection
+
+
+def cached_dns_connection(connection_cls, dns):
+    class CachedDNSConnection(connection_cls):
+        # urllib3 opens the socket to _dns_host, so pointing it at a cached address skips the
+        # lookup. The addresses are tried in order, like socket.create_connection does, and the
+        # last error is raised when none of them connects. self.host reads _dns_host too, and it
+        # is restored before the Host header and the TLS server name are taken from it.
+        def _new_conn(self):
+            host = self._dns_host
+            try:
+                addresses = dns.resolve(host, self.port)
+            except socket.gaierror as e:
+                raise NameResolutionError(host, self, e) from e
+            error = None
+            for address in dict.fromkeys(sockaddr[0] for _, _, _, _, sockaddr in addresses):
+                self._dns_host = address
+                try:
+                    return super()._new_conn()
+                except (NewConnectionError, ConnectTimeoutError) as e:
+                    error = e
+                finally:
+                    self._dns_host = host
+            raise error
+    return CachedDNSConnection
+
+
+def counting_pool(pool_cls, stats, metrics=None, dns=None):
+    class CountingConnectionPool(pool_cls):
+        ConnectionCls = pool_cls.ConnectionCls
+        if dns is not None:
+            ConnectionCls = cached_dns_connection(ConnectionCls, dns)
+        if metrics is not None:
+            ConnectionCls = timed_connection(ConnectionCls, metrics)
+
+        # urllib3 only calls _new_conn when no idle keep-alive connection is left in the pool
+        def _new_conn(self):
+            stats.record_connection()
+            return super()._new_conn()
+    return CountingConnectionPool
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    def __init__(self, stats, metrics=None, dns=None, **kwargs):
+        self.stats = stats
+        self.metrics = metrics
+        self.dns = dns
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': counting_pool(HTTPConnectionPool, self.stats, self.metrics, self.dns),
+            'https': counting_pool(HTTPSConnectionPool, self.stats, self.metrics, self.dns),
+        }
+
+    def send(self, request, **kwargs):
+        self.stats.record_request()
+        return super().send(request, **kwargs)
+
+
+def build_session(max_workers, max_per_host=POOL_PER_HOST, max_hosts=100, metrics=None, dns=None):
+    # One session shared by every worker thread: the urllib3 pools behind it are thread safe,
+    # and pool_block caps the connections held open to any single host.
+    # With a CrawlMetrics, DNS + connect time of every new connection goes to connect_seconds.
+    # With a DNSCache (dns_cache.py), new connections look the host up there.
+    stats = PoolStats()
+    adapter = PooledHTTPAdapter(stats, metrics, dns, pool_connections=max_hosts,
+                                pool_maxsize=min(max_per_host, max_workers), pool_block=True)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.pool_stats = stats
+    return session
@@ -1,91 +1,136 @@
 import logging
-import csv
+from functools import partial
 from urllib.parse import urljoin, urlparse
-import requests
-from bs4 import BeautifulSoup
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from connection_pool import build_session
+from dns_cache import shared_dns_cache
+from canonicalizer import URLCanonicalizer
+from crawl_report import CrawlReport
+from csv_writer import CrawlOutputWriter
+from fetch_policy import CircuitOpen, FetchFailed, FetchPolicy
+from link_extractor import get_link_extractor
+from metrics import CrawlMetrics, timed_get
+from politeness import host_of
+from scope import Scope
+from seen_store import make_seen_store
+from streaming import MAX_BODY_BYTES, StreamedBody, body_kind
 
 logging.basicConfig(format='%(asctime)s %(levelname)s:%(message)s', level=logging.INFO)
 
 class Crawler:
-    def __init__(self, base_url, urls=[], max_pages=50000, max_depth=16):
+    def __init__(self, base_url, urls=[], max_pages=50000, max_depth=16, max_workers=400,
+                 seen_mode='exact', canonicalizer=None, link_backend='htmlparser', log_formats=('csv',),
+                 metrics=None, metrics_interval=10.0, metrics_port=None, fetch_policy=None,
+                 max_body_bytes=MAX_BODY_BYTES, scope=None, report_interval=60.0):
         self.base_url = base_url
-        self.session = requests.Session()  # Use session for connection pooling
-        self.visited_urls = set()
-        self.urls_to_visit = [(url, 1) for url in set(urls)]  # Start with depth of 1
+        self.max_workers = max_workers
+        # Counters, latency histograms and gauges, logged every metrics_interval seconds
+        self.metrics = metrics or CrawlMetrics()
+        self.metrics_interval = metrics_interval
+        self.metrics_port = metrics_port
+        # Pool sized to the worker count, host lookups cached process-wide, see dns_cache.py
+        self.session = build_session(max_workers, metrics=self.metrics, dns=shared_dns_cache())
+        # Timeouts, retries and the per-host circuit breaker, see fetch_policy.py
+        self.policy = fetch_policy or FetchPolicy(metrics=self.metrics)
+        self.max_body_bytes = max_body_bytes  # Bodies are not read past this, see streaming.py
+        self.visited_urls = make_seen_store(seen_mode)  # Thread safe, see seen_store.py
+        self.canonicalizer = canonicalizer or URLCanonicalizer()
+        self.extract_hrefs = get_link_extractor(link_backend)
+        seeds = {self.canonicalizer.canonicalize(url) for url in urls} - {None}
+        self.urls_to_visit = [(url, 1) for url in seeds]  # Start with depth of 1
         self.max_pages = max_pages
         self.fetched_pages = 0
         self.max_depth = max_depth
         self.site_name = urlparse(base_url).netloc.split('.')[1]
+        # Which outlinks are followed and which are labelled OK, compiled once, see scope.py
+        self.scope = scope or Scope.for_site(base_url)
+        self.log_formats = log_formats  # ('csv', 'parquet') adds a columnar copy, see columnar_log.py
+        # The crawl report is kept from the logged rows and rewritten every report_interval seconds
+        self.report = CrawlReport(f'CrawlReport_{self.site_name}.txt', report_interval)
         self.init_csv_files()
 
     def init_csv_files(self):
-        # Initialize CSV files
-        with open(f'fetch_{self.site_name}.csv', 'w', newline='', encoding='utf-8') as file:
-            writer = csv.writer(file)
-            writer.writerow(['URL', 'Status'])
-        with open(f'visit_{self.site_name}.csv', 'w', newline='', encoding='utf-8') as file:
-            writer = csv.writer(file)
-            writer.writerow(['URL', 'Size (Bytes)', '# of Outlinks', 'Content-Type'])
-        with open(f'urls_{self.site_name}.csv', 'w', newline='', encoding='utf-8') as file:
-            writer = csv.writer(file)
-            writer.writerow(['URL', 'Indicator'])
+        # One long-lived handle per CSV, rows are queued to a background writer thread
+        self.writer = CrawlOutputWriter({
+            'fetch': (f'fetch_{self.site_name}.csv', ['URL', 'Status', 'Retries', 'Breaker Trips']),
+            'visit': (f'visit_{self.site_name}.csv', ['URL', 'Size (Bytes)', '# of Outlinks', 'Content-Type']),
+            'urls': (f'urls_{self.site_name}.csv', ['URL', 'Indicator']),
+        }, formats=self.log_formats, report=self.report)
 
     def download_url(self, url, depth):
+        # Only the headers are read here. An HTML body is decompressed and decoded chunk by chunk
+        # into the link extractor, other bodies are only sized, see streaming.py.
         if self.fetched_pages >= self.max_pages or depth > self.max_depth:
-            return '', 0, 0, '', True
+            return None, 0, '', True, 0
         try:
-            response = requests.get(url)
+            response, retries = self.policy.get(partial(timed_get, self.metrics, self.session.get), url,
+                                                stream=True)
             content_type = response.headers.get('Content-Type', '')
-            if any(ct in content_type for ct in ['html', 'pdf', 'msword', 'image']):
+            body = StreamedBody(response, self.max_body_bytes, self.metrics)
+            kind = body_kind(content_type)
+            if kind is not None:
                 self.fetched_pages += 1
-                return response.text, response.status_code, len(response.content), content_type, False
+                self.metrics.inc('pages_fetched')
+                if kind == 'size':
+                    body.drain()
+                return body, response.status_code, content_type, False, retries
             else:
-                return '', 0, 0, content_type, True
+                body.close()
+                return None, 0, content_type, True, retries
+        except CircuitOpen as e:
+            # There is no frontier to hold the URL until the host is back, so it is dropped
+            logging.debug(f'Skipping {url}: {e}')
+            self.metrics.inc('breaker_skipped')
+            return None, 0, '', True, 0
+        except FetchFailed as e:
+            logging.warning(f'Error downloading {url}: {e}')
+            return None, 0, '', True, e.retries
         except Exception as e:
             logging.exception(f'Error downloading {url}: {e}')
-            return '', 0, 0, '', True
+            return None, 0, '', True, 0
 
     def crawl(self, url, depth):
-        if url in self.visited_urls:
+        if not self.visited_urls.add_if_absent(url):
             return []
-        self.visited_urls.add(url)
-        html, status_code, size, content_type, skip = self.download_url(url, depth)
+        logging.debug(f'Crawling {url} (depth {depth})')
+        body, status_code, content_type, skip, retries = self.download_url(url, depth)
         
         # Skip logging and processing for status codes 0 and 999
         if status_code == 0 or status_code == 999:
+            if body:
+                body.close()
             return []
         
-        with open(f'fetch_{self.site_name}.csv', 'a', newline='', encoding='utf-8') as file:
-            writer = csv.writer(file)
-            writer.writerow([url, status_code])
+        breaker_trips = self.policy.breaker.trip_count(host_of(url)) if self.policy.breaker else 0
+        self.writer.writerow('fetch', [url, status_code, retries, breaker_trips])
+        self.metrics.inc(f'status_{status_code}')
         
         if not skip:
-            outlinks = list(self.get_linked_urls(url, html))
-            for outlink in outlinks:
-                indicator = 'OK' if urlparse(outlink).netloc == urlparse(self.base_url).netloc else 'N_OK'
-                with open(f'urls_{self.site_name}.csv', 'a', newline='', encoding='utf-8') as urls_file:
-                    urls_writer = csv.writer(urls_file)
-                    urls_writer.writerow([outlink, indicator])
-            with open(f'visit_{self.site_name}.csv', 'a', newline='', encoding='utf-8') as file:
-                writer = csv.writer(file)
-                writer.writerow([url, size, len(outlinks), content_type])
+            # Includes reading the body, the parser pulls it off the connection chunk by chunk
+            with self.metrics.timer('parse_seconds'):
+                outlinks = list(self.get_linked_urls(url, body))
+            size = body.size
+            self.writer.writerows('urls', [[outlink, self.scope.label(outlink)] for outlink in outlinks])
+            self.writer.writerow('visit', [url, size, len(outlinks), content_type])
             return outlinks
         return []
 
     def get_linked_urls(self, url, html):
-        soup = BeautifulSoup(html, 'html.parser')
-        for link in soup.find_all('a'):
-            path = link.get('href')
+        for path in self.extract_hrefs(html):
             if path and path.startswith('/'):
                 path = urljoin(url, path)
             elif not path or not path.startswith('http'):
                 continue
-            yield path
+            # Canonical form before the visited check and urls CSV, so variants count once
+            path = self.canonicalizer.canonicalize(path)
+            if path:
+                yield path
 
-    def run(self):
-        with ThreadPoolExecutor(max_workers=400) as executor:  # Increased number of workers
+    def crawl_all(self):
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
             futures = {executor.submit(self.crawl, url, depth): (url, depth) for url, depth in self.urls_to_visit}
+            # Submitted crawls are the frontier here, there is no separate queue
+            self.metrics.gauge('frontier_size', lambda: len(futures))
             while futures:
                 # Process futures as they complete
                 done, _ = as_completed(futures), futures.pop
@@ -95,10 +140,20 @@ class Crawler:
                         break
                     if depth < self.max_depth:
                         outlinks = future.result()
-                        for outlink in set(outlinks) - self.visited_urls:
-                            if self.fetched_pages < self.max_pages:
+                        for outlink in set(outlinks):
+                            if (outlink not in self.visited_urls and self.fetched_pages < self.max_pages and
+                                    self.scope.admit(outlink, depth + 1)):
                                 futures[executor.submit(self.crawl, outlink, depth + 1)] = (outlink, depth + 1)
 
+    def run(self):
+        self.metrics.start(self.metrics_interval, self.metrics_port)
+        try:
+            self.crawl_all()
+        finally:
+            self.writer.close()
+            self.metrics.stop()
+        logging.info(self.metrics.summary())
+        logging.info(self.session.pool_stats.summary())
 
 if __name__ == '__main__':
     Crawler(base_url='https://www.nytimes.com/', urls=['https://www.nytimes.com/']).run()
\ No newline at end of file
@@ -0,0 +1,214 @@
+import http
+import math
+import os
+import time
+from bisect import bisect_right
+from seen_store import url_fingerprint
+
+# The numbers of CrawlReport_nytimes.txt kept as running counters while the crawl logs its rows,
+# so the report can be written during the crawl and at its end without reading the logs back.
+# calculate_stats.py and stats.py still build it from the logs of a finished crawl.
+
+REPORT_FILE = 'CrawlReport_nytimes.txt'
+
+# Size buckets of the report, lower bound inclusive
+SIZE_BUCKETS = [
+    ('less_1KB', 0, 1024),
+    ('less_10KB', 1024, 10 * 1024),
+    ('less_100KB', 10 * 1024, 100 * 1024),
+    ('less_1mb', 100 * 1024, 1024 * 1024),
+    ('greater_1mb', 1024 * 1024, None),
+]
+SIZE_EDGES = [lower for _, lower, _ in SIZE_BUCKETS[1:]]
+
+
+def is_success(status_code):
+    # 2xx. Every other fetch failed or was aborted, 3xx and 0 (no response) included. Works on an
+    # int and on a pandas Series of them alike, so every report counts fetches the same way.
+    return (status_code >= 200) & (status_code < 300)
+
+
+class HyperLogLog:
+    # Distinct count estimate in 2 ** precision one-byte registers, with a standard error of about
+    # 1.04 / sqrt(2 ** precision), 0.4% at precision 16. Each register keeps the longest run of
+    # leading zero bits seen among the fingerprints that map to it. The register-wise max of two
+    # sketches is the sketch of the union, so shards and workers can count separately.
+    def __init__(self, precision=16):
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+        self.shift = 64 - precision
+        self.rest_mask = (1 << self.shift) - 1
+
+    def add_fingerprint(self, fingerprint):
+        index = fingerprint >> self.shift
+        rank = self.shift - (fingerprint & self.rest_mask).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def add(self, url):
+        # url_fingerprint rather than hash(), which is salted per process and would not merge
+        self.add_fingerprint(url_fingerprint(url))
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError(f'Cannot merge a precision {other.precision} sketch into a precision {self.precision} one')
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def union(self, other):
+        sketch = HyperLogLog(self.precision)
+        sketch.registers = bytearray(self.registers)
+        sketch.merge(other)
+        return sketch
+
+    def __len__(self):
+        size = len(self.registers)
+        # Registers are counted per rank, which is far cheaper than a sum over every register
+        total = sum(self.registers.count(rank) * 2.0 ** -rank for rank in range(self.shift + 2))
+        estimate = 0.7213 / (1 + 1.079 / size) * size * size / total
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * size and zeros:
+            estimate = size * math.log(size / zeros)  # Linear counting is more accurate while registers are empty
+        return round(estimate)
+
+
+class CrawlReport:
+    # Fed the fetch, visit and urls rows by CrawlOutputWriter's writer thread (see csv_writer.py),
+    # so it needs no lock. Every `interval` seconds the report is rewritten at `path`, and once
+    # more when the writer is closed. The unique URL counts are HyperLogLog estimates.
+    def __init__(self, path=REPORT_FILE, interval=60.0, precision=16):
+        self.path = path
+        self.interval = interval
+        self.last_snapshot = time.monotonic()
+        self.fetches_attempted = 0
+        self.fetches_succeeded = 0
+        self.status_codes = {}
+        self.total_urls_extracted = 0
+        self.file_sizes = [0] * len(SIZE_BUCKETS)
+        self.content_types = {}
+        self.within = HyperLogLog(precision)
+        self.outside = HyperLogLog(precision)
+
+    def add_rows(self, name, rows):
+        # Rows as the crawler logs them, or as strings when read back from a CSV
+        if name == 'fetch':
+            for row in rows:
+                status_code = int(row[1])
+                self.fetches_attempted += 1
+                if is_success(status_code):
+                    self.fetches_succeeded += 1
+                self.status_codes[status_code] = self.status_codes.get(status_code, 0) + 1
+        elif name == 'visit':
+            for row in rows:
+                self.file_sizes[bisect_right(SIZE_EDGES, int(row[1]))] += 1
+                self.total_urls_extracted += int(row[2])
+                self.content_types[row[3]] = self.content_types.get(row[3], 0) + 1
+        elif name == 'urls':
+            within, outside = self.within.add, self.outside.add
+            for row in rows:
+                (within if row[1] == 'OK' else outside)(row[0])
+
+    def add_log(self, name, path):
+        # Rows already logged, when a resumed crawl appends to its logs
+        from stats import read_rows
+        if os.path.exists(path):
+            rows = []
+            for row in read_rows(path):
+                rows.append(row)
+                if len(rows) == 10_000:
+                    self.add_rows(name, rows)
+                    rows = []
+            self.add_rows(name, rows)
+
+    def merge(self, other):
+        self.fetches_attempted += other.fetches_attempted
+        self.fetches_succeeded += other.fetches_succeeded
+        for status_code, count in other.status_codes.items():
+            self.status_codes[status_code] = self.status_codes.get(status_code, 0) + count
+        self.total_urls_extracted += other.total_urls_extracted
+        self.file_sizes = [count + other_count for count, other_count in zip(self.file_sizes, other.file_sizes)]
+        for content_type, count in other.content_types.items():
+            self.content_types[content_type] = self.content_types.get(content_type, 0) + count
+        self.within.merge(other.within)
+        self.outside.merge(other.outside)
+
+    def stats(self):
+        # The stats dict of calculate_stats.py
+        stats = {
+            'fetches_attempted': self.fetches_attempted,
+            'fetches_succeeded': self.fetches_succeeded,
+            'fetches_failed': self.fetches_attempted - self.fetches_succeeded,
+            'status_codes': dict(self.status_codes),
+            'total_urls_extracted': self.total_urls_extracted,
+            'unique_extracted': len(self.within.union(self.outside)),
+            'unique_within': len(self.within),
+            'unique_outside': len(self.outside),
+            'content_types': dict(self.content_types),
+        }
+        stats['distinct_urls'] = stats['unique_extracted']
+        stats.update((name, count) for (name, _, _), count in zip(SIZE_BUCKETS, self.file_sizes))
+        return stats
+
+    def maybe_snapshot(self):
+        if self.path and self.interval and time.monotonic() - self.last_snapshot >= self.interval:
+            self.snapshot()
+
+    def snapshot(self):
+        # Written next to the report and renamed over it, so a reader never sees half a report
+        self.last_snapshot = time.monotonic()
+        if self.path:
+            write_report(self.stats(), f'{self.path}.tmp')
+            os.replace(f'{self.path}.tmp', self.path)
+
+
+def status_phrase(code):
+    try:
+        return http.HTTPStatus(code).phrase
+    except ValueError:
+        return 'Unknown'  # 0 is logged for a fetch that got no response
+
+
+def write_report(stats, path=REPORT_FILE):
+    with open(path, 'w') as f:
+        f.write(f'Name: Anne Sai Venkata Naga Saketh\n')
+        f.write(f'USC ID: 3725520208\n')
+        f.write(f'News site crawled: nytimes.com\n')
+        f.write(f'Number of threads: 20\n')
+        f.write(f'Depth of Crawling: 16\n')
+        f.write(f'\n')
+
+        f.write(f'Fetch Statistics\n')
+        f.write(f'================\n')
+        f.write(f"fetches attempted: {stats['fetches_attempted']}\n")
+        f.write(f"fetches succeeded: {stats['fetches_succeeded']}\n")
+        f.write(f"fetches failed or aborted: {stats['fetches_failed']}\n")
+        f.write(f'\n')
+
+        f.write(f'Outgoing URLs:\n')
+        f.write(f'==============\n')
+        f.write(f"Total URLs extracted: {stats['total_urls_extracted']}\n")
+        f.write(f"# unique URLs extracted: {stats['unique_extracted']}\n")
+        f.write(f"# unique URLs within News Site: {stats['unique_within']}\n")
+        f.write(f"# unique URLs outside News Site: {stats['unique_outside']}\n")
+        f.write(f'\n')
+
+        f.write(f'Status Codes:\n')
+        f.write(f'=============\n')
+        status_codes = stats['status_codes']
+        for code in sorted(status_codes.keys()):
+            f.write(f'{code} {status_phrase(code)}: {status_codes[code]}\n')
+        f.write(f'\n')
+
+        f.write(f'File Sizes:\n')
+        f.write(f'===========\n')
+        f.write(f"< 1KB: {stats['less_1KB']}\n")
+        f.write(f"1KB ~ <10KB: {stats['less_10KB']}\n")
+        f.write(f"10KB ~ <100KB: {stats['less_100KB']}\n")
+        f.write(f"100KB ~ <1MB: {stats['less_1mb']}\n")
+        f.write(f">= 1MB: {stats['greater_1mb']}\n")
+        f.write(f'\n')
+
+        f.write(f'Content Types:\n')
+        f.write(f'==============\n')
+        content_types = stats['content_types']
+        for content in sorted(content_types.keys()):
+            f.write(f'{content}: {content_types[content]}\n')
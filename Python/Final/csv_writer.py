@@ -0,0 +1,122 @@
+import csv
+import os
+import queue
+import threading
+import time
+
+_STOP = object()
+
+
+class CsvLogWriter:
+    def __init__(self, path, header, buffer_size=1 << 20, append=False):
+        # Append mode continues a resumed crawl, the header is only written to a new file
+        self.file = open(path, 'a' if append else 'w', newline='', encoding='utf-8', buffering=buffer_size)
+        self.writer = csv.writer(self.file)
+        if self.file.tell() == 0:
+            self.writer.writerow(header)
+
+    def writerows(self, rows):
+        self.writer.writerows(rows)
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class CrawlOutputWriter:
+    # Keeps one open handle per output CSV and writes rows from a single background thread,
+    # so crawler threads only pay for a queue put instead of an open/close per row.
+    # formats=('csv', 'parquet') also writes each output as a columnar log next to the CSV,
+    # see columnar_log.py. A report (crawl_report.py) is fed every row from the same thread.
+    def __init__(self, outputs, flush_rows=1000, flush_interval=1.0, maxsize=0, buffer_size=1 << 20,
+                 append=False, formats=('csv',), report=None):
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize)
+        self.sinks = {}
+        for name, (path, header) in outputs.items():
+            self.sinks[name] = []
+            if 'csv' in formats:
+                self.sinks[name].append(CsvLogWriter(path, header, buffer_size, append))
+            if 'parquet' in formats:
+                from columnar_log import ParquetLogWriter
+                self.sinks[name].append(ParquetLogWriter(os.path.splitext(path)[0] + '.parquet', header, append=append))
+        self.report = report
+        self.error = None
+        self.thread = threading.Thread(target=self._drain, name='csv-writer', daemon=True)
+        self.thread.start()
+
+    def writerow(self, name, row):
+        self.queue.put((name, [row]))
+
+    def writerows(self, name, rows):
+        if rows:
+            self.queue.put((name, rows))
+
+    def sync(self):
+        # Returns once every row queued before the call is flushed to its files
+        if not self.thread.is_alive():
+            return
+        synced = threading.Event()
+        self.queue.put(synced)
+        while not synced.wait(1.0) and self.thread.is_alive():
+            pass
+
+    def flush(self):
+        for sinks in self.sinks.values():
+            for sink in sinks:
+                sink.flush()
+
+    def close(self):
+        self.queue.put(_STOP)
+        self.thread.join()
+        for sinks in self.sinks.values():
+            for sink in sinks:
+                try:
+                    sink.close()
+                except Exception as e:
+                    self.error = self.error or e
+        if self.error:
+            raise self.error
+
+    def _drain(self):
+        pending = 0
+        last_flush = time.monotonic()
+        while True:
+            timeout = max(0.0, self.flush_interval - (time.monotonic() - last_flush))
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                break
+            try:
+                if isinstance(item, threading.Event):
+                    pending = self.flush_rows  # Flushed below, then the sync() caller is let go
+                elif item is not None:
+                    name, rows = item
+                    for sink in self.sinks[name]:
+                        sink.writerows(rows)
+                    if self.report is not None:
+                        self.report.add_rows(name, rows)
+                    pending += len(rows)
+                if pending >= self.flush_rows or time.monotonic() - last_flush >= self.flush_interval:
+                    self.flush()
+                    pending = 0
+                    last_flush = time.monotonic()
+                    if self.report is not None:
+                        self.report.maybe_snapshot()
+            except Exception as e:
+                # Keep draining so producers never block on a full queue, close() re-raises
+                self.error = self.error or e
+            finally:
+                if isinstance(item, threading.Event):
+                    item.set()
+        try:
+            self.flush()
+            if self.report is not None:
+                self.report.snapshot()  # The final report, from counters already up to date
+        except Exception as e:
+            self.error = self.error or e
@@ -0,0 +1,427 @@
+import argparse
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+import requests
+from canonicalizer import URLCanonicalizer
+from crawl_report import CrawlReport
+from csv_writer import CrawlOutputWriter
+from fetch_policy import FetchPolicy
+from frontier import BoundedFrontier, depth_priority
+from main_code import OUTPUT_HEADERS, Crawler
+from metrics import CrawlMetrics
+from scope import Scope
+from seen_store import make_seen_store
+
+# Coordinator/worker crawl over HTTP. The coordinator owns the global frontier, the dedup of
+# scheduled URLs and the CSV logs. Workers, on any host, lease batches of URLs with POST /lease,
+# crawl them with the usual Crawler and send each page's outlinks and log rows back with POST
+# /complete as soon as it is crawled. Workers also POST /heartbeat every lease_timeout / 3 seconds
+# for the leases they hold. Every heartbeat or completion extends a lease by lease_timeout, so a
+# lease whose worker died goes back to the frontier for another worker within lease_timeout.
+# A live worker may hold a URL for at most url_timeout, after which it is re-issued too. Results
+# for an expired lease are dropped so no page is logged twice.
+
+# Seconds a lease lives without a heartbeat or a completed page
+LEASE_TIMEOUT = 30.0
+
+
+class Lease:
+    def __init__(self, worker, items, now, lease_timeout, url_timeout):
+        self.worker = worker
+        self.urls = dict(items)  # url -> depth, pages still owed
+        self.expires = now + url_timeout  # However often the worker renews it
+        self.deadline = min(now + lease_timeout, self.expires)
+
+    def renew(self, now, lease_timeout):
+        self.deadline = min(now + lease_timeout, self.expires)
+
+
+class CoordinatorHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        coordinator = self.server.coordinator
+        if self.path == '/config':
+            self.reply({'base_url': coordinator.base_url, 'max_depth': coordinator.max_depth,
+                        'lease_timeout': coordinator.lease_timeout})
+        elif self.path == '/metrics':
+            self.reply(coordinator.metrics.render(), 'text/plain; version=0.0.4')
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        coordinator = self.server.coordinator
+        request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        if self.path == '/lease':
+            lease_id, items, done = coordinator.lease(request['worker'], request['count'])
+            self.reply({'id': lease_id, 'urls': items, 'done': done})
+        elif self.path == '/heartbeat':
+            self.reply({'lost': coordinator.heartbeat(request['worker'], request['leases'])})
+        elif self.path == '/complete':
+            self.reply({'accepted': coordinator.complete(request['lease'], request['pages'],
+                                                         request.get('returned', []))})
+        else:
+            self.send_error(404)
+
+    def reply(self, payload, content_type='application/json'):
+        body = (payload if isinstance(payload, str) else json.dumps(payload)).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Coordinator:
+    def __init__(self, base_url, urls=[], max_records=20000, max_depth=16, host='127.0.0.1', port=0,
+                 lease_timeout=LEASE_TIMEOUT, url_timeout=None, seen_mode='exact', frontier_capacity=1_000_000,
+                 log_formats=('csv',), metrics=None, metrics_interval=10.0, report_interval=60.0):
+        self.base_url = base_url
+        self.site_name = urlparse(base_url).netloc.split('.')[1]
+        self.max_records = max_records
+        self.max_depth = max_depth
+        self.lease_timeout = lease_timeout
+        # By default long enough for one page that hits every timeout and retry of a FetchPolicy
+        self.url_timeout = url_timeout or FetchPolicy().worst_case_seconds()
+        self.lock = threading.Lock()
+        self.pending = BoundedFrontier(frontier_capacity, depth_priority)
+        self.scheduled = make_seen_store(seen_mode)  # Every URL enters the frontier once
+        self.leases = {}
+        self.lease_ids = itertools.count(1)
+        self.fetched_pages = 0
+        self.worker_pages = Counter()
+        self.finished = threading.Event()
+        self.metrics = metrics or CrawlMetrics()
+        self.metrics_interval = metrics_interval
+        self.metrics.gauge('frontier_size', lambda: len(self.pending))
+        self.metrics.gauge('leased', lambda: sum(len(lease.urls) for lease in list(self.leases.values())))
+        # Same logs and report as a single-process Crawler, the workers send its rows
+        self.report = CrawlReport(f'CrawlReport_{self.site_name}.txt', report_interval)
+        self.writer = CrawlOutputWriter({name: (f'{name}_{self.site_name}.csv', header)
+                                         for name, header in OUTPUT_HEADERS.items()}, formats=log_formats,
+                                        report=self.report)
+        canonicalizer = URLCanonicalizer()
+        for url in {canonicalizer.canonicalize(url) for url in urls} - {None}:
+            self.schedule(url, 1)
+        self.server = ThreadingHTTPServer((host, port), CoordinatorHandler)
+        self.server.daemon_threads = True
+        self.server.coordinator = self
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def schedule(self, url, depth):
+        # Only a URL that made it into the frontier is marked scheduled, a dropped one can come again
+        if url not in self.scheduled and self.pending.put(url, depth, block=False):
+            self.scheduled.add_if_absent(url)
+
+    def requeue(self, url, depth):
+        # Leased URLs took their slots with them, so they go back even when the frontier is full
+        self.pending.put_later(url, depth, 0.0)
+
+    def expire_leases(self):
+        now = time.monotonic()
+        for lease_id, lease in list(self.leases.items()):
+            if lease.deadline <= now:
+                del self.leases[lease_id]
+                for url, depth in lease.urls.items():
+                    self.requeue(url, depth)
+                self.metrics.inc('leases_expired')
+                logging.warning(f'Lease {lease_id} of {lease.worker} expired, {len(lease.urls)} URLs re-queued')
+
+    def check_finished(self):
+        if self.fetched_pages >= self.max_records or (not len(self.pending) and not self.leases):
+            self.finished.set()
+        return self.finished.is_set()
+
+    def lease(self, worker, count):
+        # Returns (lease id, [[url, depth], ...], done). No URLs and not done means try again later.
+        with self.lock:
+            self.expire_leases()
+            if self.check_finished():
+                return None, [], True
+            # Never lease more than the page limit still allows
+            leased = sum(len(lease.urls) for lease in self.leases.values())
+            count = min(count, self.max_records - self.fetched_pages - leased)
+            items = []
+            while len(items) < count:
+                item = self.pending.get(block=False)
+                if item is None:
+                    break
+                items.append(list(item))
+            if not items:
+                return None, [], False
+            lease_id = next(self.lease_ids)
+            self.leases[lease_id] = Lease(worker, items, time.monotonic(), self.lease_timeout, self.url_timeout)
+            return lease_id, items, False
+
+    def heartbeat(self, worker, lease_ids):
+        # Renews the worker's leases, returns the ids of those it no longer holds
+        lost = []
+        with self.lock:
+            now = time.monotonic()
+            for lease_id in lease_ids:
+                lease = self.leases.get(lease_id)
+                if lease is None or lease.worker != worker:
+                    lost.append(lease_id)
+                else:
+                    lease.renew(now, self.lease_timeout)
+        return lost
+
+    def complete(self, lease_id, pages, returned=()):
+        # pages are [url, depth, outlinks, {log name: rows}] crawled so far, returned are [url, depth]
+        # the worker gives back uncrawled. Returns how many pages were accepted.
+        accepted = 0
+        with self.lock:
+            lease = self.leases.get(lease_id)
+            if lease is None:
+                # Expired and handed to another worker, which will log these pages instead
+                self.metrics.inc('late_pages', len(pages))
+                return accepted
+            for url, depth, outlinks, rows in pages:
+                if lease.urls.pop(url, None) is None:
+                    continue
+                accepted += 1
+                self.fetched_pages += 1
+                self.worker_pages[lease.worker] += 1
+                self.metrics.inc('pages_fetched')
+                for name, log_rows in rows.items():
+                    self.writer.writerows(name, log_rows)
+                for status in rows.get('fetch', []):
+                    self.metrics.inc(f'status_{status[1]}')
+                if depth < self.max_depth:
+                    for outlink in outlinks:
+                        self.schedule(outlink, depth + 1)
+            for url, depth in returned:
+                if lease.urls.pop(url, None) is not None:
+                    self.requeue(url, depth)
+            # The worker is still at it, the rest of the lease gets another lease_timeout
+            if lease.urls:
+                lease.renew(time.monotonic(), self.lease_timeout)
+            else:
+                del self.leases[lease_id]
+            self.check_finished()
+        return accepted
+
+    def run(self):
+        threading.Thread(target=self.server.serve_forever, name='coordinator', daemon=True).start()
+        self.metrics.start(self.metrics_interval)
+        logging.info(f'Coordinator listening on {self.url}')
+        try:
+            # Leases also expire here, in case every worker is gone
+            while not self.finished.wait(1.0):
+                with self.lock:
+                    self.expire_leases()
+                    self.check_finished()
+        finally:
+            self.server.shutdown()
+            self.server.server_close()
+            self.writer.close()
+            self.metrics.stop()
+        logging.info(self.metrics.summary())
+        for worker, pages in sorted(self.worker_pages.items()):
+            logging.info(f'{worker}: {pages} pages')
+
+
+class NoDedup:
+    # The coordinator hands out each URL once, and a re-issued lease has to be crawled again
+    def add_if_absent(self, url):
+        return True
+
+    def __contains__(self, url):
+        return False
+
+
+class PageRows:
+    # Stands in for the CSV writer, Crawler.crawl's rows are kept per thread and sent with the page
+    def __init__(self):
+        self.local = threading.local()
+
+    def begin(self):
+        self.local.rows = {}
+
+    def end(self):
+        rows, self.local.rows = self.local.rows, None
+        return rows
+
+    def writerow(self, name, row):
+        self.local.rows.setdefault(name, []).append(row)
+
+    def writerows(self, name, rows):
+        self.local.rows.setdefault(name, []).extend(rows)
+
+    def close(self):
+        pass
+
+
+class CrawlWorker(Crawler):
+    def __init__(self, coordinator_url, name=None, max_workers=50, lease_size=None, poll_interval=0.1,
+                 **options):
+        self.coordinator_url = coordinator_url.rstrip('/')
+        self.name = name or f'{socket.gethostname()}-{os.getpid()}'
+        self.rpc = requests.Session()
+        config = self.rpc.get(f'{self.coordinator_url}/config', timeout=30).json()
+        # The page limit is the coordinator's, this worker crawls whatever it is leased
+        super().__init__(config['base_url'], [], sys.maxsize, config['max_depth'], max_workers, **options)
+        self.visited_urls = NoDedup()
+        self.lease_size = lease_size or max_workers
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = config['lease_timeout'] / 3
+        self.resume_at = 0.0
+        self.leased = {}  # future -> (lease id, url, depth)
+
+    def init_csv_files(self):
+        self.writer = PageRows()
+
+    def report_path(self):
+        return None  # The coordinator keeps the report
+
+    def call(self, method, **payload):
+        response = self.rpc.post(f'{self.coordinator_url}/{method}', json=payload, timeout=60)
+        response.raise_for_status()
+        return response.json()
+
+    def defer(self, url, depth, retry_in):
+        # Given back with the lease's next completion, so the coordinator re-queues it. No new
+        # leases are taken until the host's circuit breaker lets fetches through again.
+        self.metrics.inc('breaker_deferred')
+        self.resume_at = max(self.resume_at, time.monotonic() + retry_in)
+
+    def crawl_page(self, url, depth):
+        # None when the page was deferred instead of crawled
+        self.writer.begin()
+        try:
+            outlinks = self.crawl(url, depth)
+        finally:
+            rows = self.writer.end()
+        if outlinks is None:
+            return None
+        # Only what this worker's Crawler would queue itself goes back, scope and cached robots.txt
+        # rules are checked here like in ShardCrawler.accept
+        outlinks = [outlink for outlink in set(outlinks) if self.admit(outlink, depth + 1)]
+        return [url, depth, outlinks, rows]
+
+    def heartbeat(self, stop):
+        # Keeps the leases of slow pages alive, the coordinator re-issues them once this stops
+        while not stop.wait(self.heartbeat_interval):
+            lease_ids = sorted({lease_id for lease_id, _, _ in list(self.leased.values())})
+            if lease_ids:
+                try:
+                    self.call('heartbeat', worker=self.name, leases=lease_ids)
+                except requests.RequestException as e:
+                    logging.warning(f'{self.name}: heartbeat failed: {e}')
+
+    def crawl_all(self):
+        # Leases are taken while the window has room, so the next batch is already being fetched
+        # while the slowest pages of the previous one finish. Pages are sent back as they finish,
+        # so a slow page does not hold back the rest of its lease.
+        leased = self.leased
+        done = False
+        stop = threading.Event()
+        threading.Thread(target=self.heartbeat, args=(stop,), name='heartbeat', daemon=True).start()
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                while True:
+                    while not done and len(leased) < self.window and time.monotonic() >= self.resume_at:
+                        lease = self.call('lease', worker=self.name, count=self.lease_size)
+                        done = lease['done']
+                        if not lease['urls']:
+                            break
+                        for url, depth in lease['urls']:
+                            leased[executor.submit(self.crawl_page, url, depth)] = (lease['id'], url, depth)
+                    self.metrics.set_gauge('in_flight', len(leased))
+                    if not leased:
+                        if done:
+                            break
+                        time.sleep(max(self.poll_interval, self.resume_at - time.monotonic()))
+                        continue
+                    finished, _ = wait(leased, return_when=FIRST_COMPLETED)
+                    completions = {}
+                    for future in finished:
+                        lease_id, url, depth = leased.pop(future)
+                        pages, returned = completions.setdefault(lease_id, ([], []))
+                        page = future.result()
+                        if page is None:
+                            returned.append([url, depth])
+                        else:
+                            pages.append(page)
+                    for lease_id, (pages, returned) in completions.items():
+                        self.call('complete', lease=lease_id, pages=pages, returned=returned)
+        finally:
+            # A worker that stops heartbeating lets its leases expire
+            stop.set()
+
+    def run(self):
+        try:
+            super().run()
+        except requests.ConnectionError:
+            # The coordinator shuts down once the crawl is over
+            logging.info(f'{self.name}: coordinator is gone, stopping')
+
+
+def run_worker(coordinator_url, options):
+    CrawlWorker(coordinator_url, **options).run()
+
+
+def run_local(base_url, urls=[], max_records=20000, workers=None, worker_options={}, **options):
+    # Coordinator in this process and `workers` worker processes on localhost
+    coordinator = Coordinator(base_url, urls, max_records, **options)
+    context = multiprocessing.get_context('spawn')
+    processes = [context.Process(target=run_worker, name=f'worker-{index}',
+                                 args=(coordinator.url, dict(worker_options, name=f'worker-{index}')))
+                 for index in range(workers or os.cpu_count())]
+    for process in processes:
+        process.start()
+    coordinator.run()
+    for process in processes:
+        process.join()
+    return coordinator
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest='role', required=True)
+    coordinator = subparsers.add_parser('coordinator', help='Own the frontier and the logs, serve leases')
+    coordinator.add_argument('--host', default='127.0.0.1', help='0.0.0.0 to accept workers on other hosts')
+    coordinator.add_argument('--port', type=int, default=8700)
+    coordinator.add_argument('--max-records', type=int, default=20000)
+    coordinator.add_argument('--lease-timeout', type=float, default=LEASE_TIMEOUT,
+                             help='Seconds a lease lives without a heartbeat or a completed page')
+    coordinator.add_argument('--url-timeout', type=float,
+                             help='Longest a worker may hold a leased URL, default from FetchPolicy')
+    worker = subparsers.add_parser('worker', help='Crawl URLs leased from a coordinator')
+    worker.add_argument('--coordinator', default='http://127.0.0.1:8700')
+    worker.add_argument('--workers', type=int, default=50, help='Fetch threads')
+    worker.add_argument('--same-site', action='store_true', help='Only send back URLs on the news site')
+    local = subparsers.add_parser('local', help='Coordinator plus worker processes on this machine')
+    local.add_argument('--processes', type=int, default=os.cpu_count())
+    local.add_argument('--max-records', type=int, default=20000)
+    local.add_argument('--workers', type=int, default=50, help='Fetch threads per worker process')
+    local.add_argument('--same-site', action='store_true', help='Only crawl URLs on the news site')
+    args = parser.parse_args()
+    if args.role == 'coordinator':
+        Coordinator('https://www.nytimes.com/', ['https://www.nytimes.com/'], args.max_records, host=args.host,
+                    port=args.port, lease_timeout=args.lease_timeout, url_timeout=args.url_timeout).run()
+    elif args.role == 'worker':
+        scope = Scope.for_site('https://www.nytimes.com/', follow_out_of_scope=not args.same_site)
+        CrawlWorker(args.coordinator, max_workers=args.workers, scope=scope).run()
+    else:
+        run_local('https://www.nytimes.com/', ['https://www.nytimes.com/'], args.max_records, args.processes,
+                  {'max_workers': args.workers,
+                   'scope': Scope.for_site('https://www.nytimes.com/', follow_out_of_scope=not args.same_site)})
@@ -0,0 +1,153 @@
+import ipaddress
+import socket
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from urllib.parse import urlsplit
+from urllib3.util.connection import allowed_gai_family
+
+# Host name lookups for every connection the crawler opens, see connection_pool.py. Answers are
+# kept for `ttl` seconds and failed lookups for `negative_ttl`, up to max_size hosts with the
+# least recently used dropped first. getaddrinfo does not report the record TTL, so one TTL
+# applies to every host. Concurrent lookups of the same host share one resolver call, and
+# prefetch() starts a lookup in the background when a URL enters the frontier, so the name is
+# usually resolved before a worker picks the URL up.
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def is_address(host):
+    try:
+        ipaddress.ip_address(host.strip('[]'))
+        return True
+    except ValueError:
+        return False
+
+
+class DNSCache:
+    def __init__(self, resolver=socket.getaddrinfo, ttl=300.0, negative_ttl=60.0, max_size=10_000,
+                 prefetch_workers=8, max_prefetching=1000):
+        # resolver has the signature of socket.getaddrinfo, a fake one can stand in for DNS
+        self.resolver = resolver
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        self.max_prefetching = max_prefetching
+        self.family = allowed_gai_family()
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # (host, port) -> (expires, addresses or the gaierror)
+        self.in_flight = {}  # (host, port) -> Future of the lookup
+        self.executor = ThreadPoolExecutor(max_workers=prefetch_workers, thread_name_prefix='dns')
+        # hits include lookups that waited on one already in flight, negative_hits are cached failures
+        self.hits = self.negative_hits = self.misses = self.prefetches = self.evicted = 0
+        self.lookup_seconds = 0.0
+
+    def _fresh(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return entry
+
+    def resolve(self, host, port):
+        # getaddrinfo results for a TCP connection, raises socket.gaierror like getaddrinfo
+        if is_address(host):
+            return socket.getaddrinfo(host, port, self.family, socket.SOCK_STREAM)  # Nothing to look up
+        key = (host, port)
+        with self.lock:
+            entry = self._fresh(key)
+            if entry is not None:
+                if isinstance(entry[1], socket.gaierror):
+                    self.negative_hits += 1
+                    raise entry[1]
+                self.hits += 1
+                return entry[1]
+            future = self.in_flight.get(key)
+            if future is None:
+                future = self.in_flight[key] = Future()
+            # A prefetch still queued behind others is taken over rather than waited for
+            owner = future.set_running_or_notify_cancel() if not future.running() else False
+            if owner:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if owner:
+            self._lookup(key, future)
+        return future.result()
+
+    def prefetch(self, url):
+        parts = urlsplit(url)
+        host = parts.hostname
+        if not host or is_address(host):
+            return
+        try:
+            key = (host, parts.port or DEFAULT_PORTS.get(parts.scheme, 80))
+        except ValueError:
+            return  # Port out of range, the fetch will fail on its own
+        with self.lock:
+            if key in self.in_flight or len(self.in_flight) >= self.max_prefetching or self._fresh(key):
+                return
+            self.prefetches += 1
+            future = self.in_flight[key] = Future()
+        self.executor.submit(self._prefetch, key, future)
+
+    def _prefetch(self, key, future):
+        with self.lock:
+            if future.running() or future.done():
+                return  # Taken over by a fetch that needed the address first
+            future.set_running_or_notify_cancel()
+        self._lookup(key, future)
+
+    def _lookup(self, key, future):
+        start = time.perf_counter()
+        expires = None
+        try:
+            result = self.resolver(key[0], key[1], self.family, socket.SOCK_STREAM)
+            expires = time.monotonic() + self.ttl
+        except socket.gaierror as e:
+            result = e
+            expires = time.monotonic() + self.negative_ttl
+        except Exception as e:
+            # Not an answer about the name, so nothing is cached
+            result = e
+        with self.lock:
+            self.lookup_seconds += time.perf_counter() - start
+            if expires is not None:
+                self.entries[key] = (expires, result)
+                self.entries.move_to_end(key)
+                while len(self.entries) > self.max_size:
+                    self.entries.popitem(last=False)
+                    self.evicted += 1
+            del self.in_flight[key]
+        if isinstance(result, Exception):
+            future.set_exception(result)
+        else:
+            future.set_result(result)
+
+    def register_metrics(self, metrics):
+        for name in ['hits', 'negative_hits', 'misses', 'prefetches']:
+            metrics.gauge(f'dns_{name}', lambda name=name: getattr(self, name))
+
+    def summary(self):
+        lookups = self.hits + self.negative_hits + self.misses
+        rate = (self.hits + self.negative_hits) / lookups if lookups else 0.0
+        return (f'DNS cache: {self.hits + self.negative_hits}/{lookups} hits ({rate:.1%}, '
+                f'{self.negative_hits} negative), {self.prefetches} prefetched, {self.evicted} evicted, '
+                f'{self.lookup_seconds:.2f}s in the resolver')
+
+
+shared_lock = threading.Lock()
+shared_cache = None
+
+
+def shared_dns_cache():
+    # One cache per process, shared by every crawler and session in it
+    global shared_cache
+    with shared_lock:
+        if shared_cache is None:
+            shared_cache = DNSCache()
+        return shared_cache
@@ -0,0 +1,181 @@
+import random
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+import requests
+from politeness import host_of
+
+# How a crawler fetches one URL: connect and read timeouts on every request, a bounded number
+# of retries with jittered exponential backoff for connection errors, timeouts and 5xx, the
+# server's Retry-After for 429 and 503, and a per-host circuit breaker that stops fetching from
+# a host whose recent requests mostly failed. Backoff sleeps in the worker thread, so it is
+# capped by max_backoff and max_retry_after.
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# (connect, read) seconds, the read timeout applies to each wait for data, not the whole body
+DEFAULT_TIMEOUT = (5.0, 30.0)
+
+
+class CircuitOpen(Exception):
+    def __init__(self, host, retry_in):
+        super().__init__(f'Circuit breaker open for {host}, retry in {retry_in:.1f}s')
+        self.host = host
+        self.retry_in = retry_in
+
+
+class FetchFailed(Exception):
+    def __init__(self, error, retries):
+        super().__init__(f'{error} (after {retries} retries)')
+        self.error = error
+        self.retries = retries
+
+
+def retry_after(response):
+    # Seconds from a Retry-After header, either delta-seconds or an HTTP date
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    if value.strip().isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+    # Per host: closed while fewer than `threshold` of the last `window` results are failures
+    # (once at least min_requests are in). Then open for `cooldown` seconds, after which one
+    # trial fetch is let through (half-open): success closes the breaker, failure opens it again.
+    def __init__(self, window=20, threshold=0.5, min_requests=10, cooldown=30.0):
+        self.window = window
+        self.threshold = threshold
+        self.min_requests = min_requests
+        self.cooldown = cooldown
+        self.lock = threading.Lock()
+        self.results = {}
+        self.open_until = {}
+        self.trials = set()
+        self.trips = {}
+
+    def before(self, host):
+        # Raises CircuitOpen instead of letting a fetch go to a paused host
+        with self.lock:
+            until = self.open_until.get(host)
+            if until is None:
+                return
+            now = time.monotonic()
+            if until > now:
+                raise CircuitOpen(host, until - now)
+            if host in self.trials:
+                # Another thread is making the trial fetch
+                raise CircuitOpen(host, min(1.0, self.cooldown))
+            self.trials.add(host)
+
+    def retry_in(self, host):
+        # Seconds until the host takes fetches again, None when it is not paused. Unlike before()
+        # this does not claim the trial fetch.
+        with self.lock:
+            until = self.open_until.get(host)
+            if until is None:
+                return None
+            remaining = until - time.monotonic()
+            if remaining > 0:
+                return remaining
+            # Cooled down, free for the trial fetch unless another thread is already making it
+            return min(1.0, self.cooldown) if host in self.trials else None
+
+    def record(self, host, ok):
+        # Returns True when this result opened the breaker
+        with self.lock:
+            if host in self.trials:
+                self.trials.discard(host)
+                if ok:
+                    del self.open_until[host]
+                    return False
+                self._trip(host)
+                return True
+            if host in self.open_until:
+                return False  # A fetch that started before the breaker opened
+            results = self.results.setdefault(host, deque(maxlen=self.window))
+            results.append(ok)
+            if len(results) >= self.min_requests and results.count(False) >= self.threshold * len(results):
+                self._trip(host)
+                return True
+            return False
+
+    def _trip(self, host):
+        self.open_until[host] = time.monotonic() + self.cooldown
+        self.results.pop(host, None)
+        self.trips[host] = self.trips.get(host, 0) + 1
+
+    def trip_count(self, host):
+        with self.lock:
+            return self.trips.get(host, 0)
+
+
+class FetchPolicy:
+    def __init__(self, timeout=DEFAULT_TIMEOUT, retries=3, backoff=0.5, max_backoff=30.0,
+                 max_retry_after=120.0, breaker=None, metrics=None):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_retry_after = max_retry_after
+        # breaker=False fetches without a circuit breaker
+        self.breaker = CircuitBreaker() if breaker is None else breaker
+        self.metrics = metrics
+
+    def worst_case_seconds(self):
+        # Longest one get() can hold a worker: every attempt waits out the connect and read
+        # timeouts, and every retry sleeps the longest backoff or Retry-After allowed
+        timeout = sum(self.timeout) if isinstance(self.timeout, tuple) else 2 * self.timeout
+        return (self.retries + 1) * timeout + self.retries * max(self.max_backoff, self.max_retry_after)
+
+    def backoff_delay(self, attempt):
+        # Full jitter, so threads that failed together do not retry together
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def count(self, name):
+        if self.metrics:
+            self.metrics.inc(name)
+
+    def record(self, host, ok):
+        if self.breaker and self.breaker.record(host, ok):
+            self.count('breaker_trips')
+
+    def get(self, get, url, **kwargs):
+        # Returns (response, retries). Raises FetchFailed once the retries are used up on an
+        # exception, and CircuitOpen when the host is paused, possibly between two attempts.
+        host = host_of(url)
+        kwargs.setdefault('timeout', self.timeout)
+        for attempt in range(self.retries + 1):
+            if self.breaker:
+                self.breaker.before(host)
+            try:
+                response = get(url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self.count('timeouts' if isinstance(e, requests.Timeout) else 'connection_errors')
+                self.record(host, False)
+                if attempt == self.retries:
+                    raise FetchFailed(e, attempt)
+                delay = self.backoff_delay(attempt)
+            except Exception:
+                # A bad URL or a redirect loop says nothing about the host, but it ends a trial fetch
+                self.record(host, True)
+                raise
+            else:
+                retryable = response.status_code in RETRY_STATUSES
+                self.record(host, not retryable)
+                if not retryable or attempt == self.retries:
+                    return response, attempt
+                delay = retry_after(response) if response.status_code in (429, 503) else None
+                if delay is None:
+                    delay = self.backoff_delay(attempt)
+                elif delay > self.max_retry_after:
+                    # Not worth holding a worker thread that long, the response stands
+                    return response, attempt
+                response.close()
+            self.count('retries')
+            time.sleep(delay)
@@ -0,0 +1,111 @@
+import heapq
+import itertools
+import threading
+import time
+
+
+# Priority functions take (url, depth) and return a sort key, lowest is crawled first
+def depth_priority(url, depth):
+    # Breadth-first, the order Crawler.run used to submit work in
+    return depth
+
+
+def score_priority(score):
+    # Breadth-first, and within a depth the URLs with the highest score(url) first
+    def priority(url, depth):
+        return depth, -score(url)
+    return priority
+
+
+class BoundedFrontier:
+    # Heap of URLs waiting to be crawled with a hard capacity. put() blocks producers while the
+    # heap is full and drops the URL once its timeout runs out, so memory stays flat however
+    # many links a page has. URLs already waiting in the heap are not queued twice.
+    def __init__(self, capacity=100_000, priority=depth_priority):
+        self.capacity = capacity
+        self.priority = priority
+        self.heap = []
+        self.size = 0
+        self.queued = set()
+        self.order = itertools.count()
+        self.lock = threading.Lock()
+        self.not_full = threading.Condition(self.lock)
+        self.not_empty = threading.Condition(self.lock)
+        self.dropped = 0
+        self.delayed = []  # (due time, order, url, depth) from put_later()
+
+    def put(self, url, depth, block=True, timeout=None):
+        key = self.priority(url, depth)
+        with self.not_full:
+            if url in self.queued:
+                return True
+            if not self.not_full.wait_for(lambda: self.size < self.capacity, timeout if block else 0):
+                self.dropped += 1
+                return False
+            self._push((key, next(self.order), url, depth))
+            self.size += 1
+            self.queued.add(url)
+            self.not_empty.notify()
+            return True
+
+    def put_later(self, url, depth, delay):
+        # For a URL that was handed out but has to wait, like one on a paused host. It goes back
+        # without blocking: its slot was freed by get(), so this only overshoots the capacity
+        # if put() refilled that slot in between.
+        with self.lock:
+            if url in self.queued:
+                return
+            heapq.heappush(self.delayed, (time.monotonic() + delay, next(self.order), url, depth))
+            self.size += 1
+            self.queued.add(url)
+            self.not_empty.notify()
+
+    def _release_delayed(self):
+        # Moves due URLs into the heap, returns seconds until the next one is due or None
+        now = time.monotonic()
+        while self.delayed and self.delayed[0][0] <= now:
+            _, order, url, depth = heapq.heappop(self.delayed)
+            self._push((self.priority(url, depth), order, url, depth))
+        return self.delayed[0][0] - now if self.delayed else None
+
+    def get(self, block=True, timeout=None):
+        # Returns (url, depth), or None when nothing became ready in time
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.not_empty:
+            while True:
+                delayed_in = self._release_delayed()
+                entry, ready_in = self._pop()
+                if entry is not None:
+                    _, _, url, depth = entry
+                    self.size -= 1
+                    self.queued.discard(url)
+                    self.not_full.notify()
+                    return url, depth
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if not block or (remaining is not None and remaining <= 0):
+                    return None
+                waits = [wait for wait in (ready_in, delayed_in, remaining) if wait is not None]
+                self.not_empty.wait(min(waits) if waits else None)
+
+    def release(self, url):
+        # Called once the crawl of a URL handed out by get() has finished
+        pass
+
+    def ready_in(self):
+        # Seconds until get() can hand out a URL, None when that depends on a put()
+        with self.lock:
+            delayed_in = self._release_delayed()
+            return 0.0 if self.heap else delayed_in
+
+    def _push(self, entry):
+        heapq.heappush(self.heap, entry)
+
+    def _pop(self):
+        # Returns (entry, None), or (None, seconds to wait) when nothing can be handed out yet
+        if self.heap:
+            return heapq.heappop(self.heap), None
+        return None, None
+
+    def __len__(self):
+        with self.lock:
+            return self.size
@@ -0,0 +1,114 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+# What a re-crawl needs to skip unchanged pages, kept on disk between runs: the validators the
+# server sent (ETag, Last-Modified), a hash of the body and what the crawl got out of it (size,
+# content type, outlinks). Keyed by canonical URL. Bodies are not stored, so the size cap is on
+# the entries themselves and the least recently used ones are evicted first.
+
+CacheEntry = namedtuple('CacheEntry', ['etag', 'last_modified', 'content_hash', 'size', 'content_type', 'outlinks'])
+
+
+def validators(body):
+    # body is a fully read StreamedBody (streaming.py), which hashes the bytes as they arrive
+    headers = body.response.headers
+    return {'etag': headers.get('ETag'), 'last_modified': headers.get('Last-Modified'),
+            'content_hash': body.content_hash()}
+
+
+class HTTPCache:
+    def __init__(self, path, max_bytes=256 * 2 ** 20, batch_size=1000, commit_interval=2.0):
+        self.lock = threading.Lock()
+        self.max_bytes = max_bytes
+        self.batch_size = batch_size
+        self.commit_interval = commit_interval
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS entries (url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, '
+                        'content_hash TEXT, size INTEGER, content_type TEXT, outlinks TEXT, '
+                        'bytes INTEGER NOT NULL, used REAL NOT NULL)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS entries_used ON entries (used)')
+        self.db.commit()
+        self.total_bytes = self.db.execute('SELECT COALESCE(SUM(bytes), 0) FROM entries').fetchone()[0]
+        # Per run: lookups, hits (304 or same body) and bytes not downloaded thanks to a 304
+        self.lookups = self.hits = self.bytes_saved = self.evicted = 0
+        self.uncommitted = 0
+        self.last_commit = time.monotonic()
+
+    def get(self, url):
+        with self.lock:
+            self.lookups += 1
+            row = self.db.execute('SELECT etag, last_modified, content_hash, size, content_type, outlinks '
+                                  'FROM entries WHERE url = ?', (url,)).fetchone()
+        if row is None:
+            return None
+        return CacheEntry(*row[:5], json.loads(row[5]))
+
+    def conditional_headers(self, entry):
+        headers = {}
+        if entry.etag:
+            headers['If-None-Match'] = entry.etag
+        if entry.last_modified:
+            headers['If-Modified-Since'] = entry.last_modified
+        return headers
+
+    def hit(self, url, entry, not_modified):
+        # not_modified is a 304, otherwise the body was downloaded again and had the same hash
+        with self.lock:
+            self.hits += 1
+            if not_modified:
+                self.bytes_saved += entry.size
+            self.db.execute('UPDATE entries SET used = ? WHERE url = ?', (time.time(), url))
+            self._maybe_commit()
+
+    def put(self, url, validators, size, content_type, outlinks):
+        outlinks = json.dumps(outlinks)
+        entry_bytes = len(url) + len(outlinks) + 128
+        with self.lock:
+            old = self.db.execute('SELECT bytes FROM entries WHERE url = ?', (url,)).fetchone()
+            self.db.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                            (url, validators['etag'], validators['last_modified'], validators['content_hash'],
+                             size, content_type, outlinks, entry_bytes, time.time()))
+            self.total_bytes += entry_bytes - (old[0] if old else 0)
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+            self._maybe_commit()
+
+    def _evict(self):
+        # Down to 90% of the cap, so the next few inserts do not each evict again
+        target = self.max_bytes * 0.9
+        while self.total_bytes > target:
+            rows = self.db.execute('SELECT url, bytes FROM entries ORDER BY used LIMIT 500').fetchall()
+            if not rows:
+                break
+            for url, entry_bytes in rows:
+                self.db.execute('DELETE FROM entries WHERE url = ?', (url,))
+                self.total_bytes -= entry_bytes
+                self.evicted += 1
+                if self.total_bytes <= target:
+                    break
+
+    def summary(self):
+        rate = self.hits / self.lookups if self.lookups else 0.0
+        return (f'HTTP cache: {self.hits}/{self.lookups} hits ({rate:.1%}), '
+                f'{self.bytes_saved / 2 ** 20:.2f} MB not downloaded, {self.evicted} evicted, '
+                f'{self.total_bytes / 2 ** 20:.2f} MB cached')
+
+    def _maybe_commit(self):
+        self.uncommitted += 1
+        if self.uncommitted >= self.batch_size or time.monotonic() - self.last_commit >= self.commit_interval:
+            self._commit()
+
+    def _commit(self):
+        self.db.commit()
+        self.uncommitted = 0
+        self.last_commit = time.monotonic()
+
+    def close(self):
+        with self.lock:
+            self._commit()
+            self.db.close()
@@ -0,0 +1,119 @@
+import re
+from html.parser import HTMLParser
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+# Pulls <a href> values out of a page without building a document tree.
+# Every backend takes either a whole page or an iterable of text chunks and yields hrefs as they
+# are found, in document order. Like BeautifulSoup's find_all('a', href=True), an <a> with a bare
+# href attribute yields '' and an <a> without one yields nothing.
+
+# lxml keeps the first of two href attributes on a tag, BeautifulSoup the last. Every page is
+# searched for such a tag, so the pattern walks each tag once and spells out the case instead of
+# using re.IGNORECASE, which is a few times slower on pages full of links.
+HREF = '[hH][rR][eE][fF]'
+DUPLICATE_HREF = re.compile(rf'<[aA]\s[^>hH]*+(?:[hH][^>hH]*+)*?{HREF}[^>hH]*+(?:[hH][^>hH]*+)*?{HREF}')
+A_TAG = re.compile(r'''<a\s(?:"[^"]*"|'[^']*'|[^'">])*>''', re.IGNORECASE)
+ATTRIBUTE = re.compile(r'''([^\s"'>/=]+)(?:\s*=\s*(?:"[^"]*"|'[^']*'|[^\s>]*))?''')
+# Longest unfinished tag held back from lxml until the next chunk closes it
+MAX_OPEN_TAG = 4096
+
+
+class HrefParser(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.found = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag != 'a':
+            return
+        href = None
+        # Last duplicate wins, the same as BeautifulSoup
+        for name, value in attrs:
+            if name == 'href':
+                href = value or ''
+        if href is not None:
+            self.found.append(href)
+
+    def drain(self):
+        found, self.found = self.found, []
+        return found
+
+
+def as_chunks(html):
+    return [html] if isinstance(html, str) else html
+
+
+def htmlparser_hrefs(html):
+    parser = HrefParser()
+    for chunk in as_chunks(html):
+        parser.feed(chunk)
+        yield from parser.drain()
+    parser.close()
+    yield from parser.drain()
+
+
+def shadow_tag(match):
+    tag = match.group()
+    hrefs = [attribute for attribute in ATTRIBUTE.finditer(tag, 2) if attribute.group(1).lower() == 'href']
+    # Every href but the last is renamed, so lxml sees the one BeautifulSoup keeps
+    for attribute in reversed(hrefs[:-1]):
+        tag = tag[:attribute.start()] + 'data-shadowed-' + tag[attribute.start():]
+    return tag
+
+
+def shadow_duplicate_hrefs(text):
+    if not DUPLICATE_HREF.search(text):
+        return text
+    return A_TAG.sub(shadow_tag, text)
+
+
+def split_open_tag(text):
+    # Splits off a tag the chunk ends in the middle of, so it is checked for duplicates whole
+    start = text.rfind('<')
+    if start == -1 or '>' in text[start:] or len(text) - start > MAX_OPEN_TAG:
+        return text, ''
+    return text[:start], text[start:]
+
+
+def lxml_hrefs(html):
+    parser = etree.HTMLPullParser(events=('start',), tag='a')
+    tail = ''
+    for chunk in as_chunks(html):
+        text, tail = split_open_tag(tail + chunk)
+        parser.feed(shadow_duplicate_hrefs(text))
+        for _, element in parser.read_events():
+            href = element.get('href')
+            if href is not None:
+                yield href
+    parser.feed(shadow_duplicate_hrefs(tail))
+    parser.close()
+    for _, element in parser.read_events():
+        href = element.get('href')
+        if href is not None:
+            yield href
+
+
+BACKENDS = {'htmlparser': htmlparser_hrefs, 'lxml': lxml_hrefs}
+
+
+def available_backends():
+    return [name for name in BACKENDS if name != 'lxml' or etree is not None]
+
+
+def get_link_extractor(backend='htmlparser'):
+    # 'auto' picks lxml when it is installed; htmlparser is the default because it tokenizes
+    # exactly like the BeautifulSoup 'html.parser' setup it replaces
+    if backend == 'auto':
+        backend = 'lxml' if etree is not None else 'htmlparser'
+    if backend not in BACKENDS:
+        raise ValueError(f'Unknown link extraction backend: {backend}')
+    if backend == 'lxml' and etree is None:
+        raise ImportError('The lxml link extraction backend needs lxml installed')
+    return BACKENDS[backend]
+
+
+iter_hrefs = htmlparser_hrefs
@@ -1,112 +1,376 @@
+import argparse
 import logging
-import csv
+import threading
+import time
+from functools import partial
 from urllib.parse import urljoin, urlparse
-import requests
-from bs4 import BeautifulSoup
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from connection_pool import POOL_PER_HOST, build_session
+from canonicalizer import URLCanonicalizer
+from crawl_report import CrawlReport
+from csv_writer import CrawlOutputWriter
+from dns_cache import shared_dns_cache
+from fetch_policy import CircuitOpen, FetchFailed, FetchPolicy
+from frontier import BoundedFrontier, depth_priority
+from http_cache import HTTPCache, validators
+from link_extractor import get_link_extractor
+from metrics import CrawlMetrics, timed_get
+from near_dup import NearDuplicateIndex, StreamingSimHash
+from persistent_frontier import open_frontier
+from politeness import HostScheduler, RobotsCache, host_of
+from scope import Scope
+from seen_store import make_seen_store
+from streaming import MAX_BODY_BYTES, StreamedBody, body_kind
 
 logging.basicConfig(format='%(asctime)s %(levelname)s:%(message)s', level=logging.INFO)
 
+OUTPUT_HEADERS = {
+    'fetch': ['URL', 'Status', 'Retries', 'Breaker Trips'],
+    'visit': ['URL', 'Size', 'Out Links Found', 'Content Type', 'Duplicate'],
+    'urls': ['URL', 'Status'],
+}
+
 class Crawler:
-    def __init__(self, base_url, urls=[], max_records=20000, max_depth=16):
+    def __init__(self, base_url, urls=[], max_records=20000, max_depth=16, max_workers=400,
+                 seen_mode='exact', canonicalizer=None, link_backend='htmlparser', frontier_path=None,
+                 resume=False, frontier_capacity=100_000, window=None, priority=depth_priority, put_timeout=1.0,
+                 polite=False, min_delay=1.0, max_per_host=2, pool_per_host=POOL_PER_HOST, log_formats=('csv',),
+                 metrics=None, metrics_interval=10.0, metrics_port=None, cache_path=None,
+                 cache_max_bytes=256 * 2 ** 20, max_body_bytes=MAX_BODY_BYTES, fetch_policy=None, dedup=True,
+                 dns_cache=None, scope=None, report_interval=60.0):
         self.base_url = base_url
-        self.session = requests.Session()  # Use session for connection pooling
-        self.visited_urls = set()
-        self.urls_to_visit = [(url, 1) for url in set(urls)]  # Start with depth of 1
+        self.max_workers = max_workers
+        # Counters, latency histograms and gauges, logged every metrics_interval seconds
+        self.metrics = metrics or CrawlMetrics()
+        self.metrics_interval = metrics_interval
+        self.metrics_port = metrics_port
+        # Host lookups are cached process-wide and started when a URL is queued, see dns_cache.py
+        self.dns = dns_cache or shared_dns_cache()
+        self.dns.register_metrics(self.metrics)
+        # Connections per host, a polite crawl never has more than max_per_host fetches to one in flight
+        pool_size = min(pool_per_host, max_per_host) if polite else pool_per_host
+        self.session = build_session(max_workers, pool_size, metrics=self.metrics, dns=self.dns)
+        self.visited_urls = make_seen_store(seen_mode)  # Thread safe, see seen_store.py
+        self.canonicalizer = canonicalizer or URLCanonicalizer()
+        self.extract_hrefs = get_link_extractor(link_backend)
+        seeds = {self.canonicalizer.canonicalize(url) for url in urls} - {None}
+        self.urls_to_visit = [(url, 1) for url in seeds]  # Start with depth of 1
         self.max_records = max_records
         self.max_depth = max_depth
         self.site_name = urlparse(base_url).netloc.split('.')[1]
+        # Which outlinks are queued and which are labelled OK, compiled once, see scope.py
+        self.scope = scope or Scope.for_site(base_url)
+        self.lock = threading.Lock()
+        self.frontier = open_frontier(frontier_path, resume)
+        # Validators and outlinks of earlier crawls for conditional requests, see http_cache.py
+        self.cache = HTTPCache(cache_path, cache_max_bytes) if cache_path else None
+        self.max_body_bytes = max_body_bytes  # Bodies are not read past this, see streaming.py
+        # Timeouts, retries and the per-host circuit breaker, see fetch_policy.py
+        self.policy = fetch_policy or FetchPolicy()
+        if self.policy.metrics is None:
+            self.policy.metrics = self.metrics  # Retry and breaker counters go to this crawl's metrics
+        self.deferred = set()  # URLs marked visited whose fetch was put off by an open breaker
+        # Pages already crawled under another URL are logged without their outlinks, see near_dup.py
+        self.dedup = NearDuplicateIndex() if dedup else None
+        # Only `window` crawls are handed to the executor at a time, the rest wait in the bounded heap
+        if polite:
+            # robots.txt rules and per-host delay/concurrency limits, see politeness.py
+            self.robots = RobotsCache(self.session)
+            self.pending = HostScheduler(frontier_capacity, priority, min_delay, max_per_host, self.robots)
+        else:
+            self.robots = None
+            self.pending = BoundedFrontier(frontier_capacity, priority)
+        self.window = window or 2 * max_workers
+        self.metrics.gauge('frontier_size', lambda: len(self.pending))
+        self.put_timeout = put_timeout
+        self.fetched_pages = self.frontier.counters.get('fetched_pages', 0)
+        self.log_formats = log_formats  # ('csv', 'parquet') adds a columnar copy, see columnar_log.py
+        self.resume = resume and self.restore_frontier()
+        # The crawl report is kept from the logged rows and rewritten every report_interval seconds
+        self.report = CrawlReport(self.report_path(), report_interval)
         self.init_csv_files()
-        self.fetched_pages = 0
-        self.non_200_count = 0
-        self.max_non_200 = 1811
+
+    def restore_frontier(self):
+        # Picks up the pending URLs and the already crawled fingerprints of a stopped crawl
+        pending = self.frontier.pending_urls()
+        seen = self.frontier.seen_fingerprints()
+        if not pending and not seen:
+            return False
+        for fingerprint in seen:
+            self.visited_urls.add_fingerprint(fingerprint)
+        self.urls_to_visit = pending
+        logging.info(f'Resuming crawl: {len(pending)} pending URLs, {len(seen)} already crawled')
+        return True
 
     def init_csv_files(self):
-        # Initialize CSV files
-        with open(f'fetch_{self.site_name}.csv', 'w', newline='', encoding='utf-8') as file:
-            writer = csv.writer(file)
-            writer.writerow(['URL', 'Status'])
-        with open(f'visit_{self.site_name}.csv', 'w', newline='', encoding='utf-8') as file:
-            writer = csv.writer(file)
-            writer.writerow(['URL', 'Size', 'Out Links Found', 'Content Type'])
-        with open(f'urls_{self.site_name}.csv', 'w', newline='', encoding='utf-8') as file:
-            writer = csv.writer(file)
-            writer.writerow(['URL', 'Status'])
-
-    def download_url(self, url, depth):
+        if self.resume:
+            # The report carries on from the rows logged before the crawl was stopped, read once
+            for name in OUTPUT_HEADERS:
+                self.report.add_log(name, self.output_path(name))
+        # One long-lived handle per CSV, rows are queued to a background writer thread
+        self.writer = CrawlOutputWriter({name: (self.output_path(name), header)
+                                         for name, header in OUTPUT_HEADERS.items()},
+                                        append=self.resume, formats=self.log_formats, report=self.report)
+        # Logged rows reach disk before the frontier records their pages as crawled
+        self.frontier.before_commit = self.writer.sync
+
+    def output_path(self, name):
+        return f'{name}_{self.site_name}.csv'
+
+    def report_path(self):
+        return f'CrawlReport_{self.site_name}.txt'
+
+    def download_url(self, url, depth, cached=None):
+        # Only the headers are read here, an HTML body is streamed into the parser, see streaming.py.
+        # Raises CircuitOpen when the host is paused.
         try:
-            response = requests.get(url)
+            headers = self.cache.conditional_headers(cached) if cached else None
+            response, retries = self.policy.get(partial(timed_get, self.metrics, self.session.get), url,
+                                                headers=headers, stream=True)
             content_type = response.headers.get('Content-Type', '')
-            if any(ct in content_type for ct in ['html', 'pdf', 'msword', 'image']):
-                return response.text, response.status_code, len(response.content), content_type, False
-            else:
-                return '', response.status_code, 0, content_type, True
+            body = StreamedBody(response, self.max_body_bytes, self.metrics)
+            kind = body_kind(content_type)
+            if kind == 'size':
+                body.drain()
+            elif kind is None:
+                body.close()
+            return body, response.status_code, content_type, kind is None, retries
+        except CircuitOpen:
+            raise
+        except FetchFailed as e:
+            logging.warning(f'Error downloading {url}: {e}')
+            return None, 0, '', True, e.retries
         except Exception as e:
             logging.exception(f'Error downloading {url}: {e}')
-            return '', 0, 0, '', True
+            return None, 0, '', True, 0
+
+    def check_duplicate(self, content_hash, hasher):
+        # 'exact', 'near' or None, the page is added to the index when it is new
+        with self.metrics.timer('dedup_seconds'):
+            duplicate = self.dedup.check_streamed(content_hash, hasher)
+        if duplicate:
+            self.metrics.inc(f'duplicates_{duplicate}')
+        return duplicate
+
+    def defer(self, url, depth, retry_in):
+        self.pending.put_later(url, depth, retry_in)
+        self.metrics.inc('breaker_deferred')
 
     def crawl(self, url, depth):
+        # Returns None when the URL was not crawled because of the page or depth limit
         if self.fetched_pages >= self.max_records or depth > self.max_depth:
+            return None
+        # A paused host's URLs wait in the frontier until its breaker lets fetches through again
+        retry_in = self.policy.breaker.retry_in(host_of(url)) if self.policy.breaker else None
+        if retry_in:
+            self.defer(url, depth, retry_in)
+            return None
+        # Waits for the host's robots.txt if the prefetch from admit() has not finished yet
+        if self.robots is not None and not self.robots.allowed(url):
             return []
-        if url in self.visited_urls:
+        with self.lock:
+            deferred = url in self.deferred
+            self.deferred.discard(url)
+        if not deferred and not self.visited_urls.add_if_absent(url):
             return []
-        self.visited_urls.add(url)
-        html, status_code, size, content_type, skip = self.download_url(url, depth)
-    
-        if status_code != 200:
-            if self.non_200_count >= self.max_non_200:
-                logging.info('Maximum limit of non-200 status code URLs reached. Stopping further processing.')
-                return []  # Stop processing non-200 status code URLs if limit reached
-            self.non_200_count += 1
-            logging.info(f'Number of unsuccessful URLs: {self.non_200_count}')
-
-        with open(f'fetch_{self.site_name}.csv', 'a', newline='', encoding='utf-8') as file:
-            if status_code != 200:
-                if self.non_200_count <= self.max_non_200:
-                    writer = csv.writer(file)
-                    writer.writerow([url, status_code])
-            else:
-                writer = csv.writer(file)
-                writer.writerow([url, status_code])
+        logging.debug(f'Crawling {url} (depth {depth})')
+        cached = self.cache.get(url) if self.cache else None
+        try:
+            body, status_code, content_type, skip, retries = self.download_url(url, depth, cached)
+        except CircuitOpen as e:
+            # Opened after the check above, the URL is already marked visited
+            with self.lock:
+                self.deferred.add(url)
+            self.defer(url, depth, e.retry_in)
+            return None
+        outlinks = None
+        if cached and status_code == 304:
+            # Unchanged since it was cached, the cached outlinks and size stand in for the body
+            body.drain()
+            self.cache.hit(url, cached, not_modified=True)
+            self.metrics.inc('cache_hits')
+            self.metrics.inc('cache_bytes_saved', cached.size)
+            status_code, content_type, skip = 200, cached.content_type, False
+            outlinks = cached.outlinks
+        with self.lock:
+            self.fetched_pages += 1
+        self.metrics.inc('pages_fetched')
+        self.metrics.inc(f'status_{status_code}')
+        breaker_trips = self.policy.breaker.trip_count(host_of(url)) if self.policy.breaker else 0
+        self.writer.writerow('fetch', [url, status_code, retries, breaker_trips])
 
         if not skip:
-            outlinks = list(self.get_linked_urls(url, html))
-            for outlink in outlinks:
-                indicator = 'OK' if urlparse(outlink).netloc == urlparse(self.base_url).netloc else 'N_OK'
-                with open(f'urls_{self.site_name}.csv', 'a', newline='', encoding='utf-8') as urls_file:
-                    urls_writer = csv.writer(urls_file)
-                    urls_writer.writerow([outlink, indicator])
-            with open(f'visit_{self.site_name}.csv', 'a', newline='', encoding='utf-8') as file:
-                writer = csv.writer(file)
-                writer.writerow([url, size, len(outlinks), content_type])
+            duplicate = None
+            if outlinks is None:
+                hasher = None
+                if self.dedup is not None and status_code == 200 and body_kind(content_type) == 'parse':
+                    # The SimHash is computed over the chunks on their way to the parser, so the page
+                    # is never held in full. A copy is parsed too, but its outlinks are dropped.
+                    hasher = StreamingSimHash(self.dedup.shingle_size)
+                # Includes reading the body, the parser pulls it off the connection chunk by chunk
+                with self.metrics.timer('parse_seconds'):
+                    outlinks = list(self.get_linked_urls(url, body if hasher is None else hasher.feed(body)))
+                if hasher is not None and body.complete:
+                    duplicate = self.check_duplicate(body.content_hash(), hasher)
+                size = body.size
+                if duplicate:
+                    # Its outlinks are the original's, which are already in the frontier
+                    outlinks = []
+                elif (cached and status_code == 200 and body.complete and
+                      body.content_hash() == cached.content_hash):
+                    # Sent again but unchanged since it was cached, so the cached outlinks still hold
+                    self.cache.hit(url, cached, not_modified=False)
+                    self.metrics.inc('cache_hits')
+                    outlinks = cached.outlinks
+                elif self.cache and status_code == 200 and body.complete:
+                    self.cache.put(url, validators(body), size, content_type, outlinks)
+            else:
+                size = cached.size
+            self.writer.writerows('urls', [[outlink, self.scope.label(outlink)] for outlink in outlinks])
+            self.writer.writerow('visit', [url, size, len(outlinks), content_type, duplicate or ''])
             return outlinks
         return []
 
     def get_linked_urls(self, url, html):
-        soup = BeautifulSoup(html, 'html.parser')
-        for link in soup.find_all('a'):
-            path = link.get('href')
+        # html is the page text or an iterable of text chunks
+        for path in self.extract_hrefs(html):
             if path and path.startswith('/'):
                 path = urljoin(url, path)
             elif not path or not path.startswith('http'):
                 continue
-            yield path
+            # Canonical form before the visited check and urls CSV, so variants count once
+            path = self.canonicalizer.canonicalize(path)
+            if path:
+                yield path
 
-    def run(self):
-        with ThreadPoolExecutor(max_workers=400) as executor:
-            futures = {executor.submit(self.crawl, url, depth): (url, depth) for url, depth in self.urls_to_visit}
-            while futures and self.fetched_pages < self.max_records:
-                done, _ = as_completed(futures), futures.pop
-                for future in done:
-                    url, depth = futures.pop(future)
-                    if self.fetched_pages >= self.max_records:
+    def crawl_task(self, url, depth):
+        try:
+            self.finish(url, depth, self.crawl(url, depth))
+        finally:
+            self.pending.release(url)
+
+    def admit(self, url, depth=None):
+        # Blocked URLs never enter the frontier, nor do disallowed ones once their host's
+        # robots.txt is cached. Until then they are let in and checked again in crawl().
+        if not self.scope.admit(url, depth):
+            self.metrics.inc('scope_rejected')
+            return False
+        if self.robots is None:
+            return True
+        allowed = self.robots.cached_allowed(url)
+        if allowed is None:
+            self.robots.prefetch(url)
+            return True
+        return allowed
+
+    def finish(self, url, depth, outlinks):
+        # URLs skipped by the page limit stay pending for a --resume
+        if outlinks is None:
+            return
+        self.frontier.complete(url)
+        if depth >= self.max_depth:
+            return
+        # Blocks this worker while the heap is full, which is the backpressure on producers.
+        # The wait is bounded per page, not per outlink, after that the overflow is dropped.
+        deadline = time.monotonic() + self.put_timeout
+        for outlink in set(outlinks):
+            if outlink in self.visited_urls or not self.admit(outlink, depth + 1):
+                continue
+            # Only URLs that made it into the heap are recorded, the overflow is gone for good
+            if self.pending.put(outlink, depth + 1, timeout=max(0.0, deadline - time.monotonic())):
+                self.frontier.schedule(outlink, depth + 1)
+                self.dns.prefetch(outlink)
+
+    def crawl_all(self):
+        for url, depth in self.urls_to_visit:
+            if self.admit(url, depth) and self.pending.put(url, depth, block=False):
+                self.frontier.schedule(url, depth)
+        in_flight = set()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while self.fetched_pages < self.max_records:
+                while len(in_flight) < self.window:
+                    # With nothing in flight, wait for the next host that is allowed to be fetched
+                    item = self.pending.get(block=not in_flight and len(self.pending) > 0)
+                    if item is None:
                         break
-                    if depth < self.max_depth:
-                        outlinks = future.result()
-                        for outlink in set(outlinks) - self.visited_urls:
-                            if self.fetched_pages < self.max_records:
-                                futures[executor.submit(self.crawl, outlink, depth + 1)] = (outlink, depth + 1)
+                    in_flight.add(executor.submit(self.crawl_task, *item))
+                self.metrics.set_gauge('in_flight', len(in_flight))
+                if not in_flight:
+                    break
+                # Wake up early when a delayed host becomes ready and the window has room for it
+                timeout = self.pending.ready_in() if len(in_flight) < self.window else None
+                done, in_flight = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    future.result()
+                self.frontier.set_counters(fetched_pages=self.fetched_pages)
+        self.frontier.set_counters(fetched_pages=self.fetched_pages)
+        if self.pending.dropped:
+            logging.info(f'Frontier was full, {self.pending.dropped} URLs dropped')
+        if self.robots:
+            logging.info(f'robots.txt disallowed {len(self.robots.disallowed)} URLs')
+
+    def run(self):
+        self.metrics.start(self.metrics_interval, self.metrics_port)
+        try:
+            self.crawl_all()
+        finally:
+            self.writer.close()
+            self.frontier.close()
+            if self.cache:
+                self.cache.close()
+            if self.robots:
+                self.robots.close()
+            self.metrics.stop()
+        logging.info(self.metrics.summary())
+        if self.cache:
+            logging.info(self.cache.summary())
+        logging.info(self.dns.summary())
+        logging.info(self.session.pool_stats.summary())
 
 if __name__ == '__main__':
-    crawler = Crawler(base_url='https://www.nytimes.com/', urls=['https://www.nytimes.com/'])
-    crawler.run()
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--frontier', default='frontier_nytimes.db', help='SQLite file that holds the crawl state')
+    parser.add_argument('--resume', action='store_true', help='Continue the crawl saved in --frontier')
+    parser.add_argument('--polite', action='store_true', help='Obey robots.txt and rate-limit each host')
+    parser.add_argument('--min-delay', type=float, default=1.0, help='Seconds between fetches to one host')
+    parser.add_argument('--max-per-host', type=int, default=2, help='Concurrent fetches to one host')
+    parser.add_argument('--pool-per-host', type=int, default=POOL_PER_HOST,
+                        help='Connections held open to one host, capped by --max-per-host with --polite')
+    parser.add_argument('--log-format', nargs='+', choices=['csv', 'parquet'], default=['csv'],
+                        help='Crawl log formats to write, parquet needs pyarrow')
+    parser.add_argument('--metrics-interval', type=float, default=10.0, help='Seconds between progress lines, 0 disables')
+    parser.add_argument('--metrics-port', type=int, help='Serve Prometheus metrics on this local port')
+    parser.add_argument('--verbose', action='store_true', help='Log every crawled URL')
+    parser.add_argument('--cache', help='SQLite HTTP cache for conditional re-crawls, kept between runs')
+    parser.add_argument('--max-body-mb', type=float, default=MAX_BODY_BYTES / 2 ** 20,
+                        help='Stop reading a response body after this many MB')
+    parser.add_argument('--no-dedup', action='store_true', help='Parse pages that copy one already crawled')
+    parser.add_argument('--same-site', action='store_true', help='Only queue URLs on the news site')
+    parser.add_argument('--exclude-path', nargs='+', default=[], help='Never queue URLs under these path prefixes')
+    parser.add_argument('--exclude-ext', nargs='+', default=[], help='Never queue URLs with these file extensions')
+    parser.add_argument('--exclude-pattern', nargs='+', default=[], help='Never queue URLs matching these regexes')
+    parser.add_argument('--report-interval', type=float, default=60.0,
+                        help='Seconds between snapshots of the crawl report, 0 only writes it at the end')
+    parser.add_argument('--profile', help='cProfile every crawler thread and save the merged stats here')
+    args = parser.parse_args()
+    if args.verbose:
+        logging.getLogger().setLevel(logging.DEBUG)
+    scope = Scope.for_site('https://www.nytimes.com/', exclude_paths=args.exclude_path,
+                           exclude_extensions=args.exclude_ext, exclude_patterns=args.exclude_pattern,
+                           follow_out_of_scope=not args.same_site)
+    crawler = Crawler(base_url='https://www.nytimes.com/', urls=['https://www.nytimes.com/'],
+                      frontier_path=args.frontier, resume=args.resume, polite=args.polite,
+                      min_delay=args.min_delay, max_per_host=args.max_per_host,
+                      pool_per_host=args.pool_per_host, log_formats=args.log_format,
+                      metrics_interval=args.metrics_interval, metrics_port=args.metrics_port,
+                      cache_path=args.cache, max_body_bytes=int(args.max_body_mb * 2 ** 20),
+                      dedup=not args.no_dedup, scope=scope,
+                      report_interval=args.report_interval)
+    if args.profile:
+        from profiling import ThreadProfiler, phase_times
+        with ThreadProfiler() as profiler:
+            crawler.run()
+        profiler.dump(args.profile)
+        logging.info(f'CPU seconds by phase: {phase_times(profiler.stats())}, profile saved to {args.profile}')
+    else:
+        crawler.run()
\ No newline at end of file
@@ -0,0 +1,218 @@
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# In-process crawl instrumentation: counters, latency histograms and gauges that any thread can
+# update, a reporter thread that logs a one-line summary every `interval` seconds, and an
+# optional /metrics endpoint in the Prometheus text format.
+
+# Upper bounds in seconds, the last bucket catches everything slower
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def timed_get(metrics, get, url, **kwargs):
+    # requests' elapsed stops once the headers are parsed, the body is read after that.
+    # On a new connection it includes the connect time as well.
+    start = time.perf_counter()
+    response = get(url, **kwargs)
+    first_byte = response.elapsed.total_seconds()
+    metrics.observe('ttfb_seconds', first_byte)
+    if kwargs.get('stream'):
+        # The body has not been read yet, StreamedBody in streaming.py records it
+        return response
+    metrics.observe('download_seconds', max(0.0, time.perf_counter() - start - first_byte))
+    metrics.inc('bytes_downloaded', len(response.content))
+    return response
+
+
+class Counter:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self.lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += seconds
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th observation, None before the first one
+        with self.lock:
+            counts, count = list(self.counts), self.count
+        if not count:
+            return None
+        rank = q * count
+        seen = 0
+        for index, bucket_count in enumerate(counts):
+            seen += bucket_count
+            if seen >= rank:
+                return self.buckets[index] if index < len(self.buckets) else float('inf')
+
+
+class Gauge:
+    # Either set() from the code that owns the value, or read through `fn` when reported
+    def __init__(self, fn=None):
+        self.fn = fn
+        self.current = 0
+
+    def set(self, value):
+        self.current = value
+
+    @property
+    def value(self):
+        return self.fn() if self.fn else self.current
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != '/metrics':
+            self.send_error(404)
+            return
+        body = self.server.metrics.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class CrawlMetrics:
+    def __init__(self, prefix='crawler'):
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.gauges = {}
+        self.started = time.monotonic()
+        self.last_report = (self.started, 0, 0)
+        self.stopped = threading.Event()
+        self.reporter = None
+        self.server = None
+
+    def counter(self, name):
+        with self.lock:
+            return self.counters.setdefault(name, Counter())
+
+    def histogram(self, name):
+        with self.lock:
+            return self.histograms.setdefault(name, Histogram())
+
+    def gauge(self, name, fn=None):
+        with self.lock:
+            gauge = self.gauges.setdefault(name, Gauge())
+            if fn is not None:
+                gauge.fn = fn
+            return gauge
+
+    def inc(self, name, amount=1):
+        self.counter(name).inc(amount)
+
+    def observe(self, name, seconds):
+        self.histogram(name).observe(seconds)
+
+    def set_gauge(self, name, value):
+        self.gauge(name).set(value)
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def items(self, table):
+        # Copy under the lock, another thread may add a metric while we report
+        with self.lock:
+            return sorted(table.items())
+
+    def value(self, name):
+        counter = self.counters.get(name)
+        return counter.value if counter else 0
+
+    def summary(self):
+        # Rates are over the time since the previous summary, not the whole crawl
+        now = time.monotonic()
+        pages, downloaded = self.value('pages_fetched'), self.value('bytes_downloaded')
+        last_time, last_pages, last_bytes = self.last_report
+        self.last_report = (now, pages, downloaded)
+        elapsed = max(now - last_time, 1e-9)
+        parts = [f'{pages} pages ({(pages - last_pages) / elapsed:.1f}/s)',
+                 f'{(downloaded - last_bytes) / elapsed / 2 ** 20:.2f} MB/s']
+        statuses = sorted((name[len('status_'):], counter.value) for name, counter in self.items(self.counters)
+                          if name.startswith('status_'))
+        if statuses:
+            parts.append(' '.join(f'{code}:{count}' for code, count in statuses))
+        for name, gauge in self.items(self.gauges):
+            parts.append(f'{name.replace("_", " ")} {gauge.value}')
+        for name, histogram in self.items(self.histograms):
+            if histogram.count:
+                p50, p99 = histogram.quantile(0.5), histogram.quantile(0.99)
+                parts.append(f'{name.replace("_seconds", "")} p50<={p50 * 1000:g}ms p99<={p99 * 1000:g}ms')
+        return ' | '.join(parts)
+
+    def render(self):
+        lines = []
+        for name, counter in self.items(self.counters):
+            lines.append(f'# TYPE {self.prefix}_{name}_total counter')
+            lines.append(f'{self.prefix}_{name}_total {counter.value}')
+        for name, gauge in self.items(self.gauges):
+            lines.append(f'# TYPE {self.prefix}_{name} gauge')
+            lines.append(f'{self.prefix}_{name} {gauge.value}')
+        for name, histogram in self.items(self.histograms):
+            full_name = f'{self.prefix}_{name}'
+            with histogram.lock:
+                counts, count, total = list(histogram.counts), histogram.count, histogram.total
+            lines.append(f'# TYPE {full_name} histogram')
+            cumulative = 0
+            for bound, bucket_count in zip(list(histogram.buckets) + ['+Inf'], counts):
+                cumulative += bucket_count
+                lines.append(f'{full_name}_bucket{{le="{bound}"}} {cumulative}')
+            lines.append(f'{full_name}_sum {total}')
+            lines.append(f'{full_name}_count {count}')
+        return '\n'.join(lines) + '\n'
+
+    def start(self, interval=10.0, port=None, host='127.0.0.1'):
+        if interval:
+            self.reporter = threading.Thread(target=self._report, args=(interval,), name='metrics', daemon=True)
+            self.reporter.start()
+        if port is not None:
+            self.server = ThreadingHTTPServer((host, port), MetricsHandler)
+            self.server.daemon_threads = True
+            self.server.metrics = self
+            threading.Thread(target=self.server.serve_forever, daemon=True).start()
+            logging.info(f'Serving crawl metrics on http://{host}:{self.server.server_address[1]}/metrics')
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        if self.reporter:
+            self.reporter.join()
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def _report(self, interval):
+        while not self.stopped.wait(interval):
+            logging.info(self.summary())
@@ -0,0 +1,263 @@
+import gzip
+import hashlib
+import multiprocessing
+import random
+import socket
+import sys
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Local stand-in for a news site so crawlers can be benchmarked without touching the network
+
+# Links to other hosts carry the server's port, which is only known once it is bound
+PORT_PLACEHOLDER = b'MOCK_PORT'
+
+
+def build_site(pages=1000, fanout=20, page_size=20000, size_sigma=0.0, seed=0, media=0, media_size=2 * 2 ** 20,
+               article_words=0, mirrors=0.0, hosts=0):
+    # Every page links to `fanout` random pages, page 0 is the front page.
+    # size_sigma > 0 draws page sizes from a lognormal around page_size instead of a fixed size.
+    # media > 0 adds that many video files of media_size bytes, each page links to one of them.
+    # article_words > 0 gives every page a paragraph of that many random words.
+    # mirrors > 0 also serves that share of the pages as an exact copy under ?print=1 and as an
+    # AMP copy with other markup and an ad slot under /amp/, links to those pages pick one at random.
+    # hosts > 0 spreads the pages over host-0.test .. host-{hosts - 1}.test, which only resolve
+    # through a FakeResolver, every host serves the whole site.
+    rng = random.Random(seed)
+    site = {}
+    clip = b'\0' * media_size
+    for clip_number in range(media):
+        site[f'/media/clip-{clip_number}.mp4'] = clip
+    mirrored = set(rng.sample(range(1, pages), int((pages - 1) * mirrors))) if mirrors else set()
+    vocabulary = [f'word{number}' for number in range(5000)]
+    for page in range(pages):
+        links = [rng.randrange(pages) for _ in range(fanout)]
+        body = ''.join(f'<li><a href="{page_variant(link, mirrored, rng, hosts)}">Story {link}</a></li>\n'
+                       for link in links)
+        if media:
+            body += f'<li><a href="/media/clip-{rng.randrange(media)}.mp4">Video</a></li>\n'
+        article = ' '.join(rng.choices(vocabulary, k=article_words))
+        size = int(page_size * rng.lognormvariate(0, size_sigma)) if size_sigma else page_size
+        padding = max(0, size - len(body) - len(article))
+        html = (f'<html><head><title>Page {page}</title></head><body><ul>\n{body}</ul>'
+                f'<p>{article}</p><p>{"x" * padding}</p></body></html>')
+        site[f'/section/page-{page}.html'] = html.encode('utf-8')
+        if page in mirrored:
+            site[f'/section/page-{page}.html?print=1'] = html.encode('utf-8')
+            amp = (f'<html amp><head><title>Page {page}</title><style amp-custom>li{{margin:0}}</style></head>'
+                   f'<body><div class="amp-story"><ul>\n{body}</ul><p>{article}</p><p>{"x" * padding}</p>'
+                   f'<aside>Advertisement</aside></div></body></html>')
+            site[f'/amp/section/page-{page}.html'] = amp.encode('utf-8')
+    site['/'] = site['/section/page-0.html']
+    return site
+
+
+def page_variant(page, mirrored, rng, hosts=0):
+    path = f'/section/page-{page}.html'
+    if page in mirrored:
+        path = rng.choice([path, f'{path}?print=1', f'/amp{path}'])
+    if hosts:
+        return f'http://host-{page % hosts}.test:{PORT_PLACEHOLDER.decode()}{path}'
+    return path
+
+
+class FakeResolver:
+    # socket.getaddrinfo stand-in for DNSCache (dns_cache.py): *.test names resolve to the mock
+    # site after `latency` seconds, any other name fails like an unknown host. address can be a
+    # list, for a host with several addresses.
+    def __init__(self, latency=0.0, address='127.0.0.1'):
+        self.latency = latency
+        self.address = address
+        self.lock = threading.Lock()
+        self.lookups = 0
+
+    def __call__(self, host, port, family=0, type=0, proto=0, flags=0):
+        with self.lock:
+            self.lookups += 1
+        time.sleep(self.latency)
+        if not host.endswith('.test'):
+            raise socket.gaierror(socket.EAI_NONAME, 'Name or service not known')
+        addresses = [self.address] if isinstance(self.address, str) else self.address
+        return [(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP, '', (address, port)) for address in addresses]
+
+
+class MockSiteHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = self.server.site.get(self.path)
+        content_type = 'video/mp4' if self.path.startswith('/media/') else 'text/html; charset=utf-8'
+        self.server.delay()
+        error = self.server.errors.get(self.path)
+        transient = self.server.transient_error(self.path)
+        if not self.server.allow_request():
+            # Stand-in for the throttling that shows up as 403 Forbidden in the NYT crawl report
+            self.send_response(403)
+            body = b'<html><body>Forbidden</body></html>'
+        elif transient:
+            self.send_response(transient)
+            if transient in (429, 503) and self.server.retry_after is not None:
+                self.send_header('Retry-After', str(self.server.retry_after))
+            body = f'<html><body>{self.responses[transient][0]}</body></html>'.encode('utf-8')
+        elif self.path == '/robots.txt' and self.server.robots_txt is not None:
+            self.send_response(200)
+            body = self.server.robots_txt.encode('utf-8')
+            content_type = 'text/plain'
+        elif body is None or error == 404:
+            self.send_response(404)
+            body = b'<html><body>Not Found</body></html>'
+        elif error:
+            self.send_response(error)
+            body = f'<html><body>{self.responses[error][0]}</body></html>'.encode('utf-8')
+        else:
+            # Validators for conditional re-crawls, a page changed in self.server.site gets a new ETag
+            etag = f'"{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+            if self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                body = b''
+            else:
+                self.send_response(200)
+                if (self.server.compress and content_type.startswith('text/html') and
+                        'gzip' in self.headers.get('Accept-Encoding', '')):
+                    body = self.server.compressed(self.path, body)
+                    self.send_header('Content-Encoding', 'gzip')
+            self.send_header('ETag', etag)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MockSiteServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, site, host='127.0.0.1', port=0, rate_limit=None, robots_txt=None, error_rates=None,
+                 latency=0.0, latency_jitter=0.0, seed=0, transient_rates=None, retry_after=None, stall_rate=0.0,
+                 stall_seconds=0.0, outage=None, compress=False):
+        super().__init__((host, port), MockSiteHandler)
+        self.site = site
+        self.robots_txt = robots_txt
+        # error_rates={403: 0.05, 500: 0.01} makes that share of pages always answer with that status,
+        # picked per page with a fixed seed so every crawler sees the same broken pages
+        rng = random.Random(seed)
+        self.errors = {}
+        for path in sorted(site):
+            draw = rng.random()
+            for status, rate in (error_rates or {}).items():
+                if draw < rate and path != '/':
+                    self.errors[path] = status
+                    break
+                draw -= rate
+        # Every response waits latency seconds plus up to latency_jitter more
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        # transient_rates={503: 0.1} fails that share of requests, drawn per request so a retry can
+        # succeed. During outage=(start, end), in seconds since the server started, every request
+        # gets a 503. retry_after is sent with 429s and 503s.
+        self.transient_rates = transient_rates or {}
+        self.retry_after = retry_after
+        self.outage = outage
+        self.started = time.monotonic()
+        # stall_rate of the responses hang for stall_seconds before anything is sent
+        self.stall_rate = stall_rate
+        self.stall_seconds = stall_seconds
+        # compress=True gzips pages for clients that accept it, each page once
+        self.compress = compress
+        self.gzipped = {}
+        # Requests per second allowed before answering 403
+        self.rate_limit = rate_limit
+        self.recent = deque()
+        self.rate_lock = threading.Lock()
+
+    def handle_error(self, request, client_address):
+        # Crawlers hang up on bodies they do not want, that is not worth a traceback
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def delay(self):
+        if self.latency or self.latency_jitter:
+            time.sleep(self.latency + random.random() * self.latency_jitter)
+        if self.stall_rate and random.random() < self.stall_rate:
+            time.sleep(self.stall_seconds)
+
+    def compressed(self, path, body):
+        if path not in self.gzipped:
+            self.gzipped[path] = gzip.compress(body, compresslevel=6)
+        return self.gzipped[path]
+
+    def transient_error(self, path):
+        if self.outage and self.outage[0] <= time.monotonic() - self.started < self.outage[1]:
+            return 503
+        if path == '/':
+            return None  # The seed page, so a crawl without retries still gets started
+        draw = random.random()
+        for status, rate in self.transient_rates.items():
+            if draw < rate:
+                return status
+            draw -= rate
+        return None
+
+    def allow_request(self):
+        if not self.rate_limit:
+            return True
+        now = time.monotonic()
+        with self.rate_lock:
+            while self.recent and self.recent[0] <= now - 1.0:
+                self.recent.popleft()
+            if len(self.recent) >= self.rate_limit:
+                return False
+            self.recent.append(now)
+            return True
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}/'
+
+
+def start_mock_site(rate_limit=None, robots_txt=None, error_rates=None, latency=0.0, latency_jitter=0.0,
+                    transient_rates=None, retry_after=None, stall_rate=0.0, stall_seconds=0.0, outage=None,
+                    compress=False, **site_options):
+    server = MockSiteServer(build_site(**site_options), rate_limit=rate_limit, robots_txt=robots_txt,
+                            error_rates=error_rates, latency=latency, latency_jitter=latency_jitter,
+                            seed=site_options.get('seed', 0), transient_rates=transient_rates,
+                            retry_after=retry_after, stall_rate=stall_rate, stall_seconds=stall_seconds,
+                            outage=outage, compress=compress)
+    if site_options.get('hosts'):
+        port = str(server.server_address[1]).encode('utf-8')
+        server.site = {path: body.replace(PORT_PLACEHOLDER, port) for path, body in server.site.items()}
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def serve_mock_site(connection, options):
+    server = start_mock_site(**options)
+    connection.send(server.base_url)
+    try:
+        connection.recv()  # Any message, or the parent going away, stops the server
+    except EOFError:
+        pass
+    server.shutdown()
+
+
+def start_mock_site_process(**options):
+    # The mock site in its own process, so a multi-process crawler is not competing with the
+    # server for this process's GIL. Returns the process, its URL and the connection that stops it.
+    context = multiprocessing.get_context('spawn')
+    parent, child = context.Pipe()
+    process = context.Process(target=serve_mock_site, args=(child, options), daemon=True)
+    process.start()
+    return process, parent.recv(), parent
+
+
+if __name__ == '__main__':
+    server = MockSiteServer(build_site(), port=8000)
+    print(f'Serving mock site on {server.base_url}')
+    server.serve_forever()
@@ -0,0 +1,241 @@
+import re
+import threading
+from array import array
+from seen_store import FingerprintSeenStore
+
+# Finds pages the crawl already has under another URL, such as the AMP, print and query string
+# copies of a story. Exact copies are caught by the body hash that StreamedBody computes anyway.
+# Copies that differ only in markup or a few words of boilerplate are caught by a SimHash of the
+# page text: the 64-bit fingerprints of similar texts differ in only a few bits. They are found
+# without comparing against every page. The fingerprint is split into max_distance + 1 bands,
+# and two fingerprints within max_distance bits agree exactly on at least one band. So a lookup
+# only compares against the pages bucketed under the same value of one of its bands.
+
+TAGS = re.compile(r'<(script|style)\b.*?</\1\s*>|<[^>]*>', re.IGNORECASE | re.DOTALL)
+# Only the first MAX_WORD characters of a word count, so a streamed page carries little over
+MAX_WORD = 64
+WORDS = re.compile(rf'(\w{{1,{MAX_WORD}}})\w*')
+TRAILING_WORD = re.compile(r'\w*\Z')
+BLOCK_OPEN = re.compile(r'<(script|style)\b', re.IGNORECASE)
+BLOCK_CLOSE = {name: re.compile(rf'</{name}\s*>', re.IGNORECASE) for name in ['script', 'style']}
+# Characters kept at the end of a chunk that may hold the start of a block's closing tag
+BLOCK_TAIL = 64
+# BIT_TABLES[b] maps every byte to its bit b, so bytes.translate() can count a bit in C
+BIT_TABLES = [bytes((value >> bit) & 1 for value in range(256)) for bit in range(8)]
+
+
+def page_words(html):
+    return WORDS.findall(TAGS.sub(' ', html).lower())
+
+
+def shingle_hashes(words, shingle_size):
+    return array('q', map(hash, zip(*(words[i:] for i in range(shingle_size)))))
+
+
+def add_bit_counts(counts, shingles):
+    # counts[b] += how many of the shingles have bit b set
+    digests = shingles.tobytes()
+    for byte in range(8):
+        column = digests[byte::8]
+        for bit in range(8):
+            counts[8 * byte + bit] += column.translate(BIT_TABLES[bit]).count(1)
+
+
+def majority_bits(counts, total):
+    # Set where more than half of the shingles have it set
+    fingerprint = 0
+    for position, count in enumerate(counts):
+        if 2 * count > total:
+            fingerprint |= 1 << position
+    return fingerprint
+
+
+def simhash(words, shingle_size=4):
+    # Each run of shingle_size words votes on every bit of the fingerprint with its own hash.
+    # hash() of a tuple of words is far cheaper than a hashlib digest per shingle, but it is salted
+    # per process, so fingerprints are only comparable within one crawl process.
+    if len(words) < shingle_size:
+        words = words + [''] * (shingle_size - len(words))
+    shingles = shingle_hashes(words, shingle_size)
+    counts = [0] * 64
+    add_bit_counts(counts, shingles)
+    return majority_bits(counts, len(shingles))
+
+
+def word_start(text, end):
+    # Where the word that text[:end] ends in starts, end when it does not end in a word
+    window = 64
+    while True:
+        start = max(0, end - window)
+        match = TRAILING_WORD.search(text, start, end)
+        if match.start() > start or start == 0:
+            return match.start()
+        window *= 4
+
+
+class StreamingSimHash:
+    # simhash(page_words(html)) over the text chunks of a page as they go past, so the page is
+    # never held in full. Only a few characters are carried over to the next chunk: the start of
+    # a word (at most MAX_WORD characters of it count) or of a tag name. While the chunks are in
+    # a tag or a script or style block, they are skipped until it ends, so unlike page_words()
+    # a tag or block the page never closes hides the rest of the page. The last
+    # shingle_size - 1 words are kept, so shingles across chunk boundaries are counted too.
+    def __init__(self, shingle_size=4):
+        self.shingle_size = shingle_size
+        self.carry = ''
+        self.block = None  # 'script' or 'style' while in one
+        self.in_tag = False
+        self.tail = []
+        self.word_count = 0
+        self.shingle_count = 0
+        self.counts = [0] * 64
+
+    def update(self, text):
+        text = self.carry + text
+        self.carry = ''
+        start = self.resume(text)
+        if start is not None:
+            self.add_words(page_words(text[start:self.complete_prefix(text, start)]))
+
+    def resume(self, text):
+        # Where the text leaves the tag or block the last chunk ended in, None while still in it
+        if self.block is not None:
+            closing = BLOCK_CLOSE[self.block].search(text)
+            if closing is None:
+                self.carry = text[-BLOCK_TAIL:]  # Could be the start of the closing tag
+                return None
+            self.block = None
+            return closing.end()
+        if self.in_tag:
+            end = text.find('>')
+            if end < 0:
+                return None
+            self.in_tag = False
+            return end + 1
+        return 0
+
+    def complete_prefix(self, text, position):
+        # End of the part of text from position that no tag, block or word continues past.
+        # Whatever continues past it sets the state or the carry for the next chunk.
+        while True:
+            opening = BLOCK_OPEN.search(text, position)
+            if opening is None:
+                break
+            tag = text.find('<', max(position, text.rfind('>', position, opening.start()) + 1), opening.start())
+            if tag >= 0:
+                # A '<' with no '>' before the opening, the tag it starts swallows the opening
+                end = text.find('>', opening.start())
+                if end < 0:
+                    return self.pending_tag(text, tag)
+                position = end + 1
+                continue
+            if opening.end() == len(text):
+                self.carry = text[opening.start():]  # '<script' may still become '<scripts'
+                return opening.start()
+            closing = BLOCK_CLOSE[opening.group(1).lower()].search(text, opening.end())
+            if closing is None:
+                self.block = opening.group(1).lower()
+                self.carry = text[max(opening.end(), len(text) - BLOCK_TAIL):]
+                return opening.start()
+            position = closing.end()
+        tag = text.find('<', max(position, text.rfind('>', position) + 1))
+        if tag >= 0:
+            return self.pending_tag(text, tag)
+        start = word_start(text, len(text))
+        self.carry = text[start:start + MAX_WORD]
+        return start
+
+    def pending_tag(self, text, tag):
+        # The text ends in a tag that starts at tag
+        if len(text) - tag < BLOCK_TAIL:
+            self.carry = text[tag:]  # Too short to tell whether it opens a block
+        else:
+            self.in_tag = True
+        return tag
+
+    def feed(self, chunks):
+        # Passes the chunks on, to the link extractor
+        for text in chunks:
+            self.update(text)
+            yield text
+
+    def add_words(self, words):
+        self.word_count += len(words)
+        words = self.tail + words
+        if len(words) >= self.shingle_size:
+            shingles = shingle_hashes(words, self.shingle_size)
+            add_bit_counts(self.counts, shingles)
+            self.shingle_count += len(shingles)
+        self.tail = words[-(self.shingle_size - 1):] if self.shingle_size > 1 else []
+
+    def digest(self):
+        if self.carry and self.block is None:
+            self.add_words(page_words(self.carry))
+        self.carry = ''
+        if self.word_count < self.shingle_size:
+            return simhash(self.tail, self.shingle_size)  # Padded, like simhash() of a short page
+        return majority_bits(self.counts, self.shingle_count)
+
+
+def body_fingerprint(content_hash):
+    # 64 bits of the blake2b body hash, in the seen_store convention where 0 marks an empty slot
+    return int(content_hash[:16], 16) or 1
+
+
+class NearDuplicateIndex:
+    # About 8 bytes per page for the exact hashes plus 8 bytes per page and band for the SimHashes,
+    # with max_distance=3 that is 4 bands of 16 bits each. At 1M pages a lookup compares against
+    # about 4 * 1M / 2 ** 16 = 60 fingerprints.
+    def __init__(self, max_distance=3, shingle_size=4):
+        self.max_distance = max_distance
+        self.shingle_size = shingle_size
+        self.band_count = max_distance + 1
+        self.band_bits = 64 // self.band_count
+        self.band_mask = (1 << self.band_bits) - 1
+        self.exact = FingerprintSeenStore()
+        self.bands = [{} for _ in range(self.band_count)]
+        self.lock = threading.Lock()
+        self.count = 0
+
+    def band_keys(self, fingerprint):
+        return [(fingerprint >> (band * self.band_bits)) & self.band_mask for band in range(self.band_count)]
+
+    def find(self, fingerprint, keys):
+        for bucket, key in zip(self.bands, keys):
+            for other in bucket.get(key, ()):
+                if (fingerprint ^ other).bit_count() <= self.max_distance:
+                    return other
+        return None
+
+    def check(self, content_hash, html):
+        # 'exact', 'near' or None for a page not seen before, which is added to the index. html is
+        # the page text or its text chunks. Only the text is compared, so the same story in a
+        # different template is 'near'.
+        hasher = StreamingSimHash(self.shingle_size)
+        for text in [html] if isinstance(html, str) else html:
+            hasher.update(text)
+        return self.check_streamed(content_hash, hasher)
+
+    def check_streamed(self, content_hash, hasher):
+        # Same as check() for a StreamingSimHash that has already seen the whole page
+        if not self.exact.add_fingerprint(body_fingerprint(content_hash)):
+            return 'exact'
+        return self.check_simhash(hasher.digest())
+
+    def check_simhash(self, fingerprint):
+        keys = self.band_keys(fingerprint)
+        with self.lock:
+            if self.find(fingerprint, keys) is not None:
+                return 'near'
+            for bucket, key in zip(self.bands, keys):
+                bucket.setdefault(key, array('Q')).append(fingerprint)
+            self.count += 1
+        return None
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def nbytes(self):
+        # Without the per-bucket array overhead, up to 2 ** band_bits buckets per band
+        return self.exact.nbytes + 8 * self.count * self.band_count
@@ -0,0 +1,121 @@
+import sqlite3
+import threading
+import time
+from seen_store import url_fingerprint
+
+# Crawl state that has to survive a crash, in the spirit of crawler4j's frontier.Frontier and
+# DocIDServer: URLs scheduled but not finished (with their depth), fingerprints of URLs already
+# crawled, and the crawl counters. MemoryFrontier keeps the same interface without the disk.
+#
+# before_commit runs ahead of every commit. The Crawler sets it to flush its logs, so a page the
+# frontier records as crawled always has its rows on disk. Pages that were in flight when the
+# crawl stopped are still pending and crawled again on --resume, and any of their rows that were
+# already written appear twice: a resumed crawl logs those pages at least once, never zero times.
+
+
+class MemoryFrontier:
+    # Nothing survives the process, so there is nothing to record: the bounded heap already holds
+    # the pending URLs and the seen store the crawled ones. Only the counters are kept.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.before_commit = None
+
+    def schedule(self, url, depth):
+        pass
+
+    def complete(self, url):
+        pass
+
+    def set_counters(self, **counters):
+        with self.lock:
+            self.counters.update(counters)
+
+    def pending_urls(self):
+        return []
+
+    def seen_fingerprints(self):
+        return []
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def to_signed(fingerprint):
+    # SQLite integers are signed 64-bit
+    return fingerprint - (1 << 64) if fingerprint >= 1 << 63 else fingerprint
+
+
+class PersistentFrontier:
+    def __init__(self, path, resume=False, batch_size=1000, commit_interval=2.0):
+        self.lock = threading.Lock()
+        self.batch_size = batch_size
+        self.commit_interval = commit_interval
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS pending (url TEXT PRIMARY KEY, depth INTEGER NOT NULL)')
+        self.db.execute('CREATE TABLE IF NOT EXISTS seen (fingerprint INTEGER PRIMARY KEY) WITHOUT ROWID')
+        self.db.execute('CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+        if not resume:
+            for table in ['pending', 'seen', 'counters']:
+                self.db.execute(f'DELETE FROM {table}')
+        self.db.commit()
+        self.counters = dict(self.db.execute('SELECT name, value FROM counters'))
+        self.uncommitted = 0
+        self.last_commit = time.monotonic()
+        self.before_commit = None
+
+    def schedule(self, url, depth):
+        with self.lock:
+            self.db.execute('INSERT OR IGNORE INTO pending (url, depth) VALUES (?, ?)', (url, depth))
+            self._maybe_commit()
+
+    def complete(self, url):
+        with self.lock:
+            self.db.execute('DELETE FROM pending WHERE url = ?', (url,))
+            self.db.execute('INSERT OR IGNORE INTO seen (fingerprint) VALUES (?)',
+                            (to_signed(url_fingerprint(url)),))
+            self._maybe_commit()
+
+    def set_counters(self, **counters):
+        # Written with the next batch commit
+        with self.lock:
+            self.counters.update(counters)
+
+    def pending_urls(self):
+        with self.lock:
+            return self.db.execute('SELECT url, depth FROM pending ORDER BY depth').fetchall()
+
+    def seen_fingerprints(self):
+        with self.lock:
+            return [fingerprint % (1 << 64) for (fingerprint,) in self.db.execute('SELECT fingerprint FROM seen')]
+
+    def _maybe_commit(self):
+        self.uncommitted += 1
+        if self.uncommitted >= self.batch_size or time.monotonic() - self.last_commit >= self.commit_interval:
+            self._commit()
+
+    def _commit(self):
+        if self.before_commit is not None:
+            self.before_commit()
+        self.db.executemany('INSERT OR REPLACE INTO counters (name, value) VALUES (?, ?)', self.counters.items())
+        self.db.commit()
+        self.uncommitted = 0
+        self.last_commit = time.monotonic()
+
+    def commit(self):
+        with self.lock:
+            self._commit()
+
+    def close(self):
+        with self.lock:
+            self._commit()
+            self.db.close()
+
+
+def open_frontier(path=None, resume=False, **options):
+    return PersistentFrontier(path, resume, **options) if path else MemoryFrontier()
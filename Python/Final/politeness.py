@@ -0,0 +1,174 @@
+import heapq
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+from urllib.robotparser import RobotFileParser
+from frontier import BoundedFrontier, depth_priority
+
+# Politeness in the spirit of crawler4j's robotstxt.RobotstxtServer: robots.txt is fetched once
+# per host and cached, and the frontier only hands out URLs for hosts that may be fetched now.
+# A host's robots.txt is fetched in the background when its first URL is queued, so queueing
+# never waits on the network. The URL is checked again when it is taken off the frontier.
+
+
+def host_of(url):
+    return urlsplit(url).netloc.lower()
+
+
+class RobotsCache:
+    def __init__(self, session, user_agent='*', ttl=24 * 3600, timeout=10, prefetch_workers=4):
+        self.session = session
+        self.user_agent = user_agent
+        self.ttl = ttl
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.host_locks = {}
+        self.rules = {}
+        self.prefetching = set()
+        self.executor = ThreadPoolExecutor(max_workers=prefetch_workers, thread_name_prefix='robots')
+        self.disallowed = set()  # URLs, however often each one is checked
+
+    def fetch(self, scheme, host):
+        parser = RobotFileParser(f'{scheme}://{host}/robots.txt')
+        try:
+            response = self.session.get(parser.url, timeout=self.timeout)
+            if response.status_code in (401, 403):
+                parser.disallow_all = True
+            elif response.status_code >= 400:
+                parser.allow_all = True
+            else:
+                parser.parse(response.text.splitlines())
+        except Exception as e:
+            # Same as crawler4j, a robots.txt that cannot be fetched allows everything
+            logging.debug(f'Could not fetch robots.txt for {host}: {e}')
+            parser.allow_all = True
+        return parser
+
+    def parser_for(self, url):
+        parts = urlsplit(url)
+        host = parts.netloc.lower()
+        with self.lock:
+            host_lock = self.host_locks.setdefault(host, threading.Lock())
+        # One fetch per host even when many workers ask at once
+        with host_lock:
+            cached = self.rules.get(host)
+            if cached and cached[0] > time.monotonic():
+                return cached[1]
+            parser = self.fetch(parts.scheme, host)
+            self.rules[host] = (time.monotonic() + self.ttl, parser)
+            return parser
+
+    def allowed(self, url):
+        # Fetches robots.txt when it is not cached, or waits for the fetch already under way
+        return self.check(self.parser_for(url), url)
+
+    def cached_allowed(self, url):
+        # None when the host's robots.txt is not cached yet, see prefetch()
+        cached = self.rules.get(host_of(url))
+        if not cached or cached[0] <= time.monotonic():
+            return None
+        return self.check(cached[1], url)
+
+    def check(self, parser, url):
+        if parser.can_fetch(self.user_agent, url):
+            return True
+        with self.lock:
+            self.disallowed.add(url)
+        return False
+
+    def prefetch(self, url):
+        # Fetches the host's robots.txt on the prefetch pool, once per host at a time
+        host = host_of(url)
+        with self.lock:
+            if host in self.prefetching:
+                return
+            self.prefetching.add(host)
+        self.executor.submit(self._prefetch, url, host)
+
+    def _prefetch(self, url, host):
+        try:
+            self.parser_for(url)
+        finally:
+            with self.lock:
+                self.prefetching.discard(host)
+
+    def close(self):
+        # Prefetches still queued are dropped, the crawl that wanted them is over
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def crawl_delay(self, host):
+        # Only looks at what is cached, never fetches
+        cached = self.rules.get(host)
+        if not cached:
+            return None
+        delay = cached[1].crawl_delay(self.user_agent)
+        return float(delay) if delay is not None else None
+
+
+class HostScheduler(BoundedFrontier):
+    # Bounded frontier that keeps one priority heap per host plus a heap of (ready time, host).
+    # get() hands out the best URL of the first host whose ready time has passed and which has
+    # fewer than max_per_host fetches in flight; a host becomes ready again min_delay seconds
+    # (or its robots.txt Crawl-delay, if larger) after its last fetch started.
+    def __init__(self, capacity=100_000, priority=depth_priority, min_delay=1.0, max_per_host=2, robots=None):
+        super().__init__(capacity, priority)
+        self.min_delay = min_delay
+        self.max_per_host = max_per_host
+        self.robots = robots
+        self.hosts = {}
+        self.ready = []
+        self.scheduled = set()
+        self.next_time = {}
+        self.active = {}
+
+    def delay(self, host):
+        crawl_delay = self.robots.crawl_delay(host) if self.robots else None
+        return max(self.min_delay, crawl_delay or 0.0)
+
+    def _schedule(self, host):
+        if host in self.scheduled or host not in self.hosts or self.active.get(host, 0) >= self.max_per_host:
+            return
+        heapq.heappush(self.ready, (self.next_time.get(host, 0.0), host))
+        self.scheduled.add(host)
+
+    def _push(self, entry):
+        host = host_of(entry[2])
+        heapq.heappush(self.hosts.setdefault(host, []), entry)
+        self._schedule(host)
+
+    def _pop(self):
+        if not self.ready:
+            return None, None
+        now = time.monotonic()
+        ready_time, host = self.ready[0]
+        if ready_time > now:
+            return None, ready_time - now
+        heapq.heappop(self.ready)
+        self.scheduled.discard(host)
+        queue = self.hosts[host]
+        entry = heapq.heappop(queue)
+        if not queue:
+            del self.hosts[host]
+        self.active[host] = self.active.get(host, 0) + 1
+        self.next_time[host] = now + self.delay(host)
+        self._schedule(host)
+        return entry, None
+
+    def release(self, url):
+        host = host_of(url)
+        with self.lock:
+            self.active[host] -= 1
+            if not self.active[host]:
+                del self.active[host]
+            self._schedule(host)
+            self.not_empty.notify()
+
+    def ready_in(self):
+        with self.lock:
+            delayed_in = self._release_delayed()
+            if not self.ready:
+                return delayed_in
+            ready_in = max(0.0, self.ready[0][0] - time.monotonic())
+            return ready_in if delayed_in is None else min(ready_in, delayed_in)
@@ -0,0 +1,153 @@
+import bisect
+import cProfile
+import pstats
+import threading
+import time
+import requests
+
+# Hooks for finding out where a crawl spends its time. ThreadProfiler runs cProfile in every
+# thread started while it is active (cProfile alone only sees the thread that enabled it) and
+# measures CPU time, so threads blocked on the network cost nothing. FetchTimer wraps
+# requests.Session.send, which every crawler goes through, to record each fetch's latency.
+
+# Phase -> (file name, function name) entry points, a phase's CPU time is the cumulative time
+# of its entry points, less the time spent in another phase's entry points under them. The link
+# extractors pull the body off the connection as they parse it, so decoding runs under parsing.
+# Whatever is left over is reported as 'other'.
+PHASES = {
+    # Session.request rather than send, so proxy/env lookups and request preparation count too
+    'fetch': [('requests/sessions.py', 'request'), ('aiohttp/client.py', '_request')],
+    # Reading, decompressing and decoding the body chunk by chunk, see streaming.py
+    'decode': [('streaming.py', '__iter__'), ('async_crawler.py', 'read_body')],
+    'parse': [('link_extractor.py', 'htmlparser_hrefs'), ('link_extractor.py', 'lxml_hrefs'),
+              ('canonicalizer.py', '_canonicalize')],
+    'csv_io': [('csv_writer.py', '_drain'), ('crawl.py', 'write_rows'), ('crawl.py', 'categorize_urls')],
+}
+
+
+class ThreadProfiler:
+    def __init__(self, timer=time.thread_time):
+        self.timer = timer
+        self.profiles = []
+        self.lock = threading.Lock()
+        self.original_run = None
+
+    def new_profile(self):
+        profile = cProfile.Profile(self.timer)
+        with self.lock:
+            self.profiles.append(profile)
+        return profile
+
+    def __enter__(self):
+        self.original_run = original_run = threading.Thread.run
+        new_profile = self.new_profile
+
+        def profiled_run(thread):
+            profile = new_profile()
+            profile.enable()
+            try:
+                original_run(thread)
+            finally:
+                profile.disable()
+
+        threading.Thread.run = profiled_run
+        self.main = self.new_profile()
+        self.main.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.main.disable()
+        threading.Thread.run = self.original_run
+
+    def stats(self):
+        # Merged over every thread; a thread still running has its profile so far
+        with self.lock:
+            profiles = list(self.profiles)
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            try:
+                stats.add(profile)
+            except TypeError:
+                pass  # Nothing recorded in that thread
+        return stats
+
+    def dump(self, path):
+        self.stats().dump_stats(path)
+
+
+def is_entry_point(function, entry_points):
+    filename, _, name = function
+    return any(filename.replace('\\', '/').endswith(file) and name == entry for file, entry in entry_points)
+
+
+def share_under(stats, function, entry_points, shares):
+    # Share of a function's cumulative time spent under one of the entry points, split over its
+    # callers by the time each call site took. A call cycle counts as not under them.
+    if function in shares:
+        return shares[function]
+    if is_entry_point(function, entry_points):
+        shares[function] = 1.0
+        return 1.0
+    shares[function] = 0.0
+    _, _, _, cumulative, callers = stats.stats[function]
+    share = 0.0
+    if cumulative > 0:
+        for caller, (_, _, _, caller_cumulative) in callers.items():
+            if caller in stats.stats:
+                share += caller_cumulative / cumulative * share_under(stats, caller, entry_points, shares)
+    shares[function] = min(share, 1.0)
+    return shares[function]
+
+
+def phase_times(stats):
+    # CPU seconds per phase plus 'other' and 'total'
+    entries = {phase: [function for function in stats.stats if is_entry_point(function, entry_points)]
+               for phase, entry_points in PHASES.items()}
+    total = sum(own_time for _, _, own_time, _, _ in stats.stats.values())
+    times = {}
+    for phase, entry_points in PHASES.items():
+        times[phase] = sum(stats.stats[function][3] for function in entries[phase])
+        shares = {}
+        for other in PHASES:
+            if other != phase:
+                times[phase] -= sum(stats.stats[function][3] * share_under(stats, function, entry_points, shares)
+                                    for function in entries[other])
+        times[phase] = max(0.0, times[phase])
+    times['other'] = max(0.0, total - sum(times.values()))
+    times['total'] = total
+    return {phase: round(seconds, 3) for phase, seconds in times.items()}
+
+
+class FetchTimer:
+    # Wall-clock latency of each Session.send, headers and body, for requests based crawlers
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.original_send = None
+
+    def __enter__(self):
+        self.original_send = original_send = requests.Session.send
+        timer = self
+
+        def timed_send(session, request, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original_send(session, request, **kwargs)
+            finally:
+                timer.record(time.perf_counter() - start)
+
+        requests.Session.send = timed_send
+        return self
+
+    def __exit__(self, *exc_info):
+        requests.Session.send = self.original_send
+
+    def record(self, seconds):
+        with self.lock:
+            bisect.insort(self.latencies, seconds)
+
+    def quantile(self, q):
+        with self.lock:
+            if not self.latencies:
+                return None
+            return self.latencies[min(len(self.latencies) - 1, int(q * len(self.latencies)))]
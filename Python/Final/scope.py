@@ -0,0 +1,102 @@
+import re
+from urllib.parse import urlsplit
+
+# Which URLs a crawl is about. Include and exclude rules (host suffixes, path prefixes, regexes
+# and file extensions) are compiled once into a few combined regexes, so a URL is classified
+# without parsing it. A URL is BLOCKED when it matches an exclude rule or is deeper than
+# max_depth, IN_SCOPE when it matches the include rules and OUT_OF_SCOPE otherwise. Out-of-scope
+# URLs are still followed unless follow_out_of_scope is False, like Crawler did before. The urls
+# CSV labels a URL OK when it matches the include rules, whether or not it is blocked, so OK keeps
+# meaning "on the news site".
+
+IN_SCOPE, OUT_OF_SCOPE, BLOCKED = 'in_scope', 'out_of_scope', 'blocked'
+
+# Scheme and optional user info up to the host
+AUTHORITY = r'[a-zA-Z][a-zA-Z0-9+.-]*://(?:[^/?#@]*@)?'
+
+
+def host_pattern(suffixes):
+    # The host itself or any subdomain of it, with any port
+    names = '|'.join(re.escape(suffix.lower().lstrip('.')) for suffix in suffixes)
+    return rf'(?:[^/?#:@]*\.)?(?:{names})(?::\d*)?(?=[/?#]|$)'
+
+
+def path_pattern(prefixes):
+    return '(?:' + '|'.join(re.escape(prefix) for prefix in prefixes) + ')'
+
+
+def extension_lookahead(extensions):
+    # The last path segment ends in one of the extensions
+    names = '|'.join(re.escape(extension.lower().lstrip('.')) for extension in extensions)
+    return rf'(?=[^?#]*\.(?:{names})(?:[?#]|$))'
+
+
+class RuleSet:
+    # The host, path and extension rules are one regex matched at the start of the URL, the free
+    # form regexes are another one searched anywhere in it. In a single regex the anchored rules
+    # would be retried at every position of the URL, which made classify() about twice as slow.
+    def __init__(self, rules, patterns):
+        self.rules = re.compile(rules, re.IGNORECASE).match if rules else None
+        self.patterns = re.compile('|'.join(f'(?:{pattern})' for pattern in patterns)).search if patterns else None
+
+    def matches(self, url):
+        return (self.rules is not None and self.rules(url) is not None or
+                self.patterns is not None and self.patterns(url) is not None)
+
+
+def include_rules(hosts=(), paths=(), patterns=(), extensions=()):
+    # A URL matches when its host and path prefix and extension rules all match (an empty list
+    # matches anything), or when any of the regexes matches. None when there are no rules at all.
+    rules = None
+    if hosts or paths or extensions:
+        rules = AUTHORITY + (host_pattern(hosts) if hosts else '[^/?#]*')
+        if paths:
+            rules += path_pattern(paths)
+        elif extensions:
+            rules += '(?=/)'
+        if extensions:
+            rules += extension_lookahead(extensions)
+    return RuleSet(rules, patterns) if rules or patterns else None
+
+
+def exclude_rules(hosts=(), paths=(), patterns=(), extensions=()):
+    # Any one exclude rule is enough
+    alternatives = []
+    if hosts:
+        alternatives.append(host_pattern(hosts))
+    if paths:
+        alternatives.append(f'[^/?#]*{path_pattern(paths)}')
+    if extensions:
+        alternatives.append(f'[^/?#]*/{extension_lookahead(extensions)}')
+    rules = f'{AUTHORITY}(?:{"|".join(alternatives)})' if alternatives else None
+    return RuleSet(rules, patterns) if rules or patterns else None
+
+
+class Scope:
+    def __init__(self, hosts=(), paths=(), patterns=(), extensions=(), exclude_hosts=(), exclude_paths=(),
+                 exclude_patterns=(), exclude_extensions=(), max_depth=None, follow_out_of_scope=True):
+        self.include = include_rules(hosts, paths, patterns, extensions)
+        self.exclude = exclude_rules(exclude_hosts, exclude_paths, exclude_patterns, exclude_extensions)
+        self.max_depth = max_depth
+        self.follow_out_of_scope = follow_out_of_scope
+
+    @classmethod
+    def for_site(cls, base_url, **rules):
+        # The base URL's host and its subdomains are in scope
+        return cls(hosts=[urlsplit(base_url).hostname], **rules)
+
+    def classify(self, url, depth=None):
+        if depth is not None and self.max_depth is not None and depth > self.max_depth:
+            return BLOCKED
+        if self.exclude is not None and self.exclude.matches(url):
+            return BLOCKED
+        return IN_SCOPE if self.include is None or self.include.matches(url) else OUT_OF_SCOPE
+
+    def admit(self, url, depth=None):
+        # Whether the URL may enter the frontier
+        scope = self.classify(url, depth)
+        return scope == IN_SCOPE or scope == OUT_OF_SCOPE and self.follow_out_of_scope
+
+    def label(self, url):
+        # OK / N_OK for the urls CSV
+        return 'OK' if self.include is None or self.include.matches(url) else 'N_OK'
@@ -0,0 +1,121 @@
+import hashlib
+import math
+import threading
+from array import array
+
+
+def url_fingerprint(url):
+    # 64-bit fingerprint, 0 is reserved to mark empty slots
+    return int.from_bytes(hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest(), 'little') or 1
+
+
+class FingerprintSeenStore:
+    # Exact mode: open-addressing hash table of 64-bit URL fingerprints packed in an array,
+    # about 8 bytes per slot instead of a full URL string plus set entry per URL
+    def __init__(self, initial_capacity=1 << 16, max_load=0.7):
+        capacity = 1 << max(4, (initial_capacity - 1).bit_length())
+        self.lock = threading.Lock()
+        self.slots = array('Q', bytes(8 * capacity))
+        self.mask = capacity - 1
+        self.max_load = max_load
+        self.count = 0
+
+    def _probe(self, fingerprint):
+        slots, mask = self.slots, self.mask
+        index = fingerprint & mask
+        while True:
+            value = slots[index]
+            if value == 0 or value == fingerprint:
+                return index
+            index = (index + 1) & mask
+
+    def _resize(self):
+        old_slots = self.slots
+        self.slots = array('Q', bytes(16 * len(old_slots)))
+        self.mask = len(self.slots) - 1
+        for fingerprint in old_slots:
+            if fingerprint:
+                self.slots[self._probe(fingerprint)] = fingerprint
+
+    def add_fingerprint(self, fingerprint):
+        with self.lock:
+            index = self._probe(fingerprint)
+            if self.slots[index] == fingerprint:
+                return False
+            self.slots[index] = fingerprint
+            self.count += 1
+            if self.count > self.max_load * len(self.slots):
+                self._resize()
+            return True
+
+    def add_if_absent(self, url):
+        # Check and insert under one lock, returns True only for the first caller
+        return self.add_fingerprint(url_fingerprint(url))
+
+    def has_fingerprint(self, fingerprint):
+        with self.lock:
+            return self.slots[self._probe(fingerprint)] == fingerprint
+
+    def __contains__(self, url):
+        return self.has_fingerprint(url_fingerprint(url))
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        # Yields fingerprints, not URLs
+        with self.lock:
+            return iter([fingerprint for fingerprint in self.slots if fingerprint])
+
+    @property
+    def nbytes(self):
+        return self.slots.itemsize * len(self.slots)
+
+
+class BloomSeenStore:
+    # Probabilistic mode: a URL that was never added is reported as seen with probability
+    # error_rate once `capacity` URLs are in, so it can skip a page but never fetch one twice
+    def __init__(self, capacity=10_000_000, error_rate=0.001):
+        self.num_bits = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.lock = threading.Lock()
+        self.count = 0
+
+    def _positions(self, fingerprint):
+        # Double hashing off the 64-bit fingerprint, so a persisted fingerprint can be re-added
+        second = ((fingerprint ^ (fingerprint >> 31)) * 0xBF58476D1CE4E5B9 & 0xFFFFFFFFFFFFFFFF) | 1
+        return [(fingerprint + i * second) % self.num_bits for i in range(self.num_hashes)]
+
+    def add_fingerprint(self, fingerprint):
+        positions = self._positions(fingerprint)
+        bits = self.bits
+        with self.lock:
+            if all(bits[p >> 3] & (1 << (p & 7)) for p in positions):
+                return False
+            for p in positions:
+                bits[p >> 3] |= 1 << (p & 7)
+            self.count += 1
+            return True
+
+    def add_if_absent(self, url):
+        return self.add_fingerprint(url_fingerprint(url))
+
+    def __contains__(self, url):
+        bits = self.bits
+        return all(bits[p >> 3] & (1 << (p & 7)) for p in self._positions(url_fingerprint(url)))
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def nbytes(self):
+        return len(self.bits)
+
+
+def make_seen_store(mode='exact', **options):
+    if mode == 'exact':
+        return FingerprintSeenStore(**options)
+    if mode == 'bloom':
+        return BloomSeenStore(**options)
+    raise ValueError(f'Unknown seen store mode: {mode}')
@@ -0,0 +1,238 @@
+import argparse
+import logging
+import math
+import multiprocessing
+import os
+import queue
+import shutil
+import threading
+import time
+from urllib.parse import urlparse
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from canonicalizer import URLCanonicalizer
+from crawl_report import CrawlReport
+from main_code import Crawler
+from seen_store import url_fingerprint
+
+# Multi-process crawl. Each of `shards` worker processes owns the URLs whose fingerprint maps to
+# it: its own frontier, visited set, session and thread pool, so the GIL is no longer shared.
+# Outlinks owned by another shard are batched and sent to that shard's inbox queue. A shared
+# count of outstanding URLs (in an inbox, in a frontier or being crawled, in any shard) tells
+# every shard when the crawl is over. Each shard writes its own CSVs, merged at the end.
+
+
+def shard_of(url, shards):
+    return url_fingerprint(url) % shards
+
+
+class ShardCrawler(Crawler):
+    def __init__(self, index, shards, inboxes, outstanding, base_url, batch_size=500, flush_interval=0.05,
+                 **options):
+        self.index = index
+        self.shards = shards
+        self.inboxes = inboxes
+        self.outstanding = outstanding
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.outboxes = [[] for _ in range(shards)]
+        self.outbox_lock = threading.Lock()
+        self.accept_lock = threading.Lock()
+        self.routed = 0
+        self.received = 0
+        self.done = threading.Event()
+        # Seeds come through the inbox like every other URL
+        super().__init__(base_url, [], **options)
+
+    def output_path(self, name):
+        return shard_path(super().output_path(name), self.index)
+
+    def report_path(self):
+        return None  # Shard reports are merged and written by ShardedCrawl
+
+    def add_outstanding(self, count):
+        if count:
+            with self.outstanding.get_lock():
+                self.outstanding.value += count
+
+    def accept(self, urls):
+        # (url, depth) pairs owned by this shard, returns how many entered the frontier. Only this
+        # method puts, so under the lock a put cannot hit a URL that is already queued.
+        accepted = 0
+        with self.accept_lock:
+            for url, depth in urls:
+                if url in self.visited_urls or url in self.pending.queued or not self.admit(url, depth):
+                    continue
+                if self.pending.put(url, depth, block=False):
+                    self.dns.prefetch(url)
+                    accepted += 1
+        return accepted
+
+    def receive(self):
+        inbox = self.inboxes[self.index]
+        while not self.done.is_set():
+            try:
+                batch = inbox.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            self.received += len(batch)
+            # The sender counted the whole batch, give back what was a duplicate or did not fit
+            self.add_outstanding(self.accept(batch) - len(batch))
+
+    def crawl_task(self, url, depth):
+        try:
+            super().crawl_task(url, depth)
+        finally:
+            self.add_outstanding(-1)
+
+    def defer(self, url, depth, retry_in):
+        # Back in this shard's frontier, so still outstanding after crawl_task gives it back
+        self.add_outstanding(1)
+        super().defer(url, depth, retry_in)
+
+    def finish(self, url, depth, outlinks):
+        if outlinks is None or depth >= self.max_depth:
+            return
+        local, remote = [], {}
+        for outlink in set(outlinks):
+            shard = shard_of(outlink, self.shards)
+            if shard == self.index:
+                local.append((outlink, depth + 1))
+            else:
+                remote.setdefault(shard, []).append((outlink, depth + 1))
+        # Counted before crawl_task gives back this page, so the total cannot touch 0 in between
+        self.add_outstanding(self.accept(local) + sum(len(batch) for batch in remote.values()))
+        with self.outbox_lock:
+            for shard, batch in remote.items():
+                self.outboxes[shard].extend(batch)
+            full = [shard for shard in remote if len(self.outboxes[shard]) >= self.batch_size]
+        for shard in full:
+            self.flush_outbox(shard)
+
+    def flush_outbox(self, shard):
+        with self.outbox_lock:
+            batch, self.outboxes[shard] = self.outboxes[shard], []
+        if batch:
+            self.inboxes[shard].put(batch)
+            self.routed += len(batch)
+
+    def crawl_all(self):
+        receiver = threading.Thread(target=self.receive, name=f'shard-{self.index}-inbox', daemon=True)
+        receiver.start()
+        in_flight = set()
+        last_flush = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while True:
+                while len(in_flight) < self.window:
+                    item = self.pending.get(block=False)
+                    if item is None:
+                        break
+                    in_flight.add(executor.submit(self.crawl_task, *item))
+                self.metrics.set_gauge('in_flight', len(in_flight))
+                # Partial batches go out every flush_interval, a shard waiting on them may be idle
+                if time.monotonic() - last_flush >= self.flush_interval:
+                    for shard in range(self.shards):
+                        self.flush_outbox(shard)
+                    last_flush = time.monotonic()
+                if in_flight:
+                    done, in_flight = wait(in_flight, timeout=self.flush_interval, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+                elif self.outstanding.value == 0:
+                    break
+                else:
+                    # Idle until another shard routes URLs here
+                    item = self.pending.get(timeout=self.flush_interval)
+                    if item is not None:
+                        in_flight.add(executor.submit(self.crawl_task, *item))
+        self.done.set()
+        receiver.join()
+        if self.pending.dropped:
+            logging.info(f'Shard {self.index}: frontier was full, {self.pending.dropped} URLs dropped')
+
+
+def shard_path(path, index):
+    stem, extension = os.path.splitext(path)
+    return f'{stem}.shard-{index}{extension}'
+
+
+def run_shard(index, shards, inboxes, outstanding, results, base_url, options):
+    crawler = ShardCrawler(index, shards, inboxes, outstanding, base_url, **options)
+    crawler.run()
+    results.put({'shard': index, 'pages': crawler.fetched_pages, 'routed': crawler.routed,
+                 'received': crawler.received, 'report': crawler.report})
+
+
+def merge_outputs(paths, shards):
+    # Shard CSVs concatenated under a single header, the shard files are removed
+    for path in paths:
+        with open(path, 'wb') as merged:
+            for index in range(shards):
+                with open(shard_path(path, index), 'rb') as part:
+                    header = part.readline()
+                    if index == 0:
+                        merged.write(header)
+                    shutil.copyfileobj(part, merged)
+                os.remove(shard_path(path, index))
+
+
+class ShardedCrawl:
+    def __init__(self, base_url, urls=[], max_records=20000, shards=None, batch_size=500, **options):
+        self.base_url = base_url
+        self.site_name = urlparse(base_url).netloc.split('.')[1]
+        self.shards = shards or os.cpu_count()
+        canonicalizer = URLCanonicalizer()
+        self.seeds = {canonicalizer.canonicalize(url) for url in urls} - {None}
+        # The page limit is split evenly, a shard stops fetching once it has its share
+        self.options = dict(options, max_records=math.ceil(max_records / self.shards), batch_size=batch_size)
+        # Only the CSV logs are merged, so the other formats are not offered here
+        self.options['log_formats'] = ('csv',)
+        self.results = []
+
+    def run(self):
+        # spawn, a forked child would inherit the parent's session, locks and logging threads
+        context = multiprocessing.get_context('spawn')
+        inboxes = [context.Queue() for _ in range(self.shards)]
+        outstanding = context.Value('q', len(self.seeds))
+        results = context.Queue()
+        for url in self.seeds:
+            inboxes[shard_of(url, self.shards)].put([(url, 1)])
+        processes = [context.Process(target=run_shard, name=f'shard-{index}',
+                                     args=(index, self.shards, inboxes, outstanding, results, self.base_url,
+                                           self.options))
+                     for index in range(self.shards)]
+        for process in processes:
+            process.start()
+        # Read the results before joining, a child exits only once its queue data is flushed
+        for process in processes:
+            try:
+                self.results.append(results.get())
+            except KeyboardInterrupt:
+                break
+        for process in processes:
+            process.join()
+        failed = [process.name for process in processes if process.exitcode != 0]
+        if failed:
+            raise RuntimeError(f'Crawl shards failed: {", ".join(failed)}')
+        self.results.sort(key=lambda result: result['shard'])
+        merge_outputs([f'{name}_{self.site_name}.csv' for name in ['fetch', 'visit', 'urls']], self.shards)
+        # The shards' counters and sketches add up to the report of the whole crawl
+        report = CrawlReport(f'CrawlReport_{self.site_name}.txt')
+        for result in self.results:
+            report.merge(result['report'])
+        report.snapshot()
+        for result in self.results:
+            logging.info(f"Shard {result['shard']}: {result['pages']} pages, {result['routed']} URLs sent to "
+                         f"other shards, {result['received']} received")
+        return self.results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--shards', type=int, default=os.cpu_count(), help='Worker processes, one shard each')
+    parser.add_argument('--max-records', type=int, default=20000)
+    parser.add_argument('--workers', type=int, default=100, help='Fetch threads per shard')
+    parser.add_argument('--batch-size', type=int, default=500, help='URLs per message to another shard')
+    args = parser.parse_args()
+    crawl = ShardedCrawl('https://www.nytimes.com/', ['https://www.nytimes.com/'], args.max_records,
+                         shards=args.shards, batch_size=args.batch_size, max_workers=args.workers)
+    crawl.run()
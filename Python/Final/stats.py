@@ -1,4 +1,9 @@
+import argparse
 import csv
+import os
+from bisect import bisect_right
+from crawl_report import is_success
+from seen_store import FingerprintSeenStore
 
 # Constants
 FETCH_FILE = 'fetch_nytimes.csv'
@@ -6,98 +11,125 @@ URLS_FILE = 'urls_nytimes.csv'
 VISIT_FILE = 'visit_nytimes.csv'
 CRAWL_REPORT_FILE = 'CrawlReport_nytimes_1.txt'
 
+# File size buckets, a size goes to the bucket of the last edge it is >= to
+SIZE_EDGES = [1024, 1048576]
+SIZE_LABELS = ['< 1KB', '1KB - 1MB', '> 1MB']
+FINGERPRINT_MASK = (1 << 64) - 1
+
+# Rows of a crawl log, from its CSV or from the columnar log written with --log-format parquet
+def read_rows(path):
+    if path.endswith('.parquet'):
+        from columnar_log import iter_log_rows
+        yield from iter_log_rows(path)
+        return
+    with open(path, 'r', newline='', encoding='utf-8') as file:
+        reader = csv.reader(file)
+        next(reader)  # Skip header row
+        yield from reader
+
 # Function to collate statistics
-def collate_statistics():
+# Each log is streamed once. Unique URLs are counted as 64-bit fingerprints in compact
+# hash tables (see seen_store.py) instead of three sets of URL strings.
+def count_statistics(fetch_file=FETCH_FILE, urls_file=URLS_FILE, visit_file=VISIT_FILE):
     # Initialize counters
     fetch_attempted = 0
     fetch_succeeded = 0
     fetch_failed = 0
     total_urls_extracted = 0
-    unique_urls_extracted = set()
-    unique_news_website_urls = set()
-    unique_external_urls = set()
+    unique_news_website_urls = FingerprintSeenStore()
+    unique_external_urls = FingerprintSeenStore()
     status_codes = {}
-    file_sizes = {}
-    content_types = set()
+    file_sizes = [0] * len(SIZE_LABELS)
+    content_types = {}  # Dict rather than set so the report order is stable
 
     # Read fetch statistics from fetch file
-    with open(FETCH_FILE, 'r', newline='', encoding='utf-8') as file:
-        reader = csv.reader(file)
-        next(reader)  # Skip header row
-        for row in reader:
-            fetch_attempted += 1
-            status_code = int(row[1])
-            if 200 <= status_code < 300:
-                fetch_succeeded += 1
-            else:
-                fetch_failed += 1
-            status_codes[status_code] = status_codes.get(status_code, 0) + 1
+    for row in read_rows(fetch_file):
+        fetch_attempted += 1
+        status_code = int(row[1])
+        if is_success(status_code):
+            fetch_succeeded += 1
+        else:
+            fetch_failed += 1
+        status_codes[status_code] = status_codes.get(status_code, 0) + 1
 
     # Read URLs statistics from URLs file
-    with open(URLS_FILE, 'r', newline='', encoding='utf-8') as file:
-        reader = csv.reader(file)
-        next(reader)  # Skip header row
-        for row in reader:
-            total_urls_extracted += 1
-            url = row[0]
-            unique_urls_extracted.add(url)
-            if row[1] == 'OK':
-                unique_news_website_urls.add(url)
-            else:
-                unique_external_urls.add(url)
+    for row in read_rows(urls_file):
+        total_urls_extracted += 1
+        # The report is built in one process, so the built-in string hash is a stable
+        # enough 64-bit fingerprint here and much cheaper than url_fingerprint
+        fingerprint = hash(row[0]) & FINGERPRINT_MASK or 1
+        if row[1] == 'OK':
+            unique_news_website_urls.add_fingerprint(fingerprint)
+        else:
+            unique_external_urls.add_fingerprint(fingerprint)
+    # A URL listed with both statuses counts once in the total
+    in_both = sum(1 for fingerprint in unique_external_urls if unique_news_website_urls.has_fingerprint(fingerprint))
+    unique_urls_extracted = len(unique_news_website_urls) + len(unique_external_urls) - in_both
 
     # Read visit statistics from visit file
-    with open(VISIT_FILE, 'r', newline='', encoding='utf-8') as file:
-        reader = csv.reader(file)
-        next(reader)  # Skip header row
-        for row in reader:
-            content_type = row[3]
-            file_size = int(row[1])
-            content_types.add(content_type)
-            file_sizes[file_size] = file_sizes.get(file_size, 0) + 1
+    for row in read_rows(visit_file):
+        content_types[row[3]] = None
+        file_sizes[bisect_right(SIZE_EDGES, int(row[1]))] += 1
+
+    return {
+        'fetches_attempted': fetch_attempted,
+        'fetches_succeeded': fetch_succeeded,
+        'fetches_failed': fetch_failed,
+        'status_codes': status_codes,
+        'total_urls_extracted': total_urls_extracted,
+        'unique_extracted': unique_urls_extracted,
+        'unique_within': len(unique_news_website_urls),
+        'unique_outside': len(unique_external_urls),
+        'file_sizes': file_sizes,
+        'content_types': list(content_types),
+    }
+
+
+def collate_statistics(fetch_file=FETCH_FILE, urls_file=URLS_FILE, visit_file=VISIT_FILE,
+                       report_file=CRAWL_REPORT_FILE):
+    stats = count_statistics(fetch_file, urls_file, visit_file)
 
     # Generate formatted output
     output = f"""Fetch statistics:
-# fetches attempted: {fetch_attempted}
-# fetches succeeded: {fetch_succeeded}
-# fetches failed or aborted: {fetch_failed}
+# fetches attempted: {stats['fetches_attempted']}
+# fetches succeeded: {stats['fetches_succeeded']}
+# fetches failed or aborted: {stats['fetches_failed']}
 
 Outgoing URLs: statistics about URLs extracted from visited HTML pages
-Total URLs extracted: {total_urls_extracted}
-# unique URLs extracted: {len(unique_urls_extracted)}
-# unique URLs within your news website: {len(unique_news_website_urls)}
-# unique URLs outside the news website: {len(unique_external_urls)}
+Total URLs extracted: {stats['total_urls_extracted']}
+# unique URLs extracted: {stats['unique_extracted']}
+# unique URLs within your news website: {stats['unique_within']}
+# unique URLs outside the news website: {stats['unique_outside']}
 
 Status codes:
-{format_status_codes(status_codes)}
+{format_status_codes(stats['status_codes'])}
 
 File sizes:
-{format_file_sizes(file_sizes)}
+{format_file_sizes(stats['file_sizes'])}
 
 Content Type:
-{', '.join(content_types)}
+{', '.join(stats['content_types'])}
 """
 
     # Write output to file
-    with open(CRAWL_REPORT_FILE, 'w', encoding='utf-8') as file:
+    with open(report_file, 'w', encoding='utf-8') as file:
         file.write(output)
 
 # Helper function to format status codes
 def format_status_codes(status_codes):
     return '\n'.join(f"{status_code}: {count}" for status_code, count in status_codes.items())
 
-# Helper function to format file sizes
 # Helper function to format file sizes
 def format_file_sizes(file_sizes):
-    ranges = [(0, 1023), (1024, 1048575), (1048576, 2147483647)]  # Adjusted upper bound for the last range
-    labels = ['< 1KB', '1KB - 1MB', '> 1MB']
-    output = []
-    for label, (lower, upper) in zip(labels, ranges):
-        count = sum(file_sizes.get(size, 0) for size in range(lower, upper + 1))
-        output.append(f"{label}: {count}")
-    return '\n'.join(output)
+    return '\n'.join(f"{label}: {count}" for label, count in zip(SIZE_LABELS, file_sizes))
 
 
 # Main function
 if __name__ == "__main__":
-    collate_statistics()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv', help='Crawl log format to read')
+    args = parser.parse_args()
+    if args.format == 'parquet':
+        collate_statistics(*(os.path.splitext(path)[0] + '.parquet' for path in [FETCH_FILE, URLS_FILE, VISIT_FILE]))
+    else:
+        collate_statistics()
@@ -0,0 +1,176 @@
+import codecs
+import hashlib
+import logging
+import re
+import time
+from functools import lru_cache
+import requests
+
+# Reads no more of a response than the crawl needs. Pages are requested with stream=True, so
+# only the headers have arrived when the crawler looks at the Content-Type: HTML is decoded
+# chunk by chunk straight into the link extractor, PDFs, Word files and images are only sized
+# (from Content-Length when the server sends one, otherwise by counting the chunks and dropping
+# them), and anything else is closed unread. Nothing is read past max_bytes. stream=True rather
+# than a HEAD request first, which would add a round trip to every page.
+# urllib3 decompresses gzip and deflate chunk by chunk as they are read (brotli too when the
+# brotli package is installed, requests then asks for it), so neither the compressed nor the
+# whole decompressed body is held: only the decoded text when something needs the page at once.
+
+PARSED_TYPES = ['html']
+SIZED_TYPES = ['pdf', 'msword', 'image']
+MAX_BODY_BYTES = 10 * 2 ** 20
+# A declared body this small is read and dropped rather than closing the connection under it
+DRAIN_BYTES = 64 * 1024
+# Labels from the crawl report that Python's codec lookup does not take as they are. Like
+# browsers, pages labelled ISO-8859-1 or ASCII are decoded as windows-1252, its superset.
+CHARSET_ALIASES = {'sjis': 'shift_jis', 'x-sjis': 'shift_jis', 'iso-8859-1': 'cp1252', 'latin1': 'cp1252',
+                   'us-ascii': 'cp1252', 'ascii': 'cp1252'}
+BOMS = [(codecs.BOM_UTF8, 'utf-8-sig'), (codecs.BOM_UTF16_LE, 'utf-16'), (codecs.BOM_UTF16_BE, 'utf-16')]
+META_CHARSET = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([\w.:-]+)', re.IGNORECASE)
+
+
+def body_kind(content_type):
+    # 'parse', 'size' or None for a body that is not read at all
+    if any(ct in content_type for ct in PARSED_TYPES):
+        return 'parse'
+    if any(ct in content_type for ct in SIZED_TYPES):
+        return 'size'
+    return None
+
+
+@lru_cache(maxsize=256)
+def normalize_charset(label):
+    # 'UTF-8', '"utf-8"', 'utf8', 'shift-jis' and so on to a Python codec name, None when unknown
+    label = label.strip().strip('"\'').strip().lower()
+    try:
+        return codecs.lookup(CHARSET_ALIASES.get(label, label)).name
+    except LookupError:
+        return None
+
+
+def header_charset(content_type):
+    # The first charset parameter, 'text/html; charset=utf-8; charset=UTF-8' is in the crawl report
+    for param in content_type.split(';')[1:]:
+        name, _, value = param.partition('=')
+        if name.strip().lower() == 'charset':
+            return normalize_charset(value)
+    return None
+
+
+def body_charset(content_type, head):
+    # A byte order mark first, then the Content-Type header, then a <meta> charset in the first
+    # KB of the page, then UTF-8. requests' response.encoding would make a text/html page with no
+    # charset ISO-8859-1.
+    for bom, encoding in BOMS:
+        if head.startswith(bom):
+            return encoding
+    charset = header_charset(content_type)
+    if charset is None:
+        match = META_CHARSET.search(head[:1024])
+        charset = normalize_charset(match.group(1).decode('ascii')) if match else None
+    return charset or 'utf-8'
+
+
+def incremental_decoder(encoding):
+    try:
+        return codecs.getincrementaldecoder(encoding or 'utf-8')(errors='replace')
+    except LookupError:
+        return codecs.getincrementaldecoder('utf-8')(errors='replace')
+
+
+class StreamedBody:
+    def __init__(self, response, max_bytes=MAX_BODY_BYTES, metrics=None, chunk_size=64 * 1024):
+        self.response = response
+        self.max_bytes = max_bytes
+        self.metrics = metrics
+        self.chunk_size = chunk_size
+        declared = response.headers.get('Content-Length', '')
+        self.declared_size = int(declared) if declared.isdigit() else None
+        self.read_bytes = 0  # Decompressed
+        self.encoding = None  # Set from the first chunk, see body_charset()
+        self.complete = False  # Read to the end, not cut off by max_bytes or an error
+        self.hash = hashlib.blake2b(digest_size=16)
+        self.text = None
+        self.closed = False
+
+    @property
+    def size(self):
+        # Decompressed when read in full. A truncated or unread body still gets the size the server
+        # declared, which is the compressed size for a compressed body.
+        if self.complete or self.declared_size is None:
+            return self.read_bytes
+        return self.declared_size
+
+    def wire_bytes(self):
+        # Bytes taken off the connection, before decompression
+        return self.response.raw.tell()
+
+    def chunks(self):
+        if self.closed:
+            return
+        start = time.perf_counter()
+        try:
+            if self.declared_size is not None and self.declared_size > self.max_bytes:
+                self.count_over_limit()
+                return
+            for chunk in self.response.iter_content(self.chunk_size):
+                if self.read_bytes + len(chunk) > self.max_bytes:
+                    self.count_over_limit()
+                    return
+                self.read_bytes += len(chunk)
+                self.hash.update(chunk)
+                yield chunk
+            self.complete = True
+        except requests.RequestException as e:
+            logging.warning(f'Error reading the body of {self.response.url}: {e}')
+        finally:
+            self.close()
+            if self.metrics:
+                # Streamed into the parser, so this includes the parsing done between chunks
+                self.metrics.observe('download_seconds', time.perf_counter() - start)
+                self.metrics.inc('bytes_downloaded', self.wire_bytes())
+                self.metrics.inc('bytes_decompressed', self.read_bytes)
+
+    def count_over_limit(self):
+        if self.metrics:
+            self.metrics.inc('bodies_over_limit')
+
+    def __iter__(self):
+        # Decoded text chunks as they arrive, which is what the link extractors take
+        if self.text is not None:
+            yield self.text
+            return
+        decoder = None
+        for chunk in self.chunks():
+            if decoder is None:
+                self.encoding = body_charset(self.response.headers.get('Content-Type', ''), chunk)
+                decoder = incremental_decoder(self.encoding)
+            text = decoder.decode(chunk)
+            if text:
+                yield text
+        if decoder is not None:
+            yield decoder.decode(b'', final=True)
+
+    def read(self):
+        # The whole body as text, kept so that iterating again gives it back
+        if self.text is None:
+            self.text = ''.join(self)
+        return self.text
+
+    def drain(self):
+        # Sizes a body that is not parsed without keeping it
+        if self.declared_size is None or self.declared_size <= DRAIN_BYTES:
+            for _ in self.chunks():
+                pass
+        self.close()
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.response.close()
+            if self.metrics and self.declared_size:
+                # What reading every body in full would have cost on top
+                self.metrics.inc('bytes_not_read', max(0, self.declared_size - self.wire_bytes()))
+
+    def content_hash(self):
+        return self.hash.hexdigest()
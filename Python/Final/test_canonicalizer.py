@@ -0,0 +1,44 @@
+import pytest
+from canonicalizer import URLCanonicalizer, canonicalize_url
+
+
+@pytest.mark.parametrize('href, canonical', [
+    ('HTTPS://WWW.NYTimes.com:443/a/./b/../c//d?b=1&a=2#frag', 'https://www.nytimes.com/a/c/d?b=1&a=2'),
+    ('http://example.com:8080', 'http://example.com:8080/'),
+    ('  https://example.com/x  ', 'https://example.com/x'),
+    ('https://example.com/a/../../b', 'https://example.com/b'),
+    ('https://example.com/a\\b', 'https://example.com/a/b'),
+    ('https://example.com/a b?q=a+b', 'https://example.com/a%20b?q=a%2Bb'),
+    ('https://example.com/%7Euser/', 'https://example.com/~user/'),
+    # A broken escape is kept as it is
+    ('https://example.com/?q=%zz', 'https://example.com/?q=%zz'),
+    ('https://example.com/?a=1&a=2', 'https://example.com/?a=2'),
+    ('http://[::1]:8080/x', 'http://[::1]:8080/x'),
+    ('http://[::1]:80/', 'http://[::1]/'),
+])
+def test_variants_collapse_to_one_url(href, canonical):
+    assert canonicalize_url(href) == canonical
+
+
+@pytest.mark.parametrize('href', ['mailto:a@b.c', 'javascript:void(0)', 'ftp://example.com/',
+                                  'https://example.com:99999/', 'https:///path', ''])
+def test_non_http_and_invalid_urls_are_none(href):
+    assert canonicalize_url(href) is None
+
+
+def test_tracking_and_session_params_are_stripped():
+    url = 'https://www.nytimes.com/a?utm_source=x&utm_medium=y&smid=tw&jsessionid=1&PHPSESSID=2&id=7&keep'
+    assert canonicalize_url(url) == 'https://www.nytimes.com/a?id=7&keep'
+
+
+def test_strip_params_can_be_replaced():
+    canonicalizer = URLCanonicalizer(strip_params=('ref', 'x_*'))
+    assert canonicalizer.canonicalize('https://example.com/?ref=1&x_a=2&utm_source=3') == \
+        'https://example.com/?utm_source=3'
+
+
+def test_relative_href_is_joined_with_its_page():
+    page = 'https://www.nytimes.com/section/world/index.html'
+    assert canonicalize_url('../x?smid=tw', page) == 'https://www.nytimes.com/section/x'
+    assert canonicalize_url('//cdn.example.com/a', page) == 'https://cdn.example.com/a'
+    assert canonicalize_url('/x', page) == canonicalize_url('https://www.nytimes.com/x')
@@ -0,0 +1,60 @@
+import socket
+import pytest
+import requests
+from connection_pool import POOL_PER_HOST, build_session
+from dns_cache import DNSCache
+from main_code import Crawler
+from mock_site import FakeResolver, start_mock_site
+
+
+def closed_port():
+    # A port nothing listens on, so connecting to it is refused
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def server():
+    server = start_mock_site(pages=5)
+    yield server
+    server.shutdown()
+
+
+def test_next_address_is_tried_when_the_first_refuses(server):
+    port = server.server_address[1]
+    # 127.0.0.2 is loopback too, but the mock site only listens on 127.0.0.1
+    dns = DNSCache(resolver=FakeResolver(address=['127.0.0.2', '127.0.0.1']))
+    session = build_session(1, dns=dns)
+    try:
+        response = session.get(f'http://site.test:{port}/', timeout=5)
+        assert response.status_code == 200
+        assert session.pool_stats.connections_opened == 1
+    finally:
+        session.close()
+
+
+def test_error_is_raised_when_every_address_refuses():
+    port = closed_port()
+    dns = DNSCache(resolver=FakeResolver(address=['127.0.0.2', '127.0.0.1']))
+    session = build_session(1, dns=dns)
+    try:
+        with pytest.raises(requests.ConnectionError):
+            session.get(f'http://site.test:{port}/', timeout=5)
+    finally:
+        session.close()
+
+
+@pytest.mark.parametrize('options, pool_size', [({}, POOL_PER_HOST), ({'pool_per_host': 3}, 3),
+                                                ({'polite': True, 'min_delay': 0, 'max_per_host': 2}, 2)])
+def test_crawler_holds_few_connections_to_one_host(tmp_path, monkeypatch, options, pool_size):
+    monkeypatch.chdir(tmp_path)
+    server = start_mock_site(pages=60, fanout=10, latency=0.05)
+    try:
+        crawler = Crawler(server.base_url, [server.base_url], max_records=60, max_workers=40,
+                          metrics_interval=0, **options)
+        crawler.run()
+    finally:
+        server.shutdown()
+    assert crawler.session.pool_stats.requests_sent >= 60
+    assert 1 <= crawler.session.pool_stats.connections_opened <= pool_size
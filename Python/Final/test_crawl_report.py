@@ -0,0 +1,111 @@
+import csv
+import socket
+import pytest
+from async_crawler import AsyncCrawler
+from calculate_stats import chunked_statistics, load_statistics
+from crawl_report import CrawlReport
+from fetch_policy import FetchPolicy
+from main_code import OUTPUT_HEADERS, Crawler
+from mock_site import start_mock_site
+from stats import count_statistics
+
+# 0 is what the crawlers log for a fetch that got no response
+FETCH_ROWS = [
+    ['https://www.nytimes.com/', 200, 0, 0],
+    ['https://www.nytimes.com/a', 0, 3, 0],
+    ['https://www.nytimes.com/b', 301, 0, 0],
+    ['https://www.nytimes.com/c', 404, 0, 0],
+    ['https://www.nytimes.com/d', 204, 0, 0],
+]
+VISIT_ROWS = [
+    ['https://www.nytimes.com/', 2048, 2, 'text/html', ''],
+    ['https://www.nytimes.com/d', 0, 0, 'text/html', ''],
+]
+# Extracted from several pages, so URLs repeat
+URLS_ROWS = [
+    ['https://www.nytimes.com/a', 'OK'],
+    ['https://example.com/', 'N_OK'],
+    ['https://www.nytimes.com/a', 'OK'],
+    ['https://www.nytimes.com/b', 'OK'],
+    ['https://example.com/', 'N_OK'],
+    ['https://example.com/x', 'N_OK'],
+]
+
+
+@pytest.fixture
+def logs(tmp_path):
+    paths = []
+    for name, rows in [('fetch', FETCH_ROWS), ('visit', VISIT_ROWS), ('urls', URLS_ROWS)]:
+        path = str(tmp_path / f'{name}.csv')
+        with open(path, 'w', newline='', encoding='utf-8') as file:
+            writer = csv.writer(file)
+            writer.writerow(OUTPUT_HEADERS[name])
+            writer.writerows(rows)
+        paths.append(path)
+    return paths
+
+
+def live_statistics():
+    report = CrawlReport(path=None)
+    report.add_rows('fetch', FETCH_ROWS)
+    report.add_rows('visit', VISIT_ROWS)
+    report.add_rows('urls', URLS_ROWS)
+    return report.stats()
+
+
+# Every writer of the report, given the fetch, visit and urls logs
+LOGGED_STATISTICS = [
+    load_statistics,
+    lambda *paths: chunked_statistics(2, *paths),
+    lambda fetch_file, visit_file, urls_file: count_statistics(fetch_file, urls_file, visit_file),
+]
+
+
+@pytest.mark.parametrize('statistics', LOGGED_STATISTICS)
+def test_status_0_fails_the_same_live_and_from_the_logs(logs, statistics):
+    live, logged = live_statistics(), statistics(*logs)
+    assert (live['fetches_attempted'], live['fetches_succeeded'], live['fetches_failed']) == (5, 2, 3)
+    for key in ['fetches_attempted', 'fetches_succeeded', 'fetches_failed']:
+        assert logged[key] == live[key]
+    assert logged['status_codes'] == live['status_codes']
+    assert live['status_codes'][0] == 1
+
+
+@pytest.mark.parametrize('statistics', LOGGED_STATISTICS)
+def test_unique_urls_are_distinct_urls_in_every_report(logs, statistics):
+    live, logged = live_statistics(), statistics(*logs)
+    assert (live['unique_extracted'], live['unique_within'], live['unique_outside']) == (4, 2, 2)
+    for key in ['unique_extracted', 'unique_within', 'unique_outside']:
+        assert logged[key] == live[key]
+
+
+def closed_port():
+    # A port nothing listens on, so a fetch from it gets no response
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def crawl_with(engine, base_url, unreachable_url):
+    if engine is AsyncCrawler:
+        crawler = AsyncCrawler(base_url, [base_url, unreachable_url], max_pages=50)
+    else:
+        crawler = Crawler(base_url, [base_url, unreachable_url], max_records=50, max_workers=4,
+                          fetch_policy=FetchPolicy(retries=0), metrics_interval=0)
+    crawler.run()
+    return crawler
+
+
+@pytest.mark.parametrize('engine', [Crawler, AsyncCrawler])
+def test_status_0_is_logged_and_reported_by_both_engines(tmp_path, monkeypatch, engine):
+    monkeypatch.chdir(tmp_path)
+    server = start_mock_site(pages=10, fanout=3)
+    try:
+        crawler = crawl_with(engine, server.base_url, f'http://127.0.0.1:{closed_port()}/')
+    finally:
+        server.shutdown()
+    live = crawler.report.stats()
+    logged = count_statistics(*(crawler.output_path(name) for name in ['fetch', 'urls', 'visit']))
+    assert live['status_codes'][0] == logged['status_codes'][0] == 1
+    assert live['fetches_attempted'] == logged['fetches_attempted'] == crawler.fetched_pages
+    assert live['fetches_failed'] == logged['fetches_failed'] == 1
@@ -0,0 +1,68 @@
+import time
+import pytest
+from distributed_crawl import Coordinator
+
+BASE_URL = 'https://www.nytimes.com/'
+
+
+@pytest.fixture
+def make_coordinator(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    coordinators = []
+
+    def make(**options):
+        coordinator = Coordinator(BASE_URL, [], metrics_interval=0, **options)
+        coordinators.append(coordinator)
+        return coordinator
+    yield make
+    for coordinator in coordinators:
+        coordinator.server.server_close()
+        coordinator.writer.close()
+
+
+def test_url_dropped_by_a_full_frontier_can_be_scheduled_again(make_coordinator):
+    coordinator = make_coordinator(frontier_capacity=1)
+    coordinator.schedule(f'{BASE_URL}a', 2)
+    coordinator.schedule(f'{BASE_URL}b', 2)
+    assert f'{BASE_URL}b' not in coordinator.scheduled
+    coordinator.lease('worker-0', 1)
+    coordinator.schedule(f'{BASE_URL}b', 2)
+    _, items, _ = coordinator.lease('worker-0', 1)
+    assert items == [[f'{BASE_URL}b', 2]]
+
+
+def test_expired_and_returned_urls_go_back_to_a_full_frontier(make_coordinator):
+    coordinator = make_coordinator(frontier_capacity=2, lease_timeout=0.1)
+    coordinator.schedule(f'{BASE_URL}a', 2)
+    coordinator.schedule(f'{BASE_URL}b', 2)
+    lease_id, _, _ = coordinator.lease('worker-0', 2)
+    coordinator.schedule(f'{BASE_URL}c', 2)
+    coordinator.schedule(f'{BASE_URL}d', 2)
+    coordinator.complete(lease_id, [], returned=[[f'{BASE_URL}a', 2]])
+    time.sleep(0.2)
+    _, items, _ = coordinator.lease('worker-1', 4)
+    assert sorted(url for url, _ in items) == [f'{BASE_URL}{path}' for path in 'abcd']
+
+
+def test_heartbeat_keeps_a_lease_until_the_url_timeout(make_coordinator):
+    coordinator = make_coordinator(lease_timeout=0.5, url_timeout=1.2)
+    coordinator.schedule(f'{BASE_URL}a', 2)
+    lease_id, _, _ = coordinator.lease('worker-0', 1)
+    assert coordinator.heartbeat('worker-1', [lease_id]) == [lease_id]
+    for _ in range(3):
+        time.sleep(0.3)
+        assert coordinator.heartbeat('worker-0', [lease_id]) == []
+    # Past the lease timeout since the first lease, but kept alive by the heartbeats
+    assert coordinator.lease('worker-1', 1)[1] == []
+    time.sleep(0.5)
+    assert coordinator.lease('worker-1', 1)[1] == [[f'{BASE_URL}a', 2]]
+    assert coordinator.heartbeat('worker-0', [lease_id]) == [lease_id]
+
+
+def test_lease_of_a_silent_worker_expires_after_the_lease_timeout(make_coordinator):
+    coordinator = make_coordinator(lease_timeout=0.2)
+    coordinator.schedule(f'{BASE_URL}a', 2)
+    coordinator.lease('worker-0', 1)
+    assert coordinator.lease('worker-1', 1)[1] == []
+    time.sleep(0.3)
+    assert coordinator.lease('worker-1', 1)[1] == [[f'{BASE_URL}a', 2]]
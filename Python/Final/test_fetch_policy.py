@@ -0,0 +1,149 @@
+import time
+from email.utils import formatdate
+import pytest
+import requests
+import fetch_policy
+from fetch_policy import CircuitBreaker, CircuitOpen, FetchFailed, FetchPolicy, retry_after
+
+HOST = 'www.nytimes.com'
+URL = f'https://{HOST}/a'
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def answers(*results):
+    # A get() that gives back the results in turn, raising the exceptions among them
+    calls = []
+    results = list(results)
+
+    def get(url, **kwargs):
+        calls.append(url)
+        result = results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+    get.calls = calls
+    return get
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    slept = []
+    monkeypatch.setattr(fetch_policy.time, 'sleep', slept.append)
+    return slept
+
+
+def open_breaker(cooldown=0.05):
+    breaker = CircuitBreaker(window=4, threshold=0.5, min_requests=2, cooldown=cooldown)
+    assert not breaker.record(HOST, False)
+    assert breaker.record(HOST, False)
+    return breaker
+
+
+def test_breaker_opens_and_pauses_the_host():
+    breaker = open_breaker(cooldown=30.0)
+    with pytest.raises(CircuitOpen) as raised:
+        breaker.before(HOST)
+    assert 29 < raised.value.retry_in <= 30
+    assert 29 < breaker.retry_in(HOST) <= 30
+    assert breaker.trip_count(HOST) == 1
+    breaker.before('example.com')
+
+
+def test_one_thread_owns_the_half_open_trial():
+    breaker = open_breaker()
+    time.sleep(0.06)
+    assert breaker.retry_in(HOST) is None
+    breaker.before(HOST)  # Claims the trial
+    with pytest.raises(CircuitOpen):
+        breaker.before(HOST)
+    assert breaker.retry_in(HOST) == 0.05
+    assert not breaker.record(HOST, True)
+    breaker.before(HOST)
+    assert breaker.retry_in(HOST) is None
+
+
+def test_failed_trial_opens_the_breaker_again():
+    breaker = open_breaker()
+    time.sleep(0.06)
+    breaker.before(HOST)
+    assert breaker.record(HOST, False)
+    assert breaker.trip_count(HOST) == 2
+    with pytest.raises(CircuitOpen):
+        breaker.before(HOST)
+
+
+def test_late_results_do_not_change_an_open_breaker():
+    # Fetches that started before the breaker opened
+    breaker = open_breaker(cooldown=30.0)
+    until = breaker.open_until[HOST]
+    assert not breaker.record(HOST, True)
+    assert not breaker.record(HOST, False)
+    assert breaker.open_until[HOST] == until
+    assert breaker.trip_count(HOST) == 1
+    with pytest.raises(CircuitOpen):
+        breaker.before(HOST)
+
+
+def test_retry_after_in_seconds_and_as_an_http_date():
+    assert retry_after(FakeResponse(503, {'Retry-After': '7'})) == 7.0
+    delay = retry_after(FakeResponse(503, {'Retry-After': formatdate(time.time() + 30, usegmt=True)}))
+    assert 28 < delay <= 30
+    assert retry_after(FakeResponse(503, {'Retry-After': formatdate(time.time() - 30, usegmt=True)})) == 0.0
+    assert retry_after(FakeResponse(503, {'Retry-After': 'soon'})) is None
+    assert retry_after(FakeResponse(503)) is None
+
+
+def test_get_waits_out_a_retry_after_date(sleeps):
+    date = formatdate(time.time() + 10, usegmt=True)
+    first, second = FakeResponse(503, {'Retry-After': date}), FakeResponse(200)
+    response, retries = FetchPolicy(breaker=False).get(answers(first, second), URL)
+    assert (response, retries) == (second, 1)
+    assert first.closed
+    assert len(sleeps) == 1 and 8 < sleeps[0] <= 10
+
+
+def test_retry_after_past_the_cap_returns_the_response(sleeps):
+    throttled = FakeResponse(429, {'Retry-After': '600'})
+    get = answers(throttled, FakeResponse(200))
+    response, retries = FetchPolicy(max_retry_after=120.0, breaker=False).get(get, URL)
+    assert (response, retries) == (throttled, 0)
+    assert not throttled.closed
+    assert sleeps == [] and len(get.calls) == 1
+
+
+def test_retry_after_within_the_cap_is_waited_out(sleeps):
+    get = answers(FakeResponse(429, {'Retry-After': '120'}), FakeResponse(200))
+    response, retries = FetchPolicy(max_retry_after=120.0, breaker=False).get(get, URL)
+    assert (response.status_code, retries) == (200, 1)
+    assert sleeps == [120.0]
+
+
+def test_connection_errors_are_retried_then_raised(sleeps):
+    error = requests.ConnectionError('refused')
+    get = answers(error, error, error)
+    with pytest.raises(FetchFailed) as raised:
+        FetchPolicy(retries=2, backoff=1.0, max_backoff=2.0, breaker=False).get(get, URL)
+    assert raised.value.retries == 2 and raised.value.error is error
+    assert len(sleeps) == 2 and all(0 <= delay <= 2.0 for delay in sleeps)
+
+
+def test_breaker_opened_between_attempts_stops_the_retries(sleeps):
+    breaker = CircuitBreaker(window=2, threshold=0.5, min_requests=2, cooldown=30.0)
+    get = answers(FakeResponse(500), FakeResponse(500), FakeResponse(200))
+    with pytest.raises(CircuitOpen):
+        FetchPolicy(retries=3, breaker=breaker).get(get, URL)
+    assert len(get.calls) == 2
+
+
+def test_worst_case_covers_every_timeout_and_wait():
+    policy = FetchPolicy(timeout=(5.0, 30.0), retries=3, max_backoff=30.0, max_retry_after=120.0)
+    assert policy.worst_case_seconds() == 4 * 35.0 + 3 * 120.0
@@ -0,0 +1,46 @@
+import csv
+import pytest
+from http_cache import HTTPCache
+from main_code import Crawler
+from mock_site import start_mock_site
+from streaming import StreamedBody
+
+
+@pytest.fixture
+def server():
+    server = start_mock_site(pages=30, fanout=5)
+    yield server
+    server.shutdown()
+
+
+def crawl(server):
+    # The whole site, so the warm crawl fetches the pages the cold one cached. Not from /, which
+    # is a copy of page 0 and so never cached.
+    crawler = Crawler(server.base_url, [f'{server.base_url}section/page-1.html'], max_records=1000, max_workers=4,
+                      cache_path='http_cache.db', metrics_interval=0)
+    crawler.run()
+    with open(crawler.output_path('visit'), newline='', encoding='utf-8') as file:
+        rows = csv.reader(file)
+        next(rows)
+        return crawler, sorted(tuple(row) for row in rows)
+
+
+def test_unchanged_200_is_parsed_streamed_and_keeps_the_cached_outlinks(server, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _, cold = crawl(server)
+    # A server that ignores validators sends every page again in full
+    monkeypatch.setattr(HTTPCache, 'conditional_headers', lambda self, entry: {})
+    monkeypatch.setattr(StreamedBody, 'read', lambda self: pytest.fail('body read into memory'))
+    crawler, warm = crawl(server)
+    assert crawler.metrics.value('cache_hits') == len(cold) > 1
+    assert crawler.metrics.value('cache_bytes_saved') == 0
+    assert warm == cold
+
+
+def test_unchanged_page_is_a_304_on_a_warm_crawl(server, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _, cold = crawl(server)
+    crawler, warm = crawl(server)
+    assert crawler.metrics.value('cache_hits') == len(cold) > 1
+    assert crawler.metrics.value('cache_bytes_saved') > 0
+    assert warm == cold
@@ -0,0 +1,30 @@
+import pytest
+from link_extractor import available_backends, get_link_extractor
+
+bs4 = pytest.importorskip('bs4')
+
+PAGES = [
+    '<p><a href="/a">a</a><a>no href</a><a href>bare</a><a HREF="/upper">upper</a></p>',
+    '<a href="/first" class="x" href="/second">x</a><a href=/only hreflang=en>y</a>',
+    '<a href=/first HREF=/second href=\'/third\'>z</a><a title="a href" href="/one">w</a>',
+    '<a href="/first" href>bare last</a><a data-href="/data" href="/real">v</a>',
+    '<script>if (a<b) {}</script><a href="/after-script">s</a><!-- <a href="/comment"> -->',
+]
+
+
+def reference(page):
+    return [a.get('href') for a in bs4.BeautifulSoup(page, 'html.parser').find_all('a', href=True)]
+
+
+@pytest.mark.parametrize('backend', available_backends())
+@pytest.mark.parametrize('page', PAGES)
+def test_backend_matches_beautifulsoup(backend, page):
+    assert list(get_link_extractor(backend)(page)) == reference(page)
+
+
+@pytest.mark.parametrize('backend', available_backends())
+@pytest.mark.parametrize('size', [1, 2, 3, 7, 16])
+def test_chunk_boundaries_do_not_change_the_hrefs(backend, size):
+    page = ''.join(PAGES)
+    chunks = [page[start:start + size] for start in range(0, len(page), size)]
+    assert list(get_link_extractor(backend)(chunks)) == reference(page)
@@ -0,0 +1,46 @@
+import csv
+from csv_writer import CrawlOutputWriter
+from main_code import OUTPUT_HEADERS, Crawler
+from mock_site import start_mock_site
+from persistent_frontier import PersistentFrontier
+
+URL = 'https://www.nytimes.com/a'
+
+
+def test_rows_are_on_disk_before_their_page_is_committed(tmp_path):
+    path = str(tmp_path / 'fetch.csv')
+    # Nothing would be flushed for a long time without the commit
+    writer = CrawlOutputWriter({'fetch': (path, OUTPUT_HEADERS['fetch'])}, flush_rows=10 ** 6, flush_interval=3600)
+    frontier = PersistentFrontier(str(tmp_path / 'frontier.db'), batch_size=10 ** 6, commit_interval=3600)
+    frontier.before_commit = writer.sync
+    try:
+        frontier.schedule(URL, 1)
+        writer.writerow('fetch', [URL, 200, 0, 0])
+        frontier.complete(URL)
+        frontier.commit()
+        with open(path, newline='', encoding='utf-8') as file:
+            assert list(csv.reader(file))[1:] == [[URL, '200', '0', '0']]
+    finally:
+        writer.close()
+        frontier.close()
+
+
+def test_close_after_the_writer_does_not_wait_for_it(tmp_path):
+    writer = CrawlOutputWriter({'fetch': (str(tmp_path / 'fetch.csv'), OUTPUT_HEADERS['fetch'])})
+    frontier = PersistentFrontier(str(tmp_path / 'frontier.db'))
+    frontier.before_commit = writer.sync
+    writer.close()
+    frontier.close()
+
+
+def test_crawl_with_a_frontier_logs_every_page(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    server = start_mock_site(pages=50, fanout=5)
+    try:
+        crawler = Crawler(server.base_url, [server.base_url], max_records=40, max_workers=4,
+                          frontier_path='frontier.db', metrics_interval=0)
+        crawler.run()
+    finally:
+        server.shutdown()
+    with open(crawler.output_path('fetch'), newline='', encoding='utf-8') as file:
+        assert len(list(csv.reader(file))) - 1 == crawler.fetched_pages
@@ -0,0 +1,39 @@
+import pytest
+import requests
+from main_code import Crawler
+from mock_site import start_mock_site
+from politeness import RobotsCache
+
+ROBOTS_TXT = 'User-agent: *\nDisallow: /section/page-1\n'
+
+
+@pytest.fixture
+def server():
+    server = start_mock_site(pages=30, fanout=5, robots_txt=ROBOTS_TXT)
+    yield server
+    server.shutdown()
+
+
+def test_url_checked_again_is_disallowed_once(server):
+    robots = RobotsCache(requests.Session())
+    try:
+        url = f'{server.base_url}section/page-1.html'
+        assert robots.cached_allowed(url) is None
+        assert not robots.allowed(url)
+        assert robots.cached_allowed(url) is False
+        assert robots.allowed(f'{server.base_url}section/page-2.html')
+        assert robots.disallowed == {url}
+    finally:
+        robots.close()
+
+
+def test_polite_crawl_counts_disallowed_urls_and_stops_prefetching(server, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    crawler = Crawler(server.base_url, [server.base_url], max_records=1000, max_workers=4, polite=True,
+                      min_delay=0, metrics_interval=0)
+    crawler.run()
+    # page-1 and page-10 .. page-19, whichever of them the site links to
+    assert crawler.robots.disallowed
+    assert all(url.startswith(f'{server.base_url}section/page-1') for url in crawler.robots.disallowed)
+    with pytest.raises(RuntimeError):
+        crawler.robots.executor.submit(print)
@@ -0,0 +1,80 @@
+import pytest
+from scope import BLOCKED, IN_SCOPE, OUT_OF_SCOPE, Scope
+
+BASE_URL = 'https://www.nytimes.com/'
+
+
+@pytest.fixture
+def scope():
+    return Scope.for_site(BASE_URL, exclude_paths=['/video'], exclude_extensions=['pdf', '.JPG'],
+                          exclude_patterns=[r'[?&]page=\d{3,}'], max_depth=3)
+
+
+@pytest.mark.parametrize('url, expected', [
+    ('https://www.nytimes.com/a', IN_SCOPE),
+    ('HTTPS://WWW.NYTIMES.COM/A', IN_SCOPE),
+    ('https://user@www.nytimes.com/a', IN_SCOPE),
+    ('https://m.www.nytimes.com:8443/a', IN_SCOPE),
+    ('https://nytimes.com/a', OUT_OF_SCOPE),
+    ('https://evilnytimes.com/', OUT_OF_SCOPE),
+    ('https://www.nytimes.com.evil.com/', OUT_OF_SCOPE),
+    # User info that looks like the site, the host is evil.com
+    ('https://www.nytimes.com@evil.com/', OUT_OF_SCOPE),
+    ('https://www.nytimes.com/a.pdf/x', IN_SCOPE),
+    ('https://www.nytimes.com/?page=10', IN_SCOPE),
+])
+def test_urls_are_classified_by_host(scope, url, expected):
+    assert scope.classify(url) == expected
+
+
+@pytest.mark.parametrize('url', [
+    'https://www.nytimes.com/video/x',
+    'https://www.nytimes.com/videos',
+    'https://www.nytimes.com/a/b.pdf',
+    'https://www.nytimes.com/a/b.PDF?x=1',
+    'https://www.nytimes.com/a/b.jpg#f',
+    'https://example.com/b.pdf',
+    'https://www.nytimes.com/?page=1000',
+])
+def test_exclude_rules_block_urls_on_and_off_the_site(scope, url):
+    assert scope.classify(url) == BLOCKED
+    assert not scope.admit(url)
+
+
+def test_blocked_urls_keep_their_label(scope):
+    # OK means on the news site, whether or not the URL is crawled
+    assert scope.label('https://www.nytimes.com/video/x') == 'OK'
+    assert scope.label('https://example.com/b.pdf') == 'N_OK'
+
+
+def test_urls_past_max_depth_are_blocked(scope):
+    assert scope.classify('https://www.nytimes.com/a', 3) == IN_SCOPE
+    assert scope.classify('https://www.nytimes.com/a', 4) == BLOCKED
+    assert not scope.admit('https://www.nytimes.com/a', 4)
+
+
+def test_out_of_scope_urls_are_followed_unless_turned_off():
+    assert Scope.for_site(BASE_URL).admit('https://example.com/')
+    same_site = Scope.for_site(BASE_URL, follow_out_of_scope=False)
+    assert not same_site.admit('https://example.com/')
+    assert same_site.admit('https://www.nytimes.com/a')
+
+
+def test_include_rules_all_have_to_match():
+    scope = Scope(hosts=['nytimes.com'], paths=['/section/'], extensions=['html'])
+    assert scope.classify('https://www.nytimes.com/section/world.html') == IN_SCOPE
+    assert scope.classify('https://www.nytimes.com/section/world') == OUT_OF_SCOPE
+    assert scope.classify('https://www.nytimes.com/video/a.html') == OUT_OF_SCOPE
+    assert scope.classify('https://example.com/section/a.html') == OUT_OF_SCOPE
+
+
+def test_include_pattern_is_enough_on_its_own():
+    scope = Scope(hosts=['nytimes.com'], patterns=[r'^https://archive\.org/'])
+    assert scope.classify('https://archive.org/nytimes') == IN_SCOPE
+    assert scope.classify('https://example.com/') == OUT_OF_SCOPE
+
+
+def test_scope_without_rules_takes_everything():
+    scope = Scope()
+    assert scope.classify('https://example.com/') == IN_SCOPE
+    assert scope.label('https://example.com/') == 'OK'
@@ -0,0 +1,65 @@
+import threading
+import pytest
+from seen_store import BloomSeenStore, FingerprintSeenStore, make_seen_store, url_fingerprint
+
+URLS = [f'https://www.nytimes.com/section/page-{page}.html' for page in range(5000)]
+
+
+@pytest.fixture(params=['exact', 'bloom'])
+def store(request):
+    return make_seen_store(request.param)
+
+
+def test_only_the_first_add_is_new(store):
+    assert URLS[0] not in store
+    assert store.add_if_absent(URLS[0])
+    assert not store.add_if_absent(URLS[0])
+    assert URLS[0] in store
+    assert len(store) == 1
+
+
+def test_fingerprint_restores_the_url(store):
+    # A resumed crawl refills the store from fingerprints saved by the frontier
+    store.add_fingerprint(url_fingerprint(URLS[0]))
+    assert URLS[0] in store
+    assert not store.add_if_absent(URLS[0])
+
+
+def test_concurrent_adds_let_one_thread_through(store):
+    results = []
+
+    def add():
+        results.append(store.add_if_absent(URLS[0]))
+    threads = [threading.Thread(target=add) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results.count(True) == 1
+
+
+def test_exact_store_keeps_every_url_when_it_grows():
+    store = FingerprintSeenStore(initial_capacity=16)
+    assert all(store.add_if_absent(url) for url in URLS)
+    assert len(store) == len(URLS)
+    assert all(url in store for url in URLS)
+    assert store.nbytes >= len(URLS) * 8
+    assert sorted(store) == sorted(url_fingerprint(url) for url in URLS)
+
+
+def test_fingerprint_is_never_0():
+    assert all(url_fingerprint(url) for url in URLS)
+
+
+def test_bloom_store_stays_near_its_error_rate():
+    store = BloomSeenStore(capacity=len(URLS), error_rate=0.01)
+    for url in URLS:
+        store.add_if_absent(url)
+    assert all(url in store for url in URLS)
+    false_positives = sum(f'https://example.com/{number}' in store for number in range(10000))
+    assert false_positives < 300
+
+
+def test_unknown_mode_is_an_error():
+    with pytest.raises(ValueError):
+        make_seen_store('approximate')
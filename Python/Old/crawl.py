@@ -1,11 +1,19 @@
 import requests
-from bs4 import BeautifulSoup
-from urllib.parse import urlparse, urljoin
 import csv
+import os
 import queue
 import threading
-import mimetypes
+import sys
 import logging
+from urllib.parse import urljoin
+
+# Shared crawler modules live in Final/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Final'))
+from canonicalizer import canonicalize_url
+from link_extractor import iter_hrefs
+from fetch_policy import DEFAULT_TIMEOUT
+from streaming import StreamedBody
+from scope import Scope
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -28,13 +36,14 @@ def fetch_urls(url_list, news_site_name, lock):
         if crawled_count >= total_urls_to_crawl:
             break
         try:
-            response = requests.get(url)
-            status_code = response.status_code
+            # Only the status is needed, the body is never read
+            with requests.get(url, stream=True, timeout=DEFAULT_TIMEOUT) as response:
+                status_code = response.status_code
             fetched_urls.append([url, status_code])
         except Exception as e:
             fetched_urls.append([url, str(e)])
             logger.error(f"Error fetching URL: {url}, {e}")
-        print(f"Fetching {i + 1}/{total_urls} - URL: {url}")  # Progress indicator
+        logger.debug(f"Fetching {i + 1}/{total_urls} - URL: {url}")  # Progress indicator
         with lock:
             crawled_count += 1
 
@@ -53,26 +62,21 @@ def visit_urls(url_list, news_site_name, lock):
     total_urls = len(url_list)
     for i, url in enumerate(url_list):
         try:
-            response = requests.get(url)
+            # Headers first: HTML is parsed as it downloads, images and everything else are only sized
+            response = requests.get(url, stream=True, timeout=DEFAULT_TIMEOUT)
+            body = StreamedBody(response)
             content_type = response.headers.get('Content-Type', 'Unknown')
-            if any(content_type.startswith(mime) for mime in ['text/html', 'application/msword', 'application/pdf']):
-                soup = BeautifulSoup(response.content, 'html.parser')
-                outlinks = soup.find_all('a', href=True)
-                outlinks_count = len(outlinks)
-                visited_urls.append([url, len(response.content), outlinks_count, content_type])
+            if content_type.startswith('text/html'):
+                outlinks_count = sum(1 for _ in iter_hrefs(body))
+                visited_urls.append([url, body.size, outlinks_count, content_type])
             else:
-                # Record metadata for images
-                ext = mimetypes.guess_extension(content_type.split(';')[0])
-                if ext in {'.jpeg', '.jpg', '.png', '.gif'}:
-                    img_info = response.headers
-                    visited_urls.append([url, img_info.get('Content-Length', 0), 0, content_type])
-                else:
-                    visited_urls.append([url, len(response.content), 0, content_type])
+                body.drain()
+                visited_urls.append([url, body.size, 0, content_type])
         except Exception as e:
             visited_urls.append([url, str(e), 0, 'Unknown'])
             logger.error(f"Error visiting URL: {url}, {e}")
 
-        print(f"Visiting {i + 1}/{total_urls} - URL: {url}")  # Progress indicator
+        logger.debug(f"Visiting {i + 1}/{total_urls} - URL: {url}")  # Progress indicator
 
         with lock:
             crawled_count += 1
@@ -86,20 +90,8 @@ def visit_urls(url_list, news_site_name, lock):
             writer.writerows(visited_urls)
 
 
-# Function to extract domain from URL
-def get_domain(url):
-    parsed_url = urlparse(url)
-    return parsed_url.netloc
-
-
-# Function to extract base URL
-def get_base_url(url):
-    parsed_url = urlparse(url)
-    return parsed_url.scheme + '://' + parsed_url.netloc
-
-
 # Function to crawl URLs
-def crawl(q, domain, visited, all_urls, lock, max_depth=16):
+def crawl(q, scope, visited, all_urls, lock, max_depth=16):
     global crawled_count
     while True:
         with lock:
@@ -110,24 +102,27 @@ def crawl(q, domain, visited, all_urls, lock, max_depth=16):
             if url in visited or depth > max_depth:
                 continue
             visited.add(url)
-            print(f"Crawling {crawled_count + 1} - Current URL: {url}")
+            logger.debug(f"Crawling {crawled_count + 1} - Current URL: {url}")
             all_urls.add(url)
             with lock:
                 crawled_count += 1
-                print(f"Progress: {crawled_count} / {total_urls_to_crawl}")  # Progress indicator
+                logger.debug(f"Progress: {crawled_count} / {total_urls_to_crawl}")  # Progress indicator
                 if crawled_count >= total_urls_to_crawl:
                     break
-            response = requests.get(url)
-            if response.status_code == 200:
-                soup = BeautifulSoup(response.content, 'html.parser')
-                for link in soup.find_all('a', href=True):
-                    next_url = urljoin(url, link['href'])
-                    if get_domain(next_url) == domain:
+            response = requests.get(url, stream=True, timeout=DEFAULT_TIMEOUT)
+            body = StreamedBody(response)
+            if response.status_code != 200 or 'html' not in response.headers.get('Content-Type', ''):
+                body.close()
+            else:
+                for href in iter_hrefs(body):
+                    next_url = canonicalize_url(urljoin(url, href.strip()))
+                    if not next_url:
+                        continue
+                    if scope.admit(next_url, depth + 1):
                         q.put((next_url, depth + 1))
         except queue.Empty:
             break
         except Exception as e:
-            print(f"Error crawling {url}: {e}")
             logger.error(f"Error crawling URL: {url}, {e}")
             continue  # Continue crawling even if there's an error
 
@@ -135,13 +130,10 @@ def crawl(q, domain, visited, all_urls, lock, max_depth=16):
 
 
 # Function to categorize URLs
-def categorize_urls(urls, news_site_name, base_url):
+def categorize_urls(urls, news_site_name, scope):
     categorized_urls = []
     for url in urls:
-        if url.startswith(base_url):
-            categorized_urls.append([url, 'OK'])
-        else:
-            categorized_urls.append([url, 'N_OK'])
+        categorized_urls.append([url, scope.label(url)])
 
     with open(f'urls_{news_site_name}.csv', 'w', newline='') as file:
         writer = csv.writer(file)
@@ -150,10 +142,10 @@ def categorize_urls(urls, news_site_name, base_url):
 
 
 def main(url, news_site_name):
-    domain = get_domain(url)
-    base_url = get_base_url(url)
+    # Only the news site is crawled, other URLs are labelled N_OK (see Final/scope.py)
+    scope = Scope.for_site(url, follow_out_of_scope=False)
     q = queue.Queue()
-    q.put((url, 1))  # Include initial URL and depth
+    q.put((canonicalize_url(url), 1))  # Include initial URL and depth
     all_urls = set()
     visited = set()
     lock = threading.Lock()
@@ -161,7 +153,7 @@ def main(url, news_site_name):
     # Create and start 50 threads
     threads = []
     for _ in range(16):
-        t = threading.Thread(target=crawl, args=(q, domain, visited, all_urls, lock))
+        t = threading.Thread(target=crawl, args=(q, scope, visited, all_urls, lock))
         t.start()
         threads.append(t)
 
@@ -169,7 +161,7 @@ def main(url, news_site_name):
     for t in threads:
         t.join()
 
-    categorize_urls(all_urls, news_site_name, base_url)
+    categorize_urls(all_urls, news_site_name, scope)
     fetch_urls(all_urls, news_site_name, lock)
     visit_urls(all_urls, news_site_name, lock)
     print("Crawling Completed!")
@@ -1,78 +1,50 @@
 import requests
-from bs4 import BeautifulSoup
-from urllib.parse import urlparse, urljoin
 import csv
+import os
 import queue
-import mimetypes
-
-# Function to fetch URLs and their status codes
-def fetch_urls(url_list, news_site_name):
-    fetched_urls = []
-    total_urls = len(url_list)
-    for i, url in enumerate(url_list):
-        try:
-            response = requests.get(url)
-            status_code = response.status_code
-            fetched_urls.append([url, status_code])
-        except Exception as e:
-            fetched_urls.append([url, str(e)])
-        print(f"Fetching {i + 1}/{total_urls} - URL: {url}")  # Progress indicator
-
-        if len(fetched_urls) >= 10000:  # Limit to 10,000 records
-            break
-
-    with open(f'fetch_{news_site_name}.csv', 'w', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerow(['URL', 'Status'])
-        writer.writerows(fetched_urls)
-
-
-# Function to visit URLs, save successfully downloaded files, and record metadata
-def visit_urls(url_list, news_site_name):
-    visited_urls = []
-    total_urls = len(url_list)
-    for i, url in enumerate(url_list):
-        try:
-            response = requests.get(url)
-            content_type = response.headers.get('Content-Type', 'Unknown')
-            if any(content_type.startswith(mime) for mime in ['text/html', 'application/msword', 'application/pdf']):
-                soup = BeautifulSoup(response.content, 'html.parser')
-                outlinks = soup.find_all('a', href=True)
-                outlinks_count = len(outlinks)
-                visited_urls.append([url, len(response.content), outlinks_count, content_type])
-            else:
-                # Record metadata for images
-                ext = mimetypes.guess_extension(content_type.split(';')[0])
-                if ext in {'.jpeg', '.jpg', '.png', '.gif'}:
-                    img_info = response.headers
-                    visited_urls.append([url, img_info.get('Content-Length', 0), 0, content_type])
-                else:
-                    visited_urls.append([url, len(response.content), 0, content_type])
-        except Exception as e:
-            visited_urls.append([url, str(e), 0, 'Unknown'])
-
-        print(f"Visiting {i + 1}/{total_urls} - URL: {url}")  # Progress indicator
-
-    with open(f'visit_{news_site_name}.csv', 'w', newline='') as file:
+import sys
+import logging
+from functools import partial
+from urllib.parse import urljoin
+
+# Shared crawler modules live in Final/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Final'))
+from canonicalizer import canonicalize_url
+from link_extractor import iter_hrefs
+from fetch_policy import FetchPolicy
+from metrics import CrawlMetrics, timed_get
+from streaming import StreamedBody
+from scope import Scope
+
+logging.basicConfig(format='%(asctime)s %(levelname)s:%(message)s', level=logging.INFO)
+
+# Function to record metadata for a streamed response, returns the row and the hrefs found on HTML, Word
+# and PDF documents. Those are parsed as they download, images and everything else are only sized
+# (see Final/streaming.py)
+def visit_record(url, response, body):
+    content_type = response.headers.get('Content-Type', 'Unknown')
+    if any(content_type.startswith(mime) for mime in ['text/html', 'application/msword', 'application/pdf']):
+        hrefs = list(iter_hrefs(body))
+        return [url, body.size, len(hrefs), content_type], hrefs
+    body.drain()
+    return [url, body.size, 0, content_type], []
+
+
+# Function to write collected rows to a CSV file
+def write_rows(path, header, rows):
+    with open(path, 'w', newline='') as file:
         writer = csv.writer(file)
-        writer.writerow(['URL', 'Size', 'Outlinks', 'Content-Type'])
-        writer.writerows(visited_urls)
-
-
-# Function to extract domain from URL
-def get_domain(url):
-    parsed_url = urlparse(url)
-    return parsed_url.netloc
+        writer.writerow(header)
+        writer.writerows(rows)
 
 
-# Function to extract base URL
-def get_base_url(url):
-    parsed_url = urlparse(url)
-    return parsed_url.scheme + '://' + parsed_url.netloc
-
-
-# Function to crawl URLs
-def crawl(q, domain, visited=set(), all_urls=set(), limit=10000, max_depth=16):
+# Function to crawl URLs, each URL is downloaded once and that response feeds the frontier,
+# the fetch record and the visit record
+def crawl(q, scope, visited=set(), all_urls=set(), fetched_urls=[], visited_urls=[], limit=10000, max_depth=16,
+          metrics=None, policy=None):
+    metrics = metrics or CrawlMetrics()
+    # Timeouts, retries with backoff and a per-host circuit breaker (see Final/fetch_policy.py)
+    policy = policy or FetchPolicy(metrics=metrics)
     crawled_count = 0
     while crawled_count < limit:
         try:
@@ -80,33 +52,42 @@ def crawl(q, domain, visited=set(), all_urls=set(), limit=10000, max_depth=16):
             if url in visited or depth > max_depth:
                 continue
             visited.add(url)
-            print(f"Crawling {crawled_count + 1}/{limit} - Queue Size: {q.qsize()} - Current URL: {url}")
+            logging.debug(f"Crawling {crawled_count + 1}/{limit} - Queue Size: {q.qsize()} - Current URL: {url}")
             all_urls.add(url)
             crawled_count += 1
-            response = requests.get(url)
+            try:
+                response, _ = policy.get(partial(timed_get, metrics, requests.get), url, stream=True)
+            except Exception as e:
+                fetched_urls.append([url, str(e)])
+                visited_urls.append([url, str(e), 0, 'Unknown'])
+                continue
+            fetched_urls.append([url, response.status_code])
+            metrics.inc('pages_fetched')
+            metrics.inc(f'status_{response.status_code}')
+            with metrics.timer('parse_seconds'):
+                visit_row, hrefs = visit_record(url, response, StreamedBody(response, metrics=metrics))
+            visited_urls.append(visit_row)
             if response.status_code == 200:
-                soup = BeautifulSoup(response.content, 'html.parser')
-                for link in soup.find_all('a', href=True):
-                    next_url = urljoin(url, link['href'])
-                    if get_domain(next_url) == domain:
+                for href in hrefs:
+                    next_url = canonicalize_url(urljoin(url, href.strip()))
+                    if not next_url:
+                        continue
+                    if scope.admit(next_url, depth + 1):
                         q.put((next_url, depth + 1))
                     else:
                         all_urls.add(next_url)
         except queue.Empty:
             break
         except Exception as e:
-            print(f"Error crawling {url}: {e}")
+            logging.error(f"Error crawling {url}: {e}")
             continue  # Continue crawling even if there's an error
 
 
 # Function to categorize URLs
-def categorize_urls(urls, news_site_name, base_url):
+def categorize_urls(urls, news_site_name, scope):
     categorized_urls = []
     for url in urls:
-        if url.startswith(base_url):
-            categorized_urls.append([url, 'OK'])
-        else:
-            categorized_urls.append([url, 'N_OK'])
+        categorized_urls.append([url, scope.label(url)])
 
     with open(f'urls_{news_site_name}.csv', 'w', newline='') as file:
         writer = csv.writer(file)
@@ -114,17 +95,27 @@ def categorize_urls(urls, news_site_name, base_url):
         writer.writerows(categorized_urls)
 
 
-def main(url, news_site_name):
-    domain = get_domain(url)
-    base_url = get_base_url(url)
+def main(url, news_site_name, limit=10000):
+    # Only the news site is crawled, other URLs are labelled N_OK (see Final/scope.py)
+    scope = Scope.for_site(url, follow_out_of_scope=False)
     q = queue.Queue()
-    q.put((url, 1))  # Include initial URL and depth
+    q.put((canonicalize_url(url), 1))  # Include initial URL and depth
     all_urls = set()
     visited = set()
-    crawl(q, domain, visited, all_urls)
-    categorize_urls(all_urls, news_site_name, base_url)
-    fetch_urls(all_urls, news_site_name)
-    visit_urls(all_urls, news_site_name)
+    fetched_urls = []
+    visited_urls = []
+    # Progress line every 10 seconds instead of a print per URL
+    metrics = CrawlMetrics()
+    metrics.gauge('frontier_size', q.qsize)
+    metrics.start()
+    try:
+        crawl(q, scope, visited, all_urls, fetched_urls, visited_urls, limit=limit, metrics=metrics)
+    finally:
+        metrics.stop()
+    logging.info(metrics.summary())
+    categorize_urls(all_urls, news_site_name, scope)
+    write_rows(f'fetch_{news_site_name}.csv', ['URL', 'Status'], fetched_urls)
+    write_rows(f'visit_{news_site_name}.csv', ['URL', 'Size', 'Outlinks', 'Content-Type'], visited_urls)
     print("Crawling Completed!")
 
 